@@ -0,0 +1,67 @@
+import argparse
+import json
+import pathlib
+import sys
+import time
+import logging
+
+# Reuse the Indexer of hw5 (hw5/indexer/components/indexer.py)
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "hw5" / "indexer"))
+from components.indexer import Indexer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', filemode='w', filename='bulk_index.log')
+logger = logging.getLogger(__name__)
+
+
+def iter_documents(input_path: pathlib.Path):
+    # Reads the shards written by plaintext-wikipedia-converter.py, one line at a time
+    files = sorted(input_path.glob("*.jsonl")) + sorted(input_path.glob("*.ndjson")) if input_path.is_dir() else [input_path]
+    for file_path in files:
+        logger.info(f"Reading {file_path}")
+        with open(file_path, "r", encoding="utf-8") as f:
+            if file_path.suffix == ".ndjson":
+                # _bulk format: action line followed by the source line
+                for action_line in f:
+                    if not action_line.strip():
+                        continue
+                    action = json.loads(action_line)
+                    source = json.loads(next(f))
+                    yield {"id": next(iter(action.values())).get("_id"), **source}
+            else:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+def main(input_path: str, index_name: str, mappings_path: str, workers: int, chunk_size: int, queue_size: int, max_retries: int):
+    indexer = Indexer(index_name)
+    with open(mappings_path, "r", encoding="utf-8") as f:
+        indexer.create_index(json.load(f))
+    # No refresh and no replicas while loading, the previous values are restored at the end
+    # (a setting that was not set is restored to None, which resets it to the Elasticsearch default)
+    current = indexer.es.indices.get_settings(index=index_name, name=["index.refresh_interval", "index.number_of_replicas"])
+    current = next(iter(current.values()))["settings"].get("index", {})
+    previous = {"refresh_interval": current.get("refresh_interval"), "number_of_replicas": current.get("number_of_replicas")}
+    indexer.es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}})
+    start = time.monotonic()
+    try:
+        succeeded, failed = indexer.index_documents_parallel(iter_documents(pathlib.Path(input_path)), thread_count=workers,
+                                                             chunk_size=chunk_size, queue_size=queue_size, max_retries=max_retries, id_field="id")
+    finally:
+        indexer.es.indices.put_settings(index=index_name, body={"index": previous})
+        indexer.es.indices.refresh(index=index_name)
+    elapsed = time.monotonic() - start
+    print(f"Succeeded: {succeeded}, Failed: {failed}, in {elapsed:.1f}s ({succeeded / max(elapsed, 1e-9):.0f} docs/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk index the output of plaintext-wikipedia-converter.py (jsonl or bulk format) into Elasticsearch.")
+    parser.add_argument("input_path", type=str, help="Folder with the shards (or a single shard file).")
+    parser.add_argument("--index", type=str, default="wikipedia", help="Index name.")
+    parser.add_argument("--mappings", type=str, default=str(pathlib.Path(__file__).resolve().parent / "index_mappings.json"), help="Index settings and mappings, used if the index does not exist.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of parallel bulk requests.")
+    parser.add_argument("--chunk_size", type=int, default=500, help="Documents per bulk request.")
+    parser.add_argument("--queue_size", type=int, default=4, help="Chunks read ahead while all the workers are busy.")
+    parser.add_argument("--max_retries", type=int, default=3, help="Retries of a chunk rejected by Elasticsearch (429).")
+    args = parser.parse_args()
+    main(args.input_path, args.index, args.mappings, args.workers, args.chunk_size, args.queue_size, args.max_retries)
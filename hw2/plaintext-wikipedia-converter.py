@@ -1,35 +1,156 @@
 import json
 import argparse
 import pathlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+READ_CHUNK_SIZE = 1 << 20  # 1MB
+FORMATS = ["jsonl", "bulk", "txt"]
 
 
+def iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE):
+    # Incremental parser: yields the objects of a top level JSON array without loading the whole file
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        # skip whitespace, the opening bracket and the separators between objects
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+            if buffer[pos] == "[":
+                started = True
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]" and started:
+            return
+        if pos < len(buffer):
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+                pos = end
+                yield obj
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the object is not complete yet, read more
+        elif eof:
+            return
+        chunk = f.read(chunk_size)
+        eof = chunk == ""
+        buffer = buffer[pos:] + chunk
+        pos = 0
 
 
-def main(import_path: str, export_path: str):
-    print(f"Importing from {import_path} and exporting to {export_path}")
-    # Move in import path
-    # List all current files
-    # for each file, parse file and create new plain text single file and save file in export path
+def iter_json_lines(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_entries(file_path: pathlib.Path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        if file_path.suffix in (".jsonl", ".ndjson"):
+            yield from iter_json_lines(f)
+        else:
+            yield from iter_json_array(f)
+
+
+class ShardWriter:
+    # Writes the documents of one dump file to numbered shards of at most max_docs documents / max_bytes bytes
+    def __init__(self, export_dir: pathlib.Path, prefix: str, output_format: str, index_name: str, max_docs: int, max_bytes: int):
+        self.export_dir = export_dir
+        self.prefix = prefix
+        self.output_format = output_format
+        self.index_name = index_name
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.shard = 0
+        self.docs_in_shard = 0
+        self.bytes_in_shard = 0
+        self.out = None
+        self.shards = []
+
+    def _rotate(self):
+        self.close()
+        extension = "ndjson" if self.output_format == "bulk" else "jsonl"
+        path = self.export_dir / f"{self.prefix}-{self.shard:05d}.{extension}"
+        self.out = open(path, "w", encoding="utf-8")
+        self.shards.append(path.name)
+        self.shard += 1
+        self.docs_in_shard = 0
+        self.bytes_in_shard = 0
+
+    def write(self, doc_id: str, title: str, text: str):
+        if self.output_format == "txt":
+            self._write_txt(doc_id, title, text)
+            return
+        if self.out is None or self.docs_in_shard >= self.max_docs or self.bytes_in_shard >= self.max_bytes:
+            self._rotate()
+        if self.output_format == "bulk":
+            # ready for the _bulk API: action line + source line
+            action = json.dumps({"index": {"_index": self.index_name, "_id": doc_id}})
+            source = json.dumps({"title": title, "content": text}, ensure_ascii=False)
+            data = f"{action}\n{source}\n"
+        else:
+            data = json.dumps({"id": doc_id, "title": title, "content": text}, ensure_ascii=False) + "\n"
+        self.out.write(data)
+        self.docs_in_shard += 1
+        self.bytes_in_shard += len(data)
+
+    def _write_txt(self, doc_id: str, title: str, text: str):
+        # Legacy format for elastic_gopher (title = file name). Titles that collide get the id appended instead of overwriting.
+        safe_title = title.replace("/", "_")
+        try:
+            out_f = open(self.export_dir / f"{safe_title}.txt", "x", encoding="utf-8")
+        except FileExistsError:
+            out_f = open(self.export_dir / f"{safe_title}_{doc_id}.txt", "w", encoding="utf-8")
+        with out_f:
+            out_f.write(text)
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+
+def convert_file(file_path: str, export_path: str, output_format: str, index_name: str, max_docs: int, max_bytes: int):
+    file_path = pathlib.Path(file_path)
+    writer = ShardWriter(pathlib.Path(export_path), file_path.stem, output_format, index_name, max_docs, max_bytes)
+    count = 0
+    try:
+        for entry in iter_entries(file_path):
+            writer.write(str(entry.get("id", "unknown")), entry.get("title", "untitled"), entry.get("text", ""))
+            count += 1
+    finally:
+        writer.close()
+    return file_path.name, count, writer.shards
+
+
+def main(import_path: str, export_path: str, output_format: str = "jsonl", index_name: str = "wikipedia", workers: int = None, max_docs: int = 5000, max_bytes: int = 50 * 1024 * 1024):
+    print(f"Importing from {import_path} and exporting to {export_path} ({output_format})")
     import_dir = pathlib.Path(import_path)
     export_dir = pathlib.Path(export_path)
     export_dir.mkdir(parents=True, exist_ok=True)
-    for file_path in import_dir.glob("*.json"):
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        for entry in data:
-            title = entry.get("title", "untitled").replace("/", "_")
-            text = entry.get("text", "")
-            id = entry.get("id", "unknown")
-            output_file_path = export_dir / f"{title}.txt"
-            with open(output_file_path, "w", encoding="utf-8") as out_f:
-                out_f.write(text)
-        print(f"Processed file: {file_path.name}")
+    files = sorted(p for pattern in ("*.json", "*.jsonl", "*.ndjson") for p in import_dir.glob(pattern))
+    total = 0
+    # one dump file per process, each process writes its own shards
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(convert_file, str(f), str(export_dir), output_format, index_name, max_docs, max_bytes) for f in files]
+        for future in as_completed(futures):
+            name, count, shards = future.result()
+            total += count
+            print(f"Processed file: {name} ({count} documents, {len(shards)} shards)")
+    print(f"Converted {total} documents from {len(files)} files")
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Convert Wikipedia plaintext dump to JSONL format.")
+    parser = argparse.ArgumentParser(description="Convert Wikipedia plaintext dump to sharded JSONL or _bulk ready NDJSON.")
     parser.add_argument("--import_path", type=str, required=True, help="Path to the input folder where all the JSON Wikipedia files are located.")
-    parser.add_argument("--export_path", type=str, required=True, help="Path to the output folder where all the single files will be created.")
+    parser.add_argument("--export_path", type=str, required=True, help="Path to the output folder where the shards will be created.")
+    parser.add_argument("--format", type=str, choices=FORMATS, default="jsonl", help="jsonl: one {id, title, content} per line. bulk: NDJSON for the _bulk API. txt: one file per article (elastic_gopher).")
+    parser.add_argument("--index", type=str, default="wikipedia", help="Target index written in the bulk action lines.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: number of CPUs).")
+    parser.add_argument("--max_docs", type=int, default=5000, help="Maximum number of documents per shard.")
+    parser.add_argument("--max_mb", type=int, default=50, help="Maximum size of a shard in MB.")
     args = parser.parse_args()
-    main(args.import_path, args.export_path)
\ No newline at end of file
+    main(args.import_path, args.export_path, args.format, args.index, args.workers, args.max_docs, args.max_mb * 1024 * 1024)
@@ -0,0 +1,105 @@
+# Modulo di ricerca asincrono riutilizzabile (client GUI, valutazione, script batch).
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from query_cache import QueryCache
+
+logger = logging.getLogger(__name__)
+
+# Comma separated list of Elasticsearch hosts, e.g. "http://es1:9200,http://es2:9200"
+ES_HOSTS = os.getenv("ES_HOST", "http://localhost:9200").split(",")
+
+# Field with the search_as_you_type "suggest" subfield, for each index (see indexer_settings.json)
+SUGGEST_FIELDS = {
+    "research_papers": "title",
+    "figures": "caption",
+    "tables": "caption",
+}
+
+# How long the generation of an index is trusted before asking Elasticsearch again
+GENERATION_REFRESH_SECONDS = 5.0
+
+
+class AsyncSearchClient:
+    def __init__(self, hosts: Optional[List[str]] = None, maxsize: int = 10, max_concurrency: int = 10, cache: Optional[QueryCache] = None):
+        # maxsize is the size of the connection pool (per host), max_concurrency bounds the in-flight searches
+        self.es = AsyncElasticsearch(hosts=hosts or ES_HOSTS, maxsize=maxsize)
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self._generations: Dict[str, tuple] = {}  # index -> (checked_at, generation)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        await self.es.close()
+
+    async def index_generation(self, index: str) -> str:
+        """Return the generation of an index: its uuid plus the counter the Indexer writes in the mapping _meta.
+
+        The value changes whenever the index is recreated or documents are bulk indexed into it.
+        """
+        checked_at, generation = self._generations.get(index, (None, None))
+        if checked_at is not None and time.monotonic() - checked_at < GENERATION_REFRESH_SECONDS:
+            return generation
+        res = await self.es.indices.get(index=index, filter_path=["*.mappings._meta", "*.settings.index.uuid"])
+        info = next(iter(res.values()), {})
+        uuid = info.get("settings", {}).get("index", {}).get("uuid", "")
+        counter = info.get("mappings", {}).get("_meta", {}).get("generation", 0)
+        generation = f"{uuid}:{counter}"
+        self._generations[index] = (time.monotonic(), generation)
+        return generation
+
+    async def search(self, index: str, query: Dict[str, Any], size: int = 10, from_: int = 0, **kwargs) -> Dict[str, Any]:
+        body = {"query": query, "size": size, **kwargs}
+        generation = None
+        if self.cache is not None:
+            generation = await self.index_generation(index)
+            cached = self.cache.get(index, body, from_, generation)
+            if cached is not None:
+                logger.info(f"Cache hit for index={index} from={from_} size={size} query={query}")
+                return cached
+        logger.info(f"Searching index={index} from={from_} size={size} query={query}")
+        res = await self.es.search(index=index, body={**body, "from": from_})
+        if self.cache is not None:
+            self.cache.put(index, body, from_, res, generation)
+        return res
+
+    async def suggest(self, index: str, prefix: str, size: int = 5) -> List[str]:
+        # bool_prefix over the shingle subfields of search_as_you_type: the last term is matched as a prefix
+        field = SUGGEST_FIELDS.get(index, "title")
+        query = {
+            "multi_match": {
+                "query": prefix,
+                "type": "bool_prefix",
+                "fields": [f"{field}.suggest", f"{field}.suggest._2gram", f"{field}.suggest._3gram"]
+            }
+        }
+        res = await self.search(index, query, size=size, _source=[field], track_total_hits=False)
+        suggestions = []
+        for hit in res["hits"]["hits"]:
+            text = hit["_source"].get(field)
+            if text and text not in suggestions:
+                suggestions.append(text)
+        return suggestions
+
+    async def search_many(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        """Run many searches concurrently. Each request is a dict with the keyword arguments of search().
+
+        Results are returned in the same order as the requests; a failed search yields its exception.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(request: Dict[str, Any]):
+            async with semaphore:
+                return await self.search(**request)
+
+        return await asyncio.gather(*(bounded(r) for r in requests), return_exceptions=True)
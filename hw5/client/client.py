@@ -1,139 +1,218 @@
 import tkinter as tk
 from tkinter import scrolledtext
-from elasticsearch import Elasticsearch
-import re
+import asyncio
+import threading
 import webbrowser
 import logging
 
+from async_search import AsyncSearchClient
+from query_cache import QueryCache
+from query_parser import parse_query
+
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
-# Connect to Elasticsearch
-es = Elasticsearch("http://localhost:9200")
+
+# Searches run on a background event loop, so the Tk main thread never waits on Elasticsearch.
+# Hosts are read from the ES_HOST environment variable (see async_search.py).
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, daemon=True, name="es-search-loop").start()
+
+
+async def _create_search_client():
+    # Repeated queries and already visited pages are served from the local cache
+    return AsyncSearchClient(cache=QueryCache(max_entries=256, ttl=300.0))
+
+search_client = asyncio.run_coroutine_threadsafe(_create_search_client(), loop).result()
 
 
 index_options = ["research_papers","figures","tables"]
 
-def parse_query(user_query, index_name):
-    # Date range: published:>2020, published:>=2021-03, published:<2022-01-15, etc.
-    date_range = re.search(r'published\s*:\s*([<>]=|[<>]|=)\s*([\d\-]+)', user_query)
-    if date_range:
-        op, date_val = date_range.groups()
-        logger.info(f"Date range detected: op={op}, date_val={date_val}")
-        op_map = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte', '=': 'eq'}
-        if op == '=':
-            # If only year is given, search for that year
-            if len(date_val) == 4:
-                logger.info(f"Exact year query: date_val={date_val}")
-                return {
-                    "range": {
-                        "published": {
-                            "gte": f"{date_val}-01-01",
-                            "lt": f"{int(date_val)+1}-01-01"
-                        }
-                    }
-                }
-            # If year and month are given
-            elif len(date_val) == 7:
-                year, month = date_val.split('-')
-                next_month = int(month) + 1
-                if next_month > 12:
-                    next_month = 1
-                    next_year = int(year) + 1
-                else:
-                    next_year = int(year)
-                
-                logger.info(f"Exact month query: year={year}, month={month}, next_year={next_year}, next_month={next_month}")
-                return {
-                    "range": {
-                        "published": {
-                            "gte": f"{year}-{month}-01",
-                            "lt": f"{next_year}-{next_month:02d}-01"
-                        }
-                    }
-                }
-            else:
-                # Exact date
-                logger.info(f"Exact date query: date_val={date_val}")
-                return {"term": {"published": date_val}}
-        else:
-            logger.info(f"Date range query: op={op}, op_map_result={op_map[op]}, date_val={date_val}")
-            return {"range": {"published": {op_map[op]: date_val}}}
-
-    # Field-specific queries: field:"query"
-    field_queries = re.findall(r'(\w+):"([^"]+)"', user_query)
-    # Boolean operators
-    if " OR " in user_query:
-        clauses = []
-        for field, value in field_queries:
-            clauses.append({"match": {field: value}})
-        return {"bool": {"should": clauses}}
-    elif " AND " in user_query:
-        clauses = []
-        for field, value in field_queries:
-            clauses.append({"match": {field: value}})
-        return {"bool": {"must": clauses}}
-    elif field_queries:
-        # Single field query
-        field, value = field_queries[0]
-        return {"match": {field: value}}
-    else:
-        # Default: search all fields
-        fields = ["title", "authors", "summary", "content"]
-        if index_name == "figures":
-            fields = ["figure_id", "caption", "paper_id", "url", "blob_data"]
-        elif index_name == "tables":
-            fields = ["table_id", "description", "paper_id", "data", "table_url", "blob_data"]
-            
-        return {"multi_match": {"query": user_query, "fields": fields}}
-
-def search():
+PAGE_SIZE = 10
+POLL_INTERVAL_MS = 20
+RENDER_BATCH = 5  # hits inserted in the result box per Tk event loop iteration
+
+# Only the fields shown in the result box are fetched, the full text of the papers is never transferred
+DISPLAY_FIELDS = {
+    "research_papers": ["title", "authors", "published", "link"],
+    "figures": ["figure_id", "caption", "url"],
+    "tables": ["table_id", "caption", "table_url"],
+}
+
+current_page = 0
+search_generation = 0  # incremented at every search, results of older generations are discarded
+pending_search = None
+
+SUGGEST_DEBOUNCE_MS = 150  # suggestions are requested only when the user stops typing
+SUGGEST_MIN_CHARS = 2
+SUGGEST_SIZE = 5
+
+suggest_after_id = None
+suggest_generation = 0
+pending_suggest = None
+
+def search(page: int = 0):
+    global current_page, search_generation, pending_search
     query = entry.get()
     if not query:
         return
     current_index = selected_index.get()
+
+    # A new search supersedes the one still in flight
+    if pending_search is not None and not pending_search.done():
+        pending_search.cancel()
+    search_generation += 1
+    current_page = max(0, page)
+
+    cancel_suggestions()
     result_box.config(state=tk.NORMAL)
     result_box.delete(1.0, tk.END)
     try:
         es_query = parse_query(query, current_index)
-        res = es.search(index=current_index, query=es_query)
         print(f"Elasticsearch query: {es_query}")
-        #print(f"Elasticsearch response: {res}")
-        hits = res['hits']['hits']
-        if not hits:
-            result_box.insert(tk.END, "No results found.\n")
-        for i, hit in enumerate(hits):
-            source = hit['_source']
-            link = 'N/A'
-            
-            if current_index == "figures":
-                result_box.insert(tk.END, f"Figure ID: {source.get('figure_id', 'N/A')}\n")
-                result_box.insert(tk.END, f"Caption: {source.get('caption', 'N/A')}\n")
-                link = source.get('url', 'N/A')
-            elif current_index == "tables":
-                result_box.insert(tk.END, f"Table ID: {source.get('table_id', 'N/A')}\n")
-                result_box.insert(tk.END, f"Caption: {source.get('caption', 'N/A')}\n")
-                link = source.get('table_url', 'N/A')
-            else:
-                # Default research papers
-                result_box.insert(tk.END, f"Title: {source.get('title', 'N/A')}\n")
-                result_box.insert(tk.END, f"Authors: {', '.join(source.get('authors', []))}\n")
-                result_box.insert(tk.END, f"Published: {source.get('published', 'N/A')}\n")
-                link = source.get('link', 'N/A')
-
-            if link != 'N/A':
-                start = result_box.index(tk.END)
-                result_box.insert(tk.END, f"Link: {link}\n\n")
-                end = result_box.index(tk.END)
-                tag_name = f"link{i}"
-                result_box.tag_add(tag_name, f"{float(start)-1} linestart+6c", f"{float(start)-1} lineend")
-                result_box.tag_config(tag_name, foreground="blue", underline=1)
-                result_box.tag_bind(tag_name, "<Button-1>", lambda e, url=link: webbrowser.open(url))
-            else:
-                result_box.insert(tk.END, "Link: N/A\n\n")
     except Exception as e:
         result_box.insert(tk.END, f"Error: {e}\n")
-    result_box.config(state=tk.NORMAL)
+        return
+    result_box.insert(tk.END, "Searching...\n")
+    page_label.config(text=f"Page {current_page + 1}")
+
+    pending_search = asyncio.run_coroutine_threadsafe(
+        search_client.search(current_index, es_query, size=PAGE_SIZE, from_=current_page * PAGE_SIZE,
+                             _source=DISPLAY_FIELDS.get(current_index, True)),
+        loop)
+    root.after(POLL_INTERVAL_MS, poll_search, pending_search, search_generation, current_index)
+
+def next_page():
+    search(current_page + 1)
+
+def previous_page():
+    if current_page > 0:
+        search(current_page - 1)
+
+def poll_search(future, generation: int, current_index: str):
+    if generation != search_generation:
+        return  # superseded by a newer search
+    if not future.done():
+        root.after(POLL_INTERVAL_MS, poll_search, future, generation, current_index)
+        return
+    if future.cancelled():
+        return
+    result_box.delete(1.0, tk.END)
+    try:
+        res = future.result()
+    except Exception as e:
+        result_box.insert(tk.END, f"Error: {e}\n")
+        return
+    #print(f"Elasticsearch response: {res}")
+    hits = res['hits']['hits']
+    total = res['hits']['total']
+    total = total.get('value', 0) if isinstance(total, dict) else total
+    if not hits:
+        result_box.insert(tk.END, "No results found.\n")
+        return
+    first = current_page * PAGE_SIZE + 1
+    result_box.insert(tk.END, f"Results {first}-{first + len(hits) - 1} of {total}\n\n")
+    render_hits(hits, 0, generation, current_index)
+
+def render_hits(hits: list, start_hit: int, generation: int, current_index: str):
+    # Render a few hits and yield back to Tk, so large pages do not freeze the UI
+    if generation != search_generation:
+        return
+    for i in range(start_hit, min(start_hit + RENDER_BATCH, len(hits))):
+        render_hit(hits[i], current_page * PAGE_SIZE + i, current_index)
+    if start_hit + RENDER_BATCH < len(hits):
+        root.after(0, render_hits, hits, start_hit + RENDER_BATCH, generation, current_index)
+
+def render_hit(hit: dict, i: int, current_index: str):
+    source = hit['_source']
+    link = 'N/A'
+
+    if current_index == "figures":
+        result_box.insert(tk.END, f"Figure ID: {source.get('figure_id', 'N/A')}\n")
+        result_box.insert(tk.END, f"Caption: {source.get('caption', 'N/A')}\n")
+        link = source.get('url', 'N/A')
+    elif current_index == "tables":
+        result_box.insert(tk.END, f"Table ID: {source.get('table_id', 'N/A')}\n")
+        result_box.insert(tk.END, f"Caption: {source.get('caption', 'N/A')}\n")
+        link = source.get('table_url', 'N/A')
+    else:
+        # Default research papers
+        result_box.insert(tk.END, f"Title: {source.get('title', 'N/A')}\n")
+        result_box.insert(tk.END, f"Authors: {', '.join(source.get('authors', []))}\n")
+        result_box.insert(tk.END, f"Published: {source.get('published', 'N/A')}\n")
+        link = source.get('link', 'N/A')
+
+    if link != 'N/A':
+        start = result_box.index(tk.END)
+        result_box.insert(tk.END, f"Link: {link}\n\n")
+        end = result_box.index(tk.END)
+        tag_name = f"link{i}"
+        result_box.tag_add(tag_name, f"{float(start)-1} linestart+6c", f"{float(start)-1} lineend")
+        result_box.tag_config(tag_name, foreground="blue", underline=1)
+        result_box.tag_bind(tag_name, "<Button-1>", lambda e, url=link: webbrowser.open(url))
+    else:
+        result_box.insert(tk.END, "Link: N/A\n\n")
+
+def on_key_release(event):
+    global suggest_after_id
+    if event.keysym in ("Return", "Escape", "Up", "Down"):
+        return
+    # Debounce: every key press postpones the request
+    if suggest_after_id is not None:
+        root.after_cancel(suggest_after_id)
+    suggest_after_id = root.after(SUGGEST_DEBOUNCE_MS, request_suggestions)
+
+def cancel_suggestions():
+    global suggest_after_id, suggest_generation
+    if suggest_after_id is not None:
+        root.after_cancel(suggest_after_id)
+        suggest_after_id = None
+    if pending_suggest is not None and not pending_suggest.done():
+        pending_suggest.cancel()
+    suggest_generation += 1
+    suggestion_box.delete(0, tk.END)
+
+def request_suggestions():
+    global suggest_after_id, pending_suggest
+    prefix = entry.get().strip()
+    cancel_suggestions()
+    # Structured queries (field:value, operators) are not completed
+    if len(prefix) < SUGGEST_MIN_CHARS or ":" in prefix or '"' in prefix:
+        return
+    pending_suggest = asyncio.run_coroutine_threadsafe(search_client.suggest(selected_index.get(), prefix, SUGGEST_SIZE), loop)
+    root.after(POLL_INTERVAL_MS, poll_suggestions, pending_suggest, suggest_generation)
+
+def poll_suggestions(future, generation: int):
+    if generation != suggest_generation:
+        return
+    if not future.done():
+        root.after(POLL_INTERVAL_MS, poll_suggestions, future, generation)
+        return
+    if future.cancelled():
+        return
+    try:
+        suggestions = future.result()
+    except Exception as e:
+        logger.warning(f"Suggestion request failed: {e}")
+        return
+    suggestion_box.delete(0, tk.END)
+    for suggestion in suggestions:
+        suggestion_box.insert(tk.END, suggestion)
+
+def use_suggestion(event):
+    selection = suggestion_box.curselection()
+    if not selection:
+        return
+    # Searched as a phrase, so titles containing ':' or operators are not parsed as query syntax
+    suggestion = suggestion_box.get(selection[0]).replace('"', '')
+    entry.delete(0, tk.END)
+    entry.insert(0, f'"{suggestion}"')
+    search()
+
+def on_close():
+    asyncio.run_coroutine_threadsafe(search_client.close(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    root.destroy()
 
 
 
@@ -148,9 +227,22 @@ index_menu.pack(pady=5, fill="x", padx=10)
 tk.Label(root, text="Enter your search query:").pack(pady=5, anchor="w")
 entry = tk.Entry(root)
 entry.pack(pady=5, fill="x", padx=10, expand=True)
+entry.bind("<KeyRelease>", on_key_release)
+entry.bind("<Return>", lambda e: search())
+
+suggestion_box = tk.Listbox(root, height=SUGGEST_SIZE)
+suggestion_box.pack(pady=0, fill="x", padx=10)
+suggestion_box.bind("<<ListboxSelect>>", use_suggestion)
 
 tk.Button(root, text="Search", command=search).pack(pady=5)
 
+pagination = tk.Frame(root)
+pagination.pack(pady=5)
+tk.Button(pagination, text="< Previous", command=previous_page).pack(side="left", padx=5)
+page_label = tk.Label(pagination, text="Page 1")
+page_label.pack(side="left", padx=5)
+tk.Button(pagination, text="Next >", command=next_page).pack(side="left", padx=5)
+
 result_box = scrolledtext.ScrolledText(root)
 result_box.pack(pady=10, fill="both", expand=True, padx=10)
 
@@ -160,4 +252,5 @@ root.rowconfigure(2, weight=0)
 root.rowconfigure(3, weight=1)
 root.columnconfigure(0, weight=1)
 
+root.protocol("WM_DELETE_WINDOW", on_close)
 root.mainloop()
\ No newline at end of file
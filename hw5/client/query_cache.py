@@ -0,0 +1,60 @@
+# Cache LRU con TTL per i risultati delle query su Elasticsearch.
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def normalize_query(query: Dict[str, Any]) -> str:
+    # Same query with keys in a different order must hit the same entry
+    return json.dumps(query, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(index: str, query: Dict[str, Any], page: Hashable = 0) -> Tuple[str, str, Hashable]:
+        return index, normalize_query(query), page
+
+    def get(self, index: str, query: Dict[str, Any], page: Hashable = 0, generation: Hashable = None) -> Optional[Any]:
+        key = self.make_key(index, query, page)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, stored_generation, value = entry
+                if self.clock() - stored_at <= self.ttl and stored_generation == generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                # expired or the index has been rewritten since
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, index: str, query: Dict[str, Any], page: Hashable, value: Any, generation: Hashable = None):
+        key = self.make_key(index, query, page)
+        with self._lock:
+            self._entries[key] = (self.clock(), generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, index: Optional[str] = None):
+        with self._lock:
+            if index is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == index]:
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,263 @@
+# Parser delle query utente: tokenizer -> AST -> una singola query bool di Elasticsearch.
+#
+# Sintassi supportata:
+#   parole libere                 -> multi_match sui campi di default dell'indice
+#   "frase esatta"                -> multi_match di tipo phrase
+#   campo:valore, campo:"valore"  -> match sul campo
+#   campo:>2020, published:<=2021-03, published:=2022-01-15 -> range (filter, non influenza lo score)
+#   AND, OR, NOT, -clausola, ( ... )
+# Clausole adiacenti senza operatore sono in AND; AND ha precedenza su OR.
+import copy
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIELDS = {
+    "research_papers": ["title", "authors", "summary", "content"],
+    "figures": ["figure_id", "caption", "paper_id", "url", "blob_data"],
+    "tables": ["table_id", "description", "paper_id", "data", "table_url", "blob_data"],
+}
+DATE_FIELDS = {"published"}
+RANGE_OPS = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte'}
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<WS>\s+)
+  | (?P<LPAREN>\()
+  | (?P<RPAREN>\))
+  | (?P<COMPARE>(?P<cmp_field>\w+)\s*:\s*(?P<cmp_op>[<>]=|[<>]|=)\s*(?P<cmp_value>[^\s()"]+))
+  | (?P<FIELD>(?P<field>\w+)\s*:\s*(?:"(?P<field_quoted>[^"]*)"|(?P<field_value>[^\s()"]+)))
+  | (?P<PHRASE>"(?P<phrase>[^"]*)")
+  | (?P<OP>(?:AND|OR|NOT)(?=[\s()"]|$))
+  | (?P<MINUS>-(?=[^\s-]))
+  | (?P<WORD>[^\s()"]+)
+''', re.VERBOSE)
+
+
+class Token:
+    def __init__(self, kind: str, value: Any):
+        self.kind = kind
+        self.value = value
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r})"
+
+
+def tokenize(user_query: str) -> List[Token]:
+    tokens = []
+    pos = 0
+    while pos < len(user_query):
+        m = TOKEN_PATTERN.match(user_query, pos)
+        if m is None:
+            # only an unbalanced quote can get here
+            raise ValueError(f"Unexpected character at position {pos}: {user_query[pos:]!r}")
+        kind = m.lastgroup
+        if kind == "COMPARE":
+            tokens.append(Token(kind, (m.group("cmp_field"), m.group("cmp_op"), m.group("cmp_value"))))
+        elif kind == "FIELD":
+            value = m.group("field_quoted") if m.group("field_quoted") is not None else m.group("field_value")
+            tokens.append(Token(kind, (m.group("field"), value)))
+        elif kind == "PHRASE":
+            tokens.append(Token(kind, m.group("phrase")))
+        elif kind != "WS":
+            tokens.append(Token(kind, m.group(kind)))
+        pos = m.end()
+    return tokens
+
+
+# --- AST ---
+
+class Node:
+    # Filter nodes do not contribute to the score, they go in the bool "filter" context
+    is_filter = False
+
+
+class Text(Node):
+    def __init__(self, words: List[str]):
+        self.words = words
+
+
+class Phrase(Node):
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FieldMatch(Node):
+    def __init__(self, field: str, value: str):
+        self.field = field
+        self.value = value
+
+
+class Range(Node):
+    is_filter = True
+
+    def __init__(self, field: str, op: str, value: str):
+        self.field = field
+        self.op = op
+        self.value = value
+
+
+class Not(Node):
+    def __init__(self, child: Node):
+        self.child = child
+
+
+class And(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+        self.is_filter = all(c.is_filter or isinstance(c, Not) for c in children)
+
+
+class Or(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+        self.is_filter = all(c.is_filter for c in children)
+
+
+class Parser:
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Token:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise ValueError("Empty query")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected token {self.peek().value!r}")
+        return node
+
+    def parse_or(self) -> Node:
+        children = [self.parse_and()]
+        while self.peek() is not None and self.peek().kind == "OP" and self.peek().value == "OR":
+            self.next()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self) -> Node:
+        children = [self.parse_unary()]
+        while True:
+            token = self.peek()
+            if token is None or token.kind == "RPAREN" or (token.kind == "OP" and token.value == "OR"):
+                break
+            explicit_and = token.kind == "OP" and token.value == "AND"
+            if explicit_and:
+                self.next()
+            child = self.parse_unary()
+            # adjacent free words are a single full-text clause, as the old multi_match on the whole string
+            if not explicit_and and isinstance(child, Text) and isinstance(children[-1], Text):
+                children[-1] = Text(children[-1].words + child.words)
+            else:
+                children.append(child)
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_unary(self) -> Node:
+        token = self.peek()
+        if token is not None and (token.kind == "MINUS" or (token.kind == "OP" and token.value == "NOT")):
+            self.next()
+            return Not(self.parse_unary())
+        return self.parse_atom()
+
+    def parse_atom(self) -> Node:
+        token = self.next()
+        if token is None:
+            raise ValueError("Unexpected end of query")
+        if token.kind == "LPAREN":
+            node = self.parse_or()
+            closing = self.next()
+            if closing is None or closing.kind != "RPAREN":
+                raise ValueError("Missing closing parenthesis")
+            return node
+        if token.kind == "COMPARE":
+            return Range(*token.value)
+        if token.kind == "FIELD":
+            field, value = token.value
+            if field in DATE_FIELDS:
+                return Range(field, "=", value)
+            return FieldMatch(field, value)
+        if token.kind == "PHRASE":
+            return Phrase(token.value)
+        if token.kind == "WORD":
+            return Text([token.value])
+        raise ValueError(f"Unexpected token {token.value!r}")
+
+
+# --- Compilation ---
+
+def compile_range(node: Range) -> Dict[str, Any]:
+    if node.op != "=":
+        return {"range": {node.field: {RANGE_OPS[node.op]: node.value}}}
+    value = node.value
+    # Partial dates only make sense on date fields, on any other field "=" is an exact value
+    if node.field not in DATE_FIELDS:
+        return {"term": {node.field: value}}
+    # If only year is given, search for that year
+    if re.fullmatch(r"\d{4}", value):
+        return {"range": {node.field: {"gte": f"{value}-01-01", "lt": f"{int(value)+1}-01-01"}}}
+    # If year and month are given, search for that month
+    if re.fullmatch(r"\d{4}-\d{2}", value):
+        year, month = (int(v) for v in value.split("-"))
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return {"range": {node.field: {"gte": f"{year}-{month:02d}-01", "lt": f"{next_year}-{next_month:02d}-01"}}}
+    # Exact date
+    return {"term": {node.field: value}}
+
+
+def compile_node(node: Node, fields: List[str]) -> Dict[str, Any]:
+    if isinstance(node, Text):
+        return {"multi_match": {"query": " ".join(node.words), "fields": fields}}
+    if isinstance(node, Phrase):
+        return {"multi_match": {"query": node.text, "fields": fields, "type": "phrase"}}
+    if isinstance(node, FieldMatch):
+        return {"match": {node.field: node.value}}
+    if isinstance(node, Range):
+        return compile_range(node)
+    if isinstance(node, Not):
+        return {"bool": {"must_not": [compile_node(node.child, fields)]}}
+    if isinstance(node, Or):
+        clauses = [compile_node(c, fields) for c in node.children]
+        return {"bool": {"should": clauses, "minimum_should_match": 1}}
+    if isinstance(node, And):
+        return compile_bool(node.children, fields)
+    raise ValueError(f"Unknown node {node!r}")
+
+
+def compile_bool(children: List[Node], fields: List[str]) -> Dict[str, Any]:
+    clauses = {"must": [], "filter": [], "must_not": []}
+    for child in children:
+        if isinstance(child, And):
+            # AND of AND is flattened in the same bool
+            for occur, nested in compile_bool(child.children, fields)["bool"].items():
+                clauses[occur].extend(nested)
+        elif isinstance(child, Not):
+            clauses["must_not"].append(compile_node(child.child, fields))
+        elif child.is_filter:
+            clauses["filter"].append(compile_node(child, fields))
+        else:
+            clauses["must"].append(compile_node(child, fields))
+    return {"bool": {occur: c for occur, c in clauses.items() if c}}
+
+
+@lru_cache(maxsize=1024)
+def _compile(user_query: str, index_name: str) -> Dict[str, Any]:
+    ast = Parser(tokenize(user_query)).parse()
+    fields = DEFAULT_FIELDS.get(index_name, DEFAULT_FIELDS["research_papers"])
+    # The top level is always a single bool query
+    return compile_bool(ast.children if isinstance(ast, And) else [ast], fields)
+
+
+def parse_query(user_query: str, index_name: str) -> Dict[str, Any]:
+    es_query = _compile(user_query.strip(), index_name)
+    logger.info(f"Compiled query {user_query!r} on {index_name}: {es_query}")
+    # compiled queries are memoized, callers get their own copy
+    return copy.deepcopy(es_query)
@@ -0,0 +1,44 @@
+import query_parser
+
+def test_parse_query():
+    # Free text keeps the old multi_match behaviour
+    assert query_parser.parse_query("text to sql", "research_papers") == {
+        "bool": {"must": [{"multi_match": {"query": "text to sql", "fields": ["title", "authors", "summary", "content"]}}]}
+    }
+
+    # Date ranges go in the filter context and are combined with the other clauses
+    assert query_parser.parse_query('title:"sql" published:>=2021-03', "research_papers") == {
+        "bool": {
+            "must": [{"match": {"title": "sql"}}],
+            "filter": [{"range": {"published": {"gte": "2021-03"}}}]
+        }
+    }
+    assert query_parser.parse_query("published:=2021-12", "research_papers") == {
+        "bool": {"filter": [{"range": {"published": {"gte": "2021-12-01", "lt": "2022-01-01"}}}]}
+    }
+    # A 4-digit value is a year only on date fields
+    assert query_parser.parse_query("figure_id:=2021", "figures") == {
+        "bool": {"filter": [{"term": {"figure_id": "2021"}}]}
+    }
+
+    # AND binds tighter than OR, NOT goes in must_not
+    assert query_parser.parse_query('caption:a OR caption:b AND NOT caption:c', "figures") == {
+        "bool": {"must": [{"bool": {"should": [
+            {"match": {"caption": "a"}},
+            {"bool": {"must": [{"match": {"caption": "b"}}], "must_not": [{"match": {"caption": "c"}}]}}
+        ], "minimum_should_match": 1}}]}
+    }
+
+    # Memoized queries are copies, changing one does not alter the next result
+    first = query_parser.parse_query("caption:x", "figures")
+    first["bool"]["must"].clear()
+    assert query_parser.parse_query("caption:x", "figures") == {"bool": {"must": [{"match": {"caption": "x"}}]}}
+
+    for invalid in ["(caption:x", '"unbalanced', "caption:x OR", ""]:
+        try:
+            query_parser.parse_query(invalid, "figures")
+            assert False, f"{invalid!r} should not parse"
+        except ValueError:
+            pass
+
+test_parse_query()
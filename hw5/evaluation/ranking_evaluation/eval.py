@@ -4,148 +4,204 @@ import sys
 import time
 from elasticsearch import Elasticsearch
 from typing import List, Dict, Any, Optional
-import math
 import os
 import ext_llm
 from datetime import datetime
 import webbrowser
+import yaml
+from compute_metrics import compute_metrics
+from judgment_store import JudgmentStore, HUMAN_MODEL, make_key, SOURCE_HUMAN, SOURCE_LLM, SOURCE_STORE, SOURCE_DEFAULT
 
 ES_HOST = os.getenv("ES_HOST", "http://localhost:9200")
+MSEARCH_BATCH_SIZE = 50  # queries sent in a single _msearch request
+LLM_PRESET = "groq-llama"
 DEFAULT_QUERIES_PATH = os.path.join(os.path.dirname(__file__), "queries.json")
 FIELDS = {
     "research_papers": ["title", "authors", "summary", "link", "content"],
     "figures": ["figure_id", "caption", "paper_id","url", "image_url", "blob_data"],
     "tables": ["table_id", "caption", "paper_id", "data", "table_url", "blob_data"]
 }
-es = Elasticsearch(ES_HOST)
+es = Elasticsearch(ES_HOST.split(","))
 
 
 def make_default_annotations_path() -> str:
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
     return os.path.join(os.path.dirname(__file__), f"annotations-{ts}.jsonl")
 
-def run_queries(queries: List[Dict[str, Any]], top_k: int = 10, annotations_path: Optional[str] = None, human_mode: bool = False):
+def build_query(q: Dict[str, Any]) -> Dict[str, Any]:
+    index = q.get("index")
+    return {"multi_match": {"query": q.get("query"), "fields": FIELDS.get(index, ["title", "summary", "content"])}}
+
+def msearch_batches(queries: List[Dict[str, Any]], top_k: int = 10, batch_size: int = MSEARCH_BATCH_SIZE):
+    """Run the queries with one _msearch request per batch, yielding (query, hits) in query order."""
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        body = []
+        for q in batch:
+            body.append({"index": q.get("index")})
+            body.append({"query": build_query(q), "size": top_k})
+        res = es.msearch(body=body)
+        for q, response in zip(batch, res.get("responses", [])):
+            if "error" in response:
+                print(f"Search failed for query {q.get('id')}: {response['error']}")
+                yield q, []
+            else:
+                yield q, response.get("hits", {}).get("hits", [])
+
+def print_hit(index: str, rank: int, h: Dict[str, Any]) -> Optional[str]:
+    """Print a search hit and return the URL a human annotator can open to judge it."""
+    src = h.get("_source", {})
+    if index == "research_papers":
+        title = src.get("title") or src.get("caption") or src.get("paper_id") or h.get("_id")
+        summary = src.get("summary")
+        content = src.get("content") or ""
+        url = src.get("link")
+        print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Title: {title}\n  Summary: {summary}\n  Content: {content[:100]}...\n  URL: {url}\n")
+        return url
+    elif index == "figures":
+        caption = src.get("caption")
+        image_url = src.get("image_url") or src.get("url")
+        paper_id = src.get("paper_id")
+        print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Caption: {caption}\n  Image URL: {image_url}\n  Paper: {paper_id}\n")
+        return image_url or paper_id
+    else:  # tables
+        caption = src.get("caption") or src.get("description")
+        data = src.get("data") or ""
+        table_url = src.get("table_url")
+        print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Caption: {caption}\n  Table URL: {table_url}\n  Data snippet: {str(data)[:200]}\n")
+        return table_url
+
+def submit_annotation_request(scheduler, q: Dict[str, Any], index: str, h: Dict[str, Any]):
+    src = h.get("_source", {})
+    if index == "research_papers":
+        title = src.get("title") or src.get("caption") or src.get("paper_id") or h.get("_id")
+        system_prompt = "You are an expert search result annotator. Given a query and a search result, determine if the result is relevant to the query. Respond with '1' if relevant and '0' if not relevant."
+        prompt = f"Query: {q.get('query')}\nTitle: {title}\nSummary: {src.get('summary')}\nContent: {src.get('content') or ''}\nURL: {src.get('link')}"
+        return scheduler.submit_request(system_prompt, prompt)
+    elif index == "figures":
+        caption = src.get("caption")
+        image_url = src.get("image_url") or src.get("url")
+        paper_id = src.get("paper_id")
+        system_prompt = "You are an expert annotator. Given a query, figure caption and image, decide if the figure answers the user's information need. Respond with '1' for relevant and '0' for not relevant."
+        prompt = f"Query: {q.get('query')}\nCaption: {caption}\nPaper: {paper_id}\nImageURL: {image_url}"
+        try:
+            if hasattr(scheduler, "submit_multimodal_request"):
+                return scheduler.submit_multimodal_request(system_prompt, prompt, image=image_url)
+            return scheduler.submit_request(system_prompt, prompt + f"\n(IMAGE_URL: {image_url})")
+        except Exception:
+            return scheduler.submit_request(system_prompt, prompt + f"\n(IMAGE_URL: {image_url})")
+    elif index == "tables":
+        caption = src.get("caption") or src.get("description")
+        system_prompt = "You are an expert annotator. Given a query and a table (caption and data), decide if the table is relevant to the query. Respond with '1' for relevant and '0' for not relevant."
+        prompt = f"Query: {q.get('query')}\nCaption: {caption}\nTableURL: {src.get('table_url')}\nDataSnippet: {src.get('data') or ''}"
+        return scheduler.submit_request(system_prompt, prompt)
+    return None
+
+def query_id(q: Dict[str, Any]) -> str:
+    return q.get("id") or q.get("query_id") or q.get("query") or str(int(time.time()))
+
+def run_queries(queries: List[Dict[str, Any]], top_k: int = 10, annotations_path: Optional[str] = None, human_mode: bool = False, store: Optional[JudgmentStore] = None):
     if annotations_path is None:
         annotations_path = make_default_annotations_path()
     print(f"Annotations will be written to: {annotations_path}")
 
-    scheduler = None
-    if not human_mode:
-        extllm = ext_llm.init(open("config.yaml", "r").read())
-        llm_client = extllm.get_client("groq-llama")
-        scheduler = extllm.get_scheduler(client=llm_client, retry_delay=10.0, initial_rate_limit=500, min_rate_limit=10, max_rate_limit=1000)
-        scheduler.start()
-    try:
-        for q in queries:
-            qid = q.get("id") or q.get("query_id") or q.get("query") or str(int(time.time()))
+    # If human_mode, bypass LLM entirely and ask human per-hit
+    if human_mode:
+        for q, hits in msearch_batches(queries, top_k):
+            qid = query_id(q)
             index = q.get("index")
-            query_param = {"multi_match": {"query": q.get("query"), "fields": FIELDS.get(index, ["title", "summary", "content"])}}
-
             print(f"\nQuery {qid} on index={index}: {q.get('query')}\n")
-            res = es.search(index=index, query=query_param, size=top_k)
-            hits = res.get("hits", {}).get("hits", [])
             print(f"hits={len(hits)}\n")
-            # If human_mode, bypass LLM entirely and ask human per-hit
-            if human_mode:
-                for rank, h in enumerate(hits, start=1):
-                    src = h.get("_source", {})
-                    if index == "research_papers":
-                        title = src.get("title") or src.get("caption") or src.get("paper_id") or h.get("_id")
-                        summary = src.get("summary")
-                        content = src.get("content") or ""
-                        url = src.get("link")
-                        print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Title: {title}\n  Summary: {summary}\n  Content: {content[:100]}...\n  URL: {url}\n")
-                        prompt_url = url
-
-                    elif index == "figures":
-                        caption = src.get("caption")
-                        image_url = src.get("image_url") or src.get("url")
-                        paper_id = src.get("paper_id")
-                        print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Caption: {caption}\n  Image URL: {image_url}\n  Paper: {paper_id}\n")
-                        prompt_url = image_url or paper_id
-
-                    else:  # tables
-                        caption = src.get("caption") or src.get("description")
-                        data = src.get("data") or ""
-                        table_url = src.get("table_url")
-                        print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Caption: {caption}\n  Table URL: {table_url}\n  Data snippet: {str(data)[:200]}\n")
-                        prompt_url = table_url
-
-                    try:
-                        # automatically open the URL if it's a proper http(s) link
-                        if prompt_url and isinstance(prompt_url, str) and prompt_url.startswith("http"):
-                            try:
-                                webbrowser.open_new_tab(prompt_url)
-                            except Exception:
-                                print(f"Failed to open URL in browser: {prompt_url}")
-                        else:
-                            print(f"No openable URL for this result: {prompt_url}")
-
-                        raw = input(f"Enter relevance for rank {rank} id={h.get('_id')} [1/0] (provide 1 or 0): \nYour answer: ").strip()
-                        if raw in ("0", "1"):
-                            relevance = int(raw)
-                        else:
-                            print("Invalid input — defaulting to 0")
-                            relevance = 0
-                    except Exception:
-                        print("Unable to read input — defaulting to 0")
-                        relevance = 0
-
-                    print(f"Annotation for rank {rank} id={h.get('_id')}: relevance={relevance}\n")
+            keys = [make_key(q.get("query"), index, h, HUMAN_MODEL) for h in hits]
+            known = store.get_many(keys) if store else {}
+            for rank, (h, key) in enumerate(zip(hits, keys), start=1):
+                prompt_url = print_hit(index, rank, h)
+                if key in known:
+                    relevance = known[key]
+                    print(f"Already judged rank {rank} id={h.get('_id')}: relevance={relevance}\n")
                     save_annotation({
                         "query_id": qid,
                         "index": index,
                         "result_id": h.get("_id"),
                         "rank": rank,
-                        "relevance": relevance
+                        "relevance": relevance,
+                        "source": SOURCE_STORE
                     }, annotations_path)
-                # done with this query, continue
-                continue
+                    continue
+                try:
+                    # automatically open the URL if it's a proper http(s) link
+                    if prompt_url and isinstance(prompt_url, str) and prompt_url.startswith("http"):
+                        try:
+                            webbrowser.open_new_tab(prompt_url)
+                        except Exception:
+                            print(f"Failed to open URL in browser: {prompt_url}")
+                    else:
+                        print(f"No openable URL for this result: {prompt_url}")
 
-            # Non-human path: use LLM as before
-            futures = []
-            for rank, h in enumerate(hits, start=1):
-                src = h.get("_source", {})
-                if index == "research_papers":
-                    title = src.get("title") or src.get("caption") or src.get("paper_id") or h.get("_id")
-                    summary = src.get("summary")
-                    content = src.get("content") or ""
-                    url = src.get("link")
-                    print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Title: {title}\n  Summary: {summary}\n  Content: {content[:100]}...\n  URL: {url}\n")
-                    system_prompt = "You are an expert search result annotator. Given a query and a search result, determine if the result is relevant to the query. Respond with '1' if relevant and '0' if not relevant."
-                    prompt = f"Query: {q.get('query')}\nTitle: {title}\nSummary: {summary}\nContent: {content}\nURL: {url}"
-                    futures.append((rank, h, scheduler.submit_request(system_prompt, prompt)))
+                    raw = input(f"Enter relevance for rank {rank} id={h.get('_id')} [1/0] (provide 1 or 0): \nYour answer: ").strip()
+                    if raw in ("0", "1"):
+                        relevance = int(raw)
+                    else:
+                        print("Invalid input — defaulting to 0")
+                        relevance = 0
+                except Exception:
+                    print("Unable to read input — defaulting to 0")
+                    raw = None
+                    relevance = 0
 
-                elif index == "figures":
-                    caption = src.get("caption")
-                    image_url = src.get("image_url") or src.get("url")
-                    paper_id = src.get("paper_id")
-                    print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Caption: {caption}\n  Image URL: {image_url}\n  Paper: {paper_id}\n")
-                    system_prompt = "You are an expert annotator. Given a query, figure caption and image, decide if the figure answers the user's information need. Respond with '1' for relevant and '0' for not relevant."
-                    prompt = f"Query: {q.get('query')}\nCaption: {caption}\nPaper: {paper_id}\nImageURL: {image_url}"
-                    try:
-                        if hasattr(scheduler, "submit_multimodal_request"):
-                            future = scheduler.submit_multimodal_request(system_prompt, prompt, image=image_url)
-                        else:
-                            future = scheduler.submit_request(system_prompt, prompt + f"\n(IMAGE_URL: {image_url})")
-                    except Exception:
-                        future = scheduler.submit_request(system_prompt, prompt + f"\n(IMAGE_URL: {image_url})")
-                    futures.append((rank, h, future))
+                # only real answers are stored, the default 0 is asked again in the next run
+                answered = raw in ("0", "1")
+                if store and answered:
+                    store.put(key, relevance)
+                print(f"Annotation for rank {rank} id={h.get('_id')}: relevance={relevance}\n")
+                save_annotation({
+                    "query_id": qid,
+                    "index": index,
+                    "result_id": h.get("_id"),
+                    "rank": rank,
+                    "relevance": relevance,
+                    "source": SOURCE_HUMAN if answered else SOURCE_DEFAULT
+                }, annotations_path)
+        return
 
-                elif index == "tables":
-                    caption = src.get("caption") or src.get("description")
-                    data = src.get("data") or ""
-                    table_url = src.get("table_url")
-                    print(f"[{rank}] id={h.get('_id')} score={h.get('_score')}\n  Caption: {caption}\n  Table URL: {table_url}\n  Data snippet: {str(data)[:200]}\n")
-                    system_prompt = "You are an expert annotator. Given a query and a table (caption and data), decide if the table is relevant to the query. Respond with '1' for relevant and '0' for not relevant."
-                    prompt = f"Query: {q.get('query')}\nCaption: {caption}\nTableURL: {table_url}\nDataSnippet: {data}"
-                    futures.append((rank, h, scheduler.submit_request(system_prompt, prompt)))
+    # Non-human path: use LLM
+    config = open("config.yaml", "r").read()
+    model = yaml.safe_load(config)["config"]["presets"][LLM_PRESET]["model_id"]
+    extllm = ext_llm.init(config)
+    llm_client = extllm.get_client(LLM_PRESET)
+    scheduler = extllm.get_scheduler(client=llm_client, retry_delay=10.0, initial_rate_limit=500, min_rate_limit=10, max_rate_limit=1000)
+    scheduler.start()
+    try:
+        # Every hit is submitted to the scheduler as soon as its msearch batch returns, so the LLM
+        # works on the first batches while the next ones are still being retrieved.
+        # Pairs already judged in a previous run (same query, document content and model) are not submitted again.
+        futures = []
+        for q, hits in msearch_batches(queries, top_k):
+            qid = query_id(q)
+            index = q.get("index")
+            print(f"\nQuery {qid} on index={index}: {q.get('query')}\n")
+            print(f"hits={len(hits)}\n")
+            keys = [make_key(q.get("query"), index, h, model) for h in hits]
+            known = store.get_many(keys) if store else {}
+            for rank, (h, key) in enumerate(zip(hits, keys), start=1):
+                print_hit(index, rank, h)
+                future = None if key in known else submit_annotation_request(scheduler, q, index, h)
+                futures.append((qid, index, rank, h, key, known.get(key), future))
+        submitted = sum(1 for f in futures if f[-1] is not None)
+        print(f"Submitted {submitted} pairs to the LLM, {len(futures) - submitted} found in the judgment store.")
 
-            for rank, h, future in futures:
+        for qid, index, rank, h, key, cached_relevance, future in futures:
+            if future is None:
+                relevance = cached_relevance
+                source = SOURCE_STORE
+                print("=" * 20)
+                print(f"Stored judgment for query {qid} rank {rank} id={h.get('_id')}: {relevance}")
+            else:
                 try:
                     relevance_str = scheduler.get_result(future).content.strip()
                     print("=" * 20)
-                    print(f"LLM response for rank {rank} id={h.get('_id')}: '{relevance_str}'")
+                    print(f"LLM response for query {qid} rank {rank} id={h.get('_id')}: '{relevance_str}'")
+                    source = SOURCE_LLM
                     if "1" in relevance_str:
                         relevance = 1
                     elif "0" in relevance_str:
@@ -153,60 +209,51 @@ def run_queries(queries: List[Dict[str, Any]], top_k: int = 10, annotations_path
                     else:
                         print(f"Unexpected LLM response for rank {rank} id={h.get('_id')}: '{relevance_str}'. Defaulting to relevance=0.")
                         relevance = 0
+                        source = SOURCE_DEFAULT
+                    # only real answers are stored, failed requests are retried in the next run
+                    if store and relevance_str in ("0", "1"):
+                        store.put(key, relevance)
                 except Exception as e:
                     print(f"Error getting relevance for rank {rank} id={h.get('_id')}: {e}")
                     relevance = 0
+                    source = SOURCE_DEFAULT
 
-                # If human_mode enabled, allow human to confirm/override
-                try:
-                    raw = input(f"Enter relevance for rank {rank} id={h.get('_id')} [1/0] (Enter to accept LLM suggestion {relevance}, 's' to skip=0): ").strip()
-                    if raw == "":
-                        pass
-                    elif raw.lower() == "s":
-                        relevance = 0
-                    elif raw in ("0", "1"):
-                        relevance = int(raw)
-                    else:
-                        print("Unrecognized input, keeping LLM suggestion.")
-                except Exception:
-                    # ignore if input isn't available
+            # Allow human to confirm/override
+            try:
+                raw = input(f"Enter relevance for query {qid} rank {rank} id={h.get('_id')} [1/0] (Enter to accept LLM suggestion {relevance}, 's' to skip=0): ").strip()
+                if raw == "":
                     pass
+                elif raw.lower() == "s":
+                    relevance = 0
+                    source = SOURCE_DEFAULT
+                elif raw in ("0", "1"):
+                    relevance = int(raw)
+                    source = SOURCE_HUMAN
+                    if store:
+                        store.put((*key[:4], HUMAN_MODEL), relevance)
+                else:
+                    print("Unrecognized input, keeping LLM suggestion.")
+            except Exception:
+                # ignore if input isn't available
+                pass
 
-                print(f"Annotation for rank {rank} id={h.get('_id')}: relevance={relevance}\n")
-                save_annotation({
-                    "query_id": qid,
-                    "index": index,
-                    "result_id": h.get("_id"),
-                    "rank": rank,
-                    "relevance": relevance
-                }, annotations_path)
+            print(f"Annotation for rank {rank} id={h.get('_id')}: relevance={relevance}\n")
+            save_annotation({
+                "query_id": qid,
+                "index": index,
+                "result_id": h.get("_id"),
+                "rank": rank,
+                "relevance": relevance,
+                "source": source
+            }, annotations_path)
     finally:
-        if scheduler and not human_mode:
-            scheduler.stop()
+        scheduler.stop()
 
 def save_annotation(obj: Dict[str, Any], annotations_path: str):
     os.makedirs(os.path.dirname(annotations_path), exist_ok=True)
     with open(annotations_path, "a", encoding="utf-8") as f:
         f.write(json.dumps(obj, ensure_ascii=False) + "\n")
 
-def load_annotations(annotations_path: str) -> Dict[str, List[int]]:
-    """Return a map: query_id -> list of relevances in rank order (1/0)."""
-    by_query = {}
-    if not os.path.exists(annotations_path):
-        return by_query
-    with open(annotations_path, "r", encoding="utf-8") as f:
-        for line in f:
-            a = json.loads(line)
-            qid = a.get("query_id") or a.get("id") or a.get("query")
-            rank = int(a.get("rank", 0))
-            by_query.setdefault(qid, []).append((rank, int(a["relevance"])))
-    sorted_by_query = {}
-    for qid, items in by_query.items():
-        items.sort(key=lambda x: x[0])
-        sorted_by_query[qid] = [rel for _, rel in items]
-    return sorted_by_query
-
-
 def load_queries(query_file: str = None) -> List[Dict[str, Any]]:
     """Load queries from a JSON file. If no file is provided, load default queries.json next to this script.
     Supports the original grouped format (research_papers/tables/figures) or a flat list.
@@ -244,65 +291,25 @@ def load_queries(query_file: str = None) -> List[Dict[str, Any]]:
 
     return queries
 
-def precision_at_k(rels: List[int], k: int) -> float:
-    if len(rels) == 0:
-        return 0.0
-    k = min(k, len(rels))
-    return sum(rels[:k]) / k
-
-def average_precision(rels: List[int]) -> float:
-    num_rel = sum(rels)
-    if num_rel == 0:
-        return 0.0
-    score = 0.0
-    rel_seen = 0
-    for i, r in enumerate(rels, start=1):
-        if r:
-            rel_seen += 1
-            score += rel_seen / i
-    return score / num_rel
-
-def dcg(rels: List[int], k: int) -> float:
-    score = 0.0
-    for i in range(min(k, len(rels))):
-        gain = (2 ** rels[i] - 1)
-        score += gain / math.log2(i + 2)
-    return score
+def open_store(judgments_path: Optional[str] = None) -> JudgmentStore:
+    return JudgmentStore(judgments_path) if judgments_path else JudgmentStore()
 
-def ndcg_at_k(rels: List[int], k: int) -> float:
-    actual = dcg(rels, k)
-    ideal = dcg(sorted(rels, reverse=True), k)
-    return actual / ideal if ideal > 0 else 0.0
-
-def compute_metrics(k: int = 10, annotations_path: Optional[str] = None):
-    if annotations_path is None:
-        print("No annotations file specified for metrics.")
-        return
-    ann = load_annotations(annotations_path)
-    precisions = []
-    aps = []
-    ndcgs = []
-    for qid, rels in ann.items():
-        print(f"Metrics for query_id={qid} with relevances={rels}")
-        precisions.append(precision_at_k(rels, k))
-        aps.append(average_precision(rels))
-        ndcgs.append(ndcg_at_k(rels, k))
-    if not precisions:
-        print("No annotations found.")
-        return
-    print(f"Precision@{k}: {sum(precisions)/len(precisions):.4f}")
-    print(f"MAP: {sum(aps)/len(aps):.4f}")
-    print(f"nDCG@{k}: {sum(ndcgs)/len(ndcgs):.4f}")
-
-def main(query_file: str = None, top_k: int = 10, annotations_path: Optional[str] = None, human_mode: bool = False):
+def main(query_file: str = None, top_k: int = 10, annotations_path: Optional[str] = None, human_mode: bool = False, judgments_path: Optional[str] = None, merge_human: Optional[str] = None, metrics_only: bool = False):
     if query_file:
         queries = load_queries(query_file)
     else:
         queries = load_queries()
+    if merge_human:
+        store = open_store(judgments_path)
+        merged = store.merge_human_annotations(merge_human, {q["id"]: q["query"] for q in queries})
+        print(f"Merged {merged} human judgments from {merge_human} into {store.path}")
+        return
     # ensure annotations_path is set (created by run_queries if None)
     if annotations_path is None:
         annotations_path = make_default_annotations_path()
-    #run_queries(queries, top_k, annotations_path=annotations_path, human_mode=human_mode)
+    if not metrics_only:
+        # judgments of previous runs are reused and the new ones are saved for the next runs
+        run_queries(queries, top_k, annotations_path=annotations_path, human_mode=human_mode, store=open_store(judgments_path))
     compute_metrics(top_k, annotations_path)
 
 if __name__ == "__main__":
@@ -311,6 +318,11 @@ if __name__ == "__main__":
     parser.add_argument("--top_k", "-k", type=int, default=10, help="Number of top results to fetch per query")
     parser.add_argument("--output", "-o", help="Annotations output file (jsonl). If omitted, a timestamped file will be created next to this script.")
     parser.add_argument("--interactive", "-i", action="store_true", help="Enable human-in-the-loop confirmation/override of LLM annotations")
+    parser.add_argument("--judgments", "-j", help="SQLite judgment store reused across runs (default: judgments.db next to this script)")
+    parser.add_argument("--merge-human", help="Import the human annotations of this jsonl file into the judgment store and exit. Only the rows with source=human (answers typed by a human) are imported: LLM suggestions, stored and default judgments are skipped, and so are files written before the source field existed.")
+    parser.add_argument("--metrics-only", action="store_true", help="Do not run the queries, only compute the metrics of the annotations file given with --output")
     args = parser.parse_args()
+    if args.metrics_only and not args.output:
+        parser.error("--metrics-only needs the annotations file (--output)")
 
-    main(args.query_file, args.top_k, annotations_path=args.output, human_mode=args.interactive)
+    main(args.query_file, args.top_k, annotations_path=args.output, human_mode=args.interactive, judgments_path=args.judgments, merge_human=args.merge_human, metrics_only=args.metrics_only)
@@ -0,0 +1,107 @@
+# Archivio persistente dei giudizi di rilevanza (LLM e umani), per non richiedere due volte lo stesso giudizio.
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_JUDGMENTS_PATH = os.path.join(os.path.dirname(__file__), "judgments.db")
+HUMAN_MODEL = "human"
+ANY_CONTENT = ""  # content hash of human judgments imported from annotation files, valid for any version of the document
+
+# "source" of the rows of the annotations-*.jsonl files: who produced the relevance
+SOURCE_HUMAN = "human"  # typed by a human
+SOURCE_LLM = "llm"  # LLM answer accepted as is
+SOURCE_STORE = "store"  # found in the judgment store
+SOURCE_DEFAULT = "default"  # fallback 0 (invalid input, failed or skipped request)
+
+# (query text, index, document _id, content hash, model)
+JudgmentKey = Tuple[str, str, str, str, str]
+
+
+def content_hash(source: Dict[str, Any]) -> str:
+    # A reindexed document with different content gets a new hash, so it is judged again
+    return hashlib.sha1(json.dumps(source, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def make_key(query: str, index: str, hit: Dict[str, Any], model: str) -> JudgmentKey:
+    return query, index, hit.get("_id"), content_hash(hit.get("_source", {})), model
+
+
+class JudgmentStore:
+    def __init__(self, path: str = DEFAULT_JUDGMENTS_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS judgments (
+                query TEXT NOT NULL,
+                index_name TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                relevance INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (query, index_name, doc_id, content_hash, model)
+            )
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, keys: Iterable[JudgmentKey]) -> Dict[JudgmentKey, int]:
+        """Return the known relevance for each key. Human judgments override the model ones."""
+        keys = list(keys)
+        by_query: Dict[Tuple[str, str], List[str]] = {}
+        for query, index, doc_id, _, _ in keys:
+            by_query.setdefault((query, index), []).append(doc_id)
+
+        # (query, index, doc_id, content_hash, model) -> relevance, one SELECT for each (query, index)
+        rows: Dict[JudgmentKey, int] = {}
+        for (query, index), doc_ids in by_query.items():
+            placeholders = ",".join("?" * len(doc_ids))
+            cursor = self.conn.execute(
+                f"SELECT doc_id, content_hash, model, relevance FROM judgments "
+                f"WHERE query = ? AND index_name = ? AND doc_id IN ({placeholders})",
+                [query, index, *doc_ids])
+            for doc_id, chash, model, relevance in cursor:
+                rows[(query, index, doc_id, chash, model)] = relevance
+
+        result = {}
+        for key in keys:
+            query, index, doc_id, chash, model = key
+            for candidate in ((query, index, doc_id, chash, HUMAN_MODEL),
+                              (query, index, doc_id, ANY_CONTENT, HUMAN_MODEL),
+                              key):
+                if candidate in rows:
+                    result[key] = rows[candidate]
+                    break
+        return result
+
+    def put_many(self, judgments: Iterable[Tuple[JudgmentKey, int]]):
+        now = datetime.now().isoformat(timespec="seconds")
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO judgments VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(*key, int(relevance), now) for key, relevance in judgments])
+        self.conn.commit()
+
+    def put(self, key: JudgmentKey, relevance: int):
+        self.put_many([(key, relevance)])
+
+    def merge_human_annotations(self, annotations_path: str, query_texts: Dict[str, str]) -> int:
+        """Import the human rows (source=human) of an annotations-*.jsonl file as overrides. query_texts maps query_id -> query text."""
+        judgments = []
+        with open(annotations_path, "r", encoding="utf-8") as f:
+            for line in f:
+                a = json.loads(line)
+                # the same files hold LLM answers: they must not become human overrides
+                if a.get("source") != SOURCE_HUMAN:
+                    continue
+                qid = a.get("query_id") or a.get("id") or a.get("query")
+                query = query_texts.get(qid)
+                if query is None or a.get("result_id") is None:
+                    continue
+                judgments.append(((query, a.get("index"), a["result_id"], ANY_CONTENT, HUMAN_MODEL), int(a["relevance"])))
+        self.put_many(judgments)
+        return len(judgments)
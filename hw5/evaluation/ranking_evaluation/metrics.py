@@ -0,0 +1,114 @@
+# Calcolo vettoriale (NumPy) delle metriche di ranking su tutte le query in un solo passaggio.
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def load_relevance_matrix(annotations_path: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Load an annotations jsonl into a (queries x ranks) 0/1 matrix.
+
+    Returns the query ids (row order), the matrix padded with zeros and the number of judged results of each query.
+    """
+    by_query: Dict[str, Dict[int, int]] = {}
+    if os.path.exists(annotations_path):
+        with open(annotations_path, "r", encoding="utf-8") as f:
+            for line in f:
+                a = json.loads(line)
+                qid = a.get("query_id") or a.get("id") or a.get("query")
+                by_query.setdefault(qid, {})[int(a.get("rank", 0))] = int(a["relevance"])
+    query_ids = list(by_query)
+    lengths = np.array([len(by_query[q]) for q in query_ids], dtype=np.int64)
+    matrix = np.zeros((len(query_ids), int(lengths.max()) if len(lengths) else 0), dtype=np.float64)
+    for row, qid in enumerate(query_ids):
+        # ranks may have gaps, the relevances are kept in rank order
+        ranked = [rel for _, rel in sorted(by_query[qid].items())]
+        matrix[row, :len(ranked)] = ranked
+    return query_ids, matrix, lengths
+
+
+def compute_per_query(matrix: np.ndarray, lengths: np.ndarray, ks: Sequence[int]) -> Dict[str, np.ndarray]:
+    """Compute every metric for every query. Cutoff metrics are returned as 'P@k', 'R@k', 'nDCG@k'.
+
+    Recall is relative to the relevant results among the judged ones, the only ones known.
+    """
+    n_queries, depth = matrix.shape
+    ks = [int(k) for k in ks]
+    max_k = max(ks + [depth])
+    rels = np.zeros((n_queries, max_k))
+    rels[:, :depth] = matrix
+
+    positions = np.arange(1, max_k + 1)
+    hits_at = np.cumsum(rels, axis=1)            # relevant results within the first i ranks
+    num_rel = hits_at[:, -1]
+    safe_num_rel = np.where(num_rel > 0, num_rel, 1)
+
+    discounts = 1.0 / np.log2(positions + 1)
+    gains = (2 ** rels - 1)
+    dcg_at = np.cumsum(gains * discounts, axis=1)
+    ideal = -np.sort(-rels, axis=1)
+    idcg_at = np.cumsum((2 ** ideal - 1) * discounts, axis=1)
+
+    metrics: Dict[str, np.ndarray] = {}
+    for k in ks:
+        # with fewer than k judged results the denominator is their number
+        denominator = np.minimum(k, lengths)
+        metrics[f"P@{k}"] = np.where(denominator > 0, hits_at[:, k - 1] / np.maximum(denominator, 1), 0.0)
+        metrics[f"R@{k}"] = np.where(num_rel > 0, hits_at[:, k - 1] / safe_num_rel, 0.0)
+        idcg = idcg_at[:, k - 1]
+        metrics[f"nDCG@{k}"] = np.where(idcg > 0, dcg_at[:, k - 1] / np.where(idcg > 0, idcg, 1), 0.0)
+
+    metrics["AP"] = np.where(num_rel > 0, (rels * hits_at / positions).sum(axis=1) / safe_num_rel, 0.0)
+    first_rel = np.argmax(rels > 0, axis=1)
+    metrics["RR"] = np.where(num_rel > 0, 1.0 / (first_rel + 1), 0.0)
+    return metrics
+
+
+def bootstrap_ci(values: np.ndarray, n_resamples: int = 1000, alpha: float = 0.05, seed: Optional[int] = 0) -> Tuple[float, float]:
+    """Percentile bootstrap confidence interval of the mean, all resamples drawn in one shot."""
+    if len(values) == 0:
+        return 0.0, 0.0
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(0, len(values), size=(n_resamples, len(values)))
+    means = values[samples].mean(axis=1)
+    return float(np.quantile(means, alpha / 2)), float(np.quantile(means, 1 - alpha / 2))
+
+
+def summarize(per_query: Dict[str, np.ndarray], n_resamples: int = 0, alpha: float = 0.05) -> Dict[str, Dict[str, float]]:
+    """Mean of every metric (MAP, MRR, ...), with bootstrap CI bounds when n_resamples > 0."""
+    summary = {}
+    for name, values in per_query.items():
+        label = {"AP": "MAP", "RR": "MRR"}.get(name, name)
+        entry = {"mean": float(values.mean()) if len(values) else 0.0}
+        if n_resamples > 0:
+            entry["ci_low"], entry["ci_high"] = bootstrap_ci(values, n_resamples, alpha)
+        summary[label] = entry
+    return summary
+
+
+def evaluate_files(annotations_paths: Sequence[str], ks: Sequence[int], n_resamples: int = 0, alpha: float = 0.05) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    for path in annotations_paths:
+        _, matrix, lengths = load_relevance_matrix(path)
+        results[path] = summarize(compute_per_query(matrix, lengths, ks), n_resamples, alpha)
+    return results
+
+
+def format_comparison(results: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+    """Table with one row per metric and one column per annotations file."""
+    paths = list(results)
+    metrics = list(next(iter(results.values()), {}))
+    names = [os.path.basename(p) for p in paths]
+    width = max([26] + [len(n) for n in names])
+    lines = ["metric".ljust(10) + "".join(n.rjust(width + 2) for n in names)]
+    for metric in metrics:
+        cells = []
+        for path in paths:
+            entry = results[path][metric]
+            cell = f"{entry['mean']:.4f}"
+            if "ci_low" in entry:
+                cell += f" [{entry['ci_low']:.4f}, {entry['ci_high']:.4f}]"
+            cells.append(cell.rjust(width + 2))
+        lines.append(metric.ljust(10) + "".join(cells))
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+# Esperimenti di ranking offline: riordina i pool di candidati salvati da snapshot.py con BM25 calcolato in NumPy
+# e confronta varianti di boost dei campi e tipi di multi_match, senza Elasticsearch.
+#
+# Limiti: le statistiche BM25 (idf, lunghezza media) sono calcolate sul pool di candidati e non sull'intero indice,
+# l'analyzer è un'approssimazione (lowercase + stop words inglesi, senza stemming) e una variante può solo
+# riordinare i candidati già recuperati. I candidati non giudicati contano come non rilevanti, la copertura
+# dei giudizi nel top-k viene riportata per ogni variante.
+import argparse
+import gzip
+import json
+import re
+from collections import Counter
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+import metrics
+
+# Elasticsearch _english_ stop words
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in", "into", "is", "it", "no", "not", "of",
+    "on", "or", "such", "that", "the", "their", "then", "there", "these", "they", "this", "to", "was", "will", "with"
+}
+TOKEN_PATTERN = re.compile(r"\w+")
+MULTI_MATCH_TYPES = ["best_fields", "most_fields", "cross_fields"]
+
+
+def analyze(value: Any) -> List[str]:
+    if isinstance(value, list):
+        value = " ".join(str(v) for v in value)
+    return [t for t in TOKEN_PATTERN.findall(str(value or "").lower()) if t not in STOPWORDS]
+
+
+def parse_field(spec: str):
+    # "title^2" -> ("title", 2.0)
+    field, _, boost = spec.partition("^")
+    return field, float(boost) if boost else 1.0
+
+
+class QueryPool:
+    """Candidates of one query, with the term frequencies of the query terms precomputed for every field."""
+
+    def __init__(self, record: Dict[str, Any]):
+        self.query_id = record["query_id"]
+        self.index = record["index"]
+        self.query = record["query"]
+        candidates = record["candidates"]
+        self.terms = list(dict.fromkeys(analyze(self.query)))
+        self.relevance = np.array([c["relevance"] or 0 for c in candidates], dtype=np.float64)
+        self.judged = np.array([c["relevance"] is not None for c in candidates])
+        self.es_scores = np.array([c["_score"] or 0.0 for c in candidates], dtype=np.float64)
+        self.fields = sorted({f for c in candidates for f in c["fields"]})
+        self.tf: Dict[str, np.ndarray] = {}
+        self.lengths: Dict[str, np.ndarray] = {}
+        for field in self.fields:
+            tf = np.zeros((len(candidates), len(self.terms)))
+            lengths = np.zeros(len(candidates))
+            for d, c in enumerate(candidates):
+                tokens = analyze(c["fields"].get(field))
+                counts = Counter(tokens)
+                tf[d] = [counts[t] for t in self.terms]
+                lengths[d] = len(tokens)
+            self.tf[field] = tf
+            self.lengths[field] = lengths
+        self._bm25_cache: Dict[tuple, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.relevance)
+
+    def bm25(self, field: str, k1: float, b: float) -> np.ndarray:
+        """(candidates x query terms) BM25 contributions of one field."""
+        key = (field, k1, b)
+        if key not in self._bm25_cache:
+            tf = self.tf.get(field)
+            if tf is None:
+                tf = np.zeros((len(self), len(self.terms)))
+                lengths = np.zeros(len(self))
+            else:
+                lengths = self.lengths[field]
+            n_docs = max(len(self), 1)
+            df = (tf > 0).sum(axis=0)
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            avgdl = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+            norm = k1 * (1 - b + b * lengths / avgdl)
+            self._bm25_cache[key] = idf * tf * (k1 + 1) / (tf + norm[:, None] + 1e-12)
+        return self._bm25_cache[key]
+
+    def score(self, variant: Dict[str, Any]) -> np.ndarray:
+        fields = [parse_field(f) for f in variant.get("fields") or self.fields]
+        # an empty pool (a failed _msearch in the snapshot) has nothing to rank
+        if len(self) == 0 or not fields:
+            return np.zeros(len(self))
+        k1, b = variant.get("k1", 1.2), variant.get("b", 0.75)
+        tie_breaker = variant.get("tie_breaker", 0.0)
+        per_term = np.stack([boost * self.bm25(field, k1, b) for field, boost in fields])  # fields x docs x terms
+        match variant.get("type", "best_fields"):
+            case "most_fields":
+                return per_term.sum(axis=(0, 2))
+            case "cross_fields":
+                # fields are blended as one: every term scores with its best field
+                best = per_term.max(axis=0)
+                return (best + tie_breaker * (per_term.sum(axis=0) - best)).sum(axis=1)
+            case _:
+                field_scores = per_term.sum(axis=2)
+                best = field_scores.max(axis=0)
+                return best + tie_breaker * (field_scores.sum(axis=0) - best)
+
+
+def load_snapshot(snapshot_path: str) -> List[QueryPool]:
+    opener = gzip.open if snapshot_path.endswith(".gz") else open
+    with opener(snapshot_path, "rt", encoding="utf-8") as f:
+        return [QueryPool(json.loads(line)) for line in f if line.strip()]
+
+
+def rank_matrix(pools: List[QueryPool], orders: List[np.ndarray]):
+    depth = max((len(p) for p in pools), default=0)
+    matrix = np.zeros((len(pools), depth))
+    judged = np.zeros((len(pools), depth), dtype=bool)
+    for row, (pool, order) in enumerate(zip(pools, orders)):
+        matrix[row, :len(order)] = pool.relevance[order]
+        judged[row, :len(order)] = pool.judged[order]
+    return matrix, np.array([len(p) for p in pools]), judged
+
+
+def evaluate_variant(pools: List[QueryPool], variant: Dict[str, Any], ks: Sequence[int], n_resamples: int = 0) -> Dict[str, Dict[str, float]]:
+    if variant.get("type") == "es":
+        orders = [np.argsort(-p.es_scores, kind="stable") for p in pools]
+    else:
+        orders = [np.argsort(-p.score(variant), kind="stable") for p in pools]
+    matrix, lengths, judged = rank_matrix(pools, orders)
+    summary = metrics.summarize(metrics.compute_per_query(matrix, lengths, ks), n_resamples)
+    for k in ks:
+        summary[f"judged@{k}"] = {"mean": float(judged[:, :k].mean()) if judged.size else 0.0}
+    return summary
+
+
+def default_variants(pools: List[QueryPool]) -> List[Dict[str, Any]]:
+    """Sweep of multi_match types and boosts of the first field (title/caption) of every index."""
+    variants = []
+    for index in sorted({p.index for p in pools}):
+        # the original Elasticsearch order is the baseline of every index
+        variants.append({"name": f"{index}:es", "index": index, "type": "es"})
+        # fields of all the pools of the index, some pools can be empty
+        fields = sorted({f for p in pools if p.index == index for f in p.fields})
+        if not fields:
+            continue
+        main_field = "title" if "title" in fields else "caption" if "caption" in fields else fields[0]
+        for type_ in MULTI_MATCH_TYPES:
+            for boost in (1, 2, 5):
+                boosted = [f"{f}^{boost}" if f == main_field and boost != 1 else f for f in fields]
+                variants.append({"name": f"{index}:{type_}:{main_field}^{boost}", "index": index, "type": type_, "fields": boosted})
+    return variants
+
+
+def sweep(pools: List[QueryPool], variants: List[Dict[str, Any]], ks: Sequence[int], n_resamples: int = 0) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    for i, variant in enumerate(variants):
+        # a variant restricted to an index is evaluated only on the queries of that index
+        selected = [p for p in pools if variant.get("index") in (None, p.index)]
+        results[variant.get("name", f"variant{i}")] = evaluate_variant(selected, variant, ks, n_resamples)
+    return results
+
+
+def format_sweep(results: Dict[str, Dict[str, Dict[str, float]]], sort_by: str) -> str:
+    """One row per variant, best first according to sort_by."""
+    names = list(next(iter(results.values()), {}))
+    width = max([len("variant")] + [len(v) for v in results])
+    lines = ["variant".ljust(width) + "".join(n.rjust(10) for n in names)]
+    for variant, summary in sorted(results.items(), key=lambda item: -item[1].get(sort_by, {"mean": 0})["mean"]):
+        lines.append(variant.ljust(width) + "".join(f"{summary[n]['mean']:.4f}".rjust(10) for n in names))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-rank snapshotted candidate pools with alternative field boosts and multi_match types, offline")
+    parser.add_argument("snapshot_path", help="Snapshot created by snapshot.py")
+    parser.add_argument("variants", nargs="?", help='JSON file with a list of variants, e.g. [{"name": "t2", "type": "best_fields", "fields": ["title^2", "summary"], "tie_breaker": 0.3, "k1": 1.2, "b": 0.75}]. If omitted, a default sweep is run.')
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10], help="Rank cutoffs")
+    args = parser.parse_args()
+
+    pools = load_snapshot(args.snapshot_path)
+    if args.variants:
+        with open(args.variants, "r", encoding="utf-8") as f:
+            variants = json.load(f)
+    else:
+        variants = default_variants(pools)
+    results = sweep(pools, variants, args.k)
+    print(format_sweep(results, f"nDCG@{args.k[-1]}"))
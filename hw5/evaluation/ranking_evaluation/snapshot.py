@@ -0,0 +1,63 @@
+# Salva su disco, per ogni query, il pool di candidati restituito da Elasticsearch e i giudizi noti,
+# così che replay.py possa confrontare varianti di ranking senza un cluster attivo.
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from eval import FIELDS, load_queries, msearch_batches, query_id
+
+
+def load_judgments(annotations_paths: List[str]) -> Dict[tuple, int]:
+    """(query_id, index, result_id) -> relevance, later files override earlier ones."""
+    judgments = {}
+    for path in annotations_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                a = json.loads(line)
+                qid = a.get("query_id") or a.get("id") or a.get("query")
+                judgments[(qid, a.get("index"), a.get("result_id"))] = int(a["relevance"])
+    return judgments
+
+
+def make_default_snapshot_path() -> str:
+    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(os.path.dirname(__file__), f"snapshot-{ts}.jsonl.gz")
+
+
+def snapshot(queries: List[Dict[str, Any]], annotations_paths: List[str], pool_size: int = 100, snapshot_path: Optional[str] = None) -> str:
+    snapshot_path = snapshot_path or make_default_snapshot_path()
+    judgments = load_judgments(annotations_paths)
+    judged = 0
+    with gzip.open(snapshot_path, "wt", encoding="utf-8") as out:
+        for q, hits in msearch_batches(queries, pool_size):
+            qid = query_id(q)
+            index = q.get("index")
+            fields = FIELDS.get(index, ["title", "summary", "content"])
+            candidates = []
+            for h in hits:
+                src = h.get("_source", {})
+                relevance = judgments.get((qid, index, h.get("_id")))
+                judged += relevance is not None
+                candidates.append({
+                    "_id": h.get("_id"),
+                    "_score": h.get("_score"),
+                    "fields": {f: src.get(f) for f in fields if src.get(f) is not None},
+                    "relevance": relevance
+                })
+            out.write(json.dumps({"query_id": qid, "index": index, "query": q.get("query"), "candidates": candidates}, ensure_ascii=False) + "\n")
+            print(f"Query {qid} on index={index}: {len(candidates)} candidates")
+    print(f"Snapshot written to {snapshot_path} ({judged} judged candidates)")
+    return snapshot_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot the candidate pool of every query together with the known relevance judgments")
+    parser.add_argument("query_file", help="Path to queries.json")
+    parser.add_argument("--annotations", "-a", nargs="*", default=[], help="Annotation jsonl files whose judgments are attached to the candidates")
+    parser.add_argument("--pool_size", "-p", type=int, default=100, help="Number of candidates retrieved for each query")
+    parser.add_argument("--output", "-o", help="Snapshot file (jsonl.gz). If omitted, a timestamped file will be created next to this script.")
+    args = parser.parse_args()
+    snapshot(load_queries(args.query_file), args.annotations, args.pool_size, args.output)
@@ -0,0 +1,29 @@
+import numpy as np
+
+import replay
+
+def pool(query_id, candidates):
+    return replay.QueryPool({"query_id": query_id, "index": "figures", "query": "sql table", "candidates": candidates})
+
+def test_empty_pool():
+    # snapshot.py stores no candidates when the _msearch response is an error
+    empty = pool("q1", [])
+    full = pool("q2", [
+        {"relevance": 1, "_score": 2.0, "fields": {"caption": "SQL table", "data": "rows"}},
+        {"relevance": 0, "_score": 3.0, "fields": {"caption": "Plot", "data": "sql"}},
+    ])
+    assert empty.score({"type": "best_fields"}).shape == (0,)
+    assert empty.score({"type": "most_fields", "fields": ["caption^2"]}).shape == (0,)
+    assert full.score({"type": "best_fields", "fields": ["caption^2", "data"]})[0] > 0
+
+    # the fields of the sweep come from every pool of the index, not from the first one
+    variants = replay.default_variants([empty, full])
+    assert variants[1]["fields"] == ["caption", "data"]
+    results = replay.sweep([empty, full], variants, [1])
+    assert results["figures:best_fields:caption^2"]["P@1"]["mean"] == 0.5
+
+    # an index with only empty pools keeps only the Elasticsearch baseline
+    assert [v["name"] for v in replay.default_variants([empty])] == ["figures:es"]
+    assert np.isfinite(replay.sweep([empty], replay.default_variants([empty]), [1])["figures:es"]["P@1"]["mean"])
+
+test_empty_pool()
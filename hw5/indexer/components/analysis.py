@@ -0,0 +1,210 @@
+# Catena di analisi equivalente a quella degli analyzer di Elasticsearch usati nel progetto
+# (standard tokenizer, lowercase, asciifolding, stop words inglesi, stemmer inglese), per l'indice locale.
+import logging
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Elasticsearch _english_ stop words
+ENGLISH_STOPWORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in", "into", "is", "it", "no", "not", "of",
+    "on", "or", "such", "that", "the", "their", "then", "there", "these", "they", "this", "to", "was", "will", "with"
+])
+
+# Approximation of the unicode standard tokenizer: runs of letters/digits, with inner apostrophes and dots between digits
+TOKEN_PATTERN = re.compile(r"\w+(?:['’]\w+)*(?:[.,]\d+)*")
+
+
+def asciifold(token: str) -> str:
+    if token.isascii():
+        return token
+    return unicodedata.normalize("NFKD", token).encode("ascii", "ignore").decode("ascii") or token
+
+
+def english_possessive(token: str) -> str:
+    return token[:-2] if token.endswith(("'s", "’s")) else token
+
+
+# --- Porter stemmer (M.F. Porter, 1980), the "english" stemmer of Elasticsearch ---
+
+def _is_consonant(word: str, i: int) -> bool:
+    c = word[i]
+    if c in "aeiou":
+        return False
+    if c == "y":
+        return i == 0 or not _is_consonant(word, i - 1)
+    return True
+
+
+def _measure(stem: str) -> int:
+    # number of VC sequences in [C](VC)^m[V]
+    m = 0
+    i = 0
+    n = len(stem)
+    while i < n and _is_consonant(stem, i):
+        i += 1
+    while i < n:
+        while i < n and not _is_consonant(stem, i):
+            i += 1
+        if i >= n:
+            break
+        while i < n and _is_consonant(stem, i):
+            i += 1
+        m += 1
+    return m
+
+
+def _has_vowel(stem: str) -> bool:
+    return any(not _is_consonant(stem, i) for i in range(len(stem)))
+
+
+def _ends_double_consonant(word: str) -> bool:
+    return len(word) >= 2 and word[-1] == word[-2] and _is_consonant(word, len(word) - 1)
+
+
+def _ends_cvc(word: str) -> bool:
+    return (len(word) >= 3 and _is_consonant(word, len(word) - 3) and not _is_consonant(word, len(word) - 2)
+            and _is_consonant(word, len(word) - 1) and word[-1] not in "wxy")
+
+
+def _replace(word: str, rules, min_measure: int) -> str:
+    for suffix, replacement in rules:
+        if word.endswith(suffix):
+            stem = word[:len(word) - len(suffix)]
+            return stem + replacement if _measure(stem) > min_measure else word
+    return word
+
+
+_STEP2 = [("ational", "ate"), ("tional", "tion"), ("enci", "ence"), ("anci", "ance"), ("izer", "ize"), ("bli", "ble"),
+          ("alli", "al"), ("entli", "ent"), ("eli", "e"), ("ousli", "ous"), ("ization", "ize"), ("ation", "ate"),
+          ("ator", "ate"), ("alism", "al"), ("iveness", "ive"), ("fulness", "ful"), ("ousness", "ous"), ("aliti", "al"),
+          ("iviti", "ive"), ("biliti", "ble"), ("logi", "log")]
+_STEP3 = [("icate", "ic"), ("ative", ""), ("alize", "al"), ("iciti", "ic"), ("ical", "ic"), ("ful", ""), ("ness", "")]
+_STEP4 = ["al", "ance", "ence", "er", "ic", "able", "ible", "ant", "ement", "ment", "ent", "ion", "ou", "ism", "ate",
+          "iti", "ous", "ive", "ize"]
+
+
+def porter_stem(word: str) -> str:
+    if len(word) <= 2:
+        return word
+    # Step 1a
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies"):
+        word = word[:-2]
+    elif word.endswith("ss"):
+        pass
+    elif word.endswith("s"):
+        word = word[:-1]
+    # Step 1b
+    step1b_extra = False
+    if word.endswith("eed"):
+        if _measure(word[:-3]) > 0:
+            word = word[:-1]
+    elif word.endswith("ed") and _has_vowel(word[:-2]):
+        word = word[:-2]
+        step1b_extra = True
+    elif word.endswith("ing") and _has_vowel(word[:-3]):
+        word = word[:-3]
+        step1b_extra = True
+    if step1b_extra:
+        if word.endswith(("at", "bl", "iz")):
+            word += "e"
+        elif _ends_double_consonant(word) and word[-1] not in "lsz":
+            word = word[:-1]
+        elif _measure(word) == 1 and _ends_cvc(word):
+            word += "e"
+    # Step 1c
+    if word.endswith("y") and _has_vowel(word[:-1]):
+        word = word[:-1] + "i"
+    # Steps 2, 3
+    word = _replace(word, _STEP2, 0)
+    word = _replace(word, _STEP3, 0)
+    # Step 4
+    for suffix in _STEP4:
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            if _measure(stem) > 1 and (suffix != "ion" or stem.endswith(("s", "t"))):
+                word = stem
+            break
+    # Step 5
+    if word.endswith("e"):
+        stem = word[:-1]
+        m = _measure(stem)
+        if m > 1 or (m == 1 and not _ends_cvc(stem)):
+            word = stem
+    if _measure(word) > 1 and _ends_double_consonant(word) and word.endswith("l"):
+        word = word[:-1]
+    return word
+
+
+# --- Analyzers ---
+
+class Analyzer:
+    def __init__(self, filters: list):
+        self.filters = filters
+        self._stem_cache = {}
+
+    def __call__(self, text) -> list[str]:
+        if text is None:
+            return []
+        if isinstance(text, list):
+            text = " ".join(str(t) for t in text)
+        tokens = TOKEN_PATTERN.findall(str(text))
+        for token_filter in self.filters:
+            if token_filter == "stem":
+                tokens = [self._stem(t) for t in tokens]
+            else:
+                tokens = [t for t in map(token_filter, tokens) if t]
+        return tokens
+
+    def _stem(self, token: str) -> str:
+        stemmed = self._stem_cache.get(token)
+        if stemmed is None:
+            stemmed = self._stem_cache[token] = porter_stem(token)
+        return stemmed
+
+
+def _stop(token: str):
+    return None if token in ENGLISH_STOPWORDS else token
+
+
+FILTERS = {
+    "lowercase": str.lower,
+    "asciifolding": asciifold,
+    "english_possessive_stemmer": english_possessive,
+}
+
+BUILTIN_ANALYZERS = {
+    "standard": ["lowercase"],
+    "english": ["english_possessive_stemmer", "lowercase", "stop", "stem"],
+}
+
+
+def build_analyzer(name: str, analysis_settings: dict = None) -> Analyzer:
+    """Build an analyzer from its name and the "analysis" section of the index settings."""
+    analysis_settings = analysis_settings or {}
+    custom = analysis_settings.get("analyzer", {}).get(name)
+    if custom is None or "filter" not in custom:
+        builtin = (custom or {}).get("type", name)
+        if builtin not in BUILTIN_ANALYZERS:
+            logger.warning(f"Unknown analyzer {name}, falling back to standard")
+            builtin = "standard"
+        names = BUILTIN_ANALYZERS[builtin]
+    else:
+        names = custom["filter"]
+    filters = []
+    filter_settings = analysis_settings.get("filter", {})
+    for filter_name in names:
+        definition = filter_settings.get(filter_name, {})
+        kind = definition.get("type", filter_name)
+        if kind == "stop":
+            filters.append(_stop)
+        elif kind in ("stemmer", "stem", "porter_stem"):
+            filters.append("stem")
+        elif kind in FILTERS:
+            filters.append(FILTERS[kind])
+        else:
+            logger.warning(f"Unsupported token filter {filter_name}, ignored")
+    return Analyzer(filters)
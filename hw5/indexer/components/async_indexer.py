@@ -0,0 +1,82 @@
+# Variante asincrona di Indexer, basata su AsyncElasticsearch.
+# Permette di condividere un unico event loop tra fetch, indicizzazione e query.
+import asyncio
+import itertools
+import logging
+import json
+from typing import AsyncIterable, Iterable
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk
+
+from components.indexer import ES_HOSTS
+
+logger = logging.getLogger(__name__)
+
+class AsyncIndexer:
+    def __init__(self, index_name: str, hosts: list[str] = None, maxsize: int = 10, es: AsyncElasticsearch = None):
+        self.index_name = index_name
+        # An already opened client can be shared between several indexers, so they share the same connection pool
+        self._owns_client = es is None
+        self.es = es or AsyncElasticsearch(hosts=hosts or ES_HOSTS, maxsize=maxsize)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._owns_client:
+            await self.es.close()
+
+    async def create_index(self):
+        settings = json.load(open(f'indexer_settings.json'))[self.index_name]
+        logger.info(f"Creating index {self.index_name} with settings: {settings}")
+        if not await self.es.indices.exists(index=self.index_name):
+            await self.es.indices.create(index=self.index_name, body=settings)
+            logger.info(f"Index {self.index_name} created.")
+        else:
+            logger.info(f"Index {self.index_name} already exists.")
+
+    async def delete_index(self):
+        if await self.es.indices.exists(index=self.index_name):
+            await self.es.indices.delete(index=self.index_name)
+            logger.info(f"Index {self.index_name} deleted.")
+        else:
+            logger.info(f"Index {self.index_name} does not exist. No deletion performed.")
+
+    async def bump_generation(self) -> int:
+        # Same generation counter as Indexer.bump_generation
+        mapping = await self.es.indices.get_mapping(index=self.index_name)
+        meta = mapping[self.index_name]["mappings"].get("_meta", {})
+        generation = meta.get("generation", 0) + 1
+        await self.es.indices.put_mapping(index=self.index_name, body={"_meta": {**meta, "generation": generation}})
+        logger.info(f"Index {self.index_name} is now at generation {generation}.")
+        return generation
+
+    async def index_document(self, document: dict):
+        status = await self.es.index(index=self.index_name, body=document)
+        logger.info(f"Indexed document: {document.get('title', 'N/A')}")
+        return status
+
+    async def index_documents_bulk(self, documents: Iterable[dict] | AsyncIterable[dict], chunk_size: int = 500, bump_generation: bool = True):
+        # documents can be a plain generator (e.g. the dataloader) or an async generator (e.g. a fetcher)
+        async def actions():
+            if hasattr(documents, "__aiter__"):
+                async for doc in documents:
+                    yield {"_index": self.index_name, "_source": doc}
+            else:
+                # the dataloader generators read and parse files: every chunk is pulled in a worker thread,
+                # so the event loop keeps serving the other coroutines meanwhile
+                iterator = iter(documents)
+                while chunk := await asyncio.to_thread(list, itertools.islice(iterator, chunk_size)):
+                    for doc in chunk:
+                        yield {"_index": self.index_name, "_source": doc}
+
+        status = await async_bulk(self.es, actions(), chunk_size=chunk_size, stats_only=True, raise_on_error=False)
+        # bump_generation is a read-modify-write of the mapping: concurrent loads into the same index
+        # pass bump_generation=False and bump once when all of them are done
+        if bump_generation:
+            await self.bump_generation()
+        return status
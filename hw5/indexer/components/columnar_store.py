@@ -0,0 +1,110 @@
+# Formato intermedio colonnare (Parquet) per paragrafi, figure, tabelle e link estratti dai paper.
+# Al posto di quattro file JSON per paper, ogni tipo di dato è un dataset partizionato per sorgente:
+#   <root>/<kind>/source=<source>/part-*.parquet
+# e si legge con proiezione (solo le colonne richieste) e filtri su sorgente e paper.
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import components.utils as utils
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_PATH = "output/columnar"
+PAPERS_PER_FILE = 500  # papers buffered before a new part file is written
+
+SCHEMAS = {
+    "paragraphs": pa.schema([("paper_id", pa.string()), ("position", pa.int32()), ("paragraph_id", pa.string()), ("text", pa.string())]),
+    "figures": pa.schema([("paper_id", pa.string()), ("figure_id", pa.string()), ("caption", pa.string()), ("url", pa.string()), ("image_url", pa.string())]),
+    "tables": pa.schema([("paper_id", pa.string()), ("table_id", pa.string()), ("caption", pa.string()), ("table_url", pa.string()), ("data", pa.string())]),
+    # one row per (figure or table, referencing paragraph), the content of the _links.json files
+    "links": pa.schema([("paper_id", pa.string()), ("target_id", pa.string()), ("paragraph_id", pa.string())]),
+}
+
+
+class ColumnarStore:
+    def __init__(self, root: str = COLUMNAR_PATH, papers_per_file: int = PAPERS_PER_FILE):
+        self.root = root
+        self.papers_per_file = papers_per_file
+        self.buffers = defaultdict(list)  # (kind, source) -> rows
+        self.buffered_papers = 0
+
+    def add_paper(self, source: str, paper_id: str, paragraphs: list[dict], figures: list[dict], tables: list[dict], links: dict[str, list[str]]):
+        # paragraphs, figures and tables are the records of the _paragraphs/_figures/_tables.json files
+        for position, p in enumerate(paragraphs):
+            self.buffers["paragraphs", source].append({"paper_id": paper_id, "position": position, "paragraph_id": p.get("paragraph_id"), "text": p.get("text")})
+        for f in figures:
+            self.buffers["figures", source].append({**f, "paper_id": paper_id})
+        for t in tables:
+            self.buffers["tables", source].append({**t, "paper_id": paper_id})
+        for target_id, paragraph_ids in links.items():
+            for paragraph_id in paragraph_ids:
+                self.buffers["links", source].append({"paper_id": paper_id, "target_id": target_id, "paragraph_id": paragraph_id})
+        self.buffered_papers += 1
+        if self.buffered_papers >= self.papers_per_file:
+            self.flush()
+
+    def flush(self):
+        for (kind, source), rows in self.buffers.items():
+            if not rows:
+                continue
+            directory = os.path.join(self.root, kind, f"source={source}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet")
+            pq.write_table(pa.Table.from_pylist(rows, schema=SCHEMAS[kind]), path, compression="zstd")
+            logger.info(f"Wrote {len(rows)} {kind} rows to {path}")
+        self.buffers.clear()
+        self.buffered_papers = 0
+
+    def dataset(self, kind: str) -> ds.Dataset:
+        partitioning = ds.partitioning(pa.schema([("source", pa.string())]), flavor="hive")
+        return ds.dataset(os.path.join(self.root, kind), format="parquet", partitioning=partitioning)
+
+    def read(self, kind: str, source: str = None, columns: list[str] = None, paper_ids: list[str] = None) -> pa.Table:
+        """Scan one kind of data, reading only the requested columns of the matching source/papers."""
+        if not os.path.exists(os.path.join(self.root, kind)):
+            return SCHEMAS[kind].empty_table().select(columns or SCHEMAS[kind].names)
+        condition = None
+        if source is not None:
+            condition = ds.field("source") == source
+        if paper_ids is not None:
+            by_paper = ds.field("paper_id").isin(paper_ids)
+            condition = by_paper if condition is None else condition & by_paper
+        return self.dataset(kind).to_table(columns=columns or SCHEMAS[kind].names, filter=condition)
+
+    def compact(self, kind: str, source: str):
+        # merges the part files of a partition (e.g. the ones written by the pipeline, a few papers at a time)
+        directory = os.path.join(self.root, kind, f"source={source}")
+        parts = sorted(os.listdir(directory)) if os.path.exists(directory) else []
+        if len(parts) <= 1:
+            return
+        table = self.read(kind, source)
+        path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(table, path, compression="zstd")
+        for part in parts:
+            os.remove(os.path.join(directory, part))
+        logger.info(f"Compacted {len(parts)} {kind} files of {source} into {path}")
+
+    def import_json(self, data_path: str, source: str) -> int:
+        """Add the JSON files written by the extractor and the linker for every paper of data_path."""
+        count = 0
+        for paper in utils.collect_papers(data_path):
+            records = []
+            for suffix in ("paragraphs", "figures", "tables", "links"):
+                path = f"{paper}_{suffix}.json"
+                if not os.path.exists(path):
+                    break
+                with open(path, "r", encoding="utf-8") as f:
+                    records.append(json.load(f))
+            else:
+                self.add_paper(source, paper.replace(data_path + "/", ""), *records)
+                count += 1
+        self.flush()
+        return count
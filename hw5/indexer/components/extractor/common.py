@@ -1,11 +1,21 @@
 import logging
+from typing import Callable
 
 logger = logging.getLogger(__name__)
 
 import os
 import components.utils as utils
 
-def extract_paragraphs(file: str, data_path: str, extract_paragraphs_from_html: function):
+def paragraph_records(extracted_paragraphs) -> list[dict]:
+    return [{'paper_id':para.paper_id, 'paragraph_id': para.paragraph_id, 'text': para.text} for para in extracted_paragraphs]
+
+def figure_records(extracted_figures) -> list[dict]:
+    return [{'paper_id':fig.paper_id, 'figure_id': fig.figure_id, 'caption': fig.caption, 'url': fig.url , 'image_url': fig.image_url} for fig in extracted_figures]
+
+def table_records(extracted_tables) -> list[dict]:
+    return [{'paper_id':table.paper_id, 'table_id': table.table_id, 'caption': table.caption,'table_url':table.table_url ,'data': table.data} for table in extracted_tables]
+
+def extract_paragraphs(file: str, data_path: str, extract_paragraphs_from_html: Callable):
     filepath = f"{file}.html"
     if not os.path.exists(filepath):
         filepath = f"{file}.xml"
@@ -13,13 +23,13 @@ def extract_paragraphs(file: str, data_path: str, extract_paragraphs_from_html:
     with open(filepath, 'r') as f:
             paper = f.read()
             extracted_paragraphs = extract_paragraphs_from_html(paper, file.replace(data_path + "/", ""))
-            paragraphs = [{'paper_id':para.paper_id, 'paragraph_id': para.paragraph_id, 'text': para.text} for para in extracted_paragraphs]
+            paragraphs = paragraph_records(extracted_paragraphs)
             with open(output_filepath, 'w') as out_f:
                 import json
                 json.dump(paragraphs, out_f, indent=4)
             logger.info(f"Extracted paragraphs saved to {output_filepath}")
 
-def extract_figures(file: str, data_path: str, extract_figures_from_html: function):
+def extract_figures(file: str, data_path: str, extract_figures_from_html: Callable):
     filepath = f"{file}.html"
     if not os.path.exists(filepath):
         filepath = f"{file}.xml"
@@ -27,13 +37,13 @@ def extract_figures(file: str, data_path: str, extract_figures_from_html: functi
     with open(filepath, 'r') as f:
             paper = f.read()
             extracted_figures = extract_figures_from_html(paper, file.replace(data_path + "/", ""))
-            figures = [{'paper_id':fig.paper_id, 'figure_id': fig.figure_id, 'caption': fig.caption, 'url': fig.url , 'image_url': fig.image_url} for fig in extracted_figures]
+            figures = figure_records(extracted_figures)
             with open(output_filepath, 'w') as out_f:
                 import json
                 json.dump(figures, out_f, indent=4)
             logger.info(f"Extracted figures saved to {output_filepath}")
 
-def extract_tables(file: str, data_path: str, extract_tables_from_html: function):
+def extract_tables(file: str, data_path: str, extract_tables_from_html: Callable):
     filepath = f"{file}.html"
     if not os.path.exists(filepath):
         filepath = f"{file}.xml"
@@ -41,13 +51,13 @@ def extract_tables(file: str, data_path: str, extract_tables_from_html: function
     with open(filepath, 'r') as f:
             paper = f.read()
             extracted_tables = extract_tables_from_html(paper, file.replace(data_path + "/", ""))
-            tables = [{'paper_id':table.paper_id, 'table_id': table.table_id, 'caption': table.caption,'table_url':table.table_url ,'data': table.data} for table in extracted_tables]
+            tables = table_records(extracted_tables)
             with open(output_filepath, 'w') as out_f:
                 import json
                 json.dump(tables, out_f, indent=4)
             logger.info(f"Extracted tables saved to {output_filepath}")
 
-def extract(data_path: str, extract_paragraphs_from_html: function = None, extract_figures_from_html: function = None, extract_tables_from_html: function = None):
+def extract(data_path: str, extract_paragraphs_from_html: Callable = None, extract_figures_from_html: Callable = None, extract_tables_from_html: Callable = None):
     logger.info("Extracting...")
     papers = utils.collect_papers(data_path)
     for paper in papers:
@@ -55,4 +65,24 @@ def extract(data_path: str, extract_paragraphs_from_html: function = None, extra
         extract_figures(paper, data_path, extract_figures_from_html)
         extract_tables(paper, data_path, extract_tables_from_html)
 
-    logger.info("Paragraph extraction completed.")
\ No newline at end of file
+    logger.info("Paragraph extraction completed.")
+
+def extract_to_store(data_path: str, source: str, store, extract_paragraphs_from_html: Callable, extract_figures_from_html: Callable, extract_tables_from_html: Callable, linker_function: Callable):
+    # Columnar variant of extract + link: every paper is read once and its records go to the ColumnarStore, no JSON files
+    logger.info(f"Extracting {data_path} to the columnar store...")
+    for file in utils.collect_papers(data_path):
+        filepath = f"{file}.html"
+        if not os.path.exists(filepath):
+            filepath = f"{file}.xml"
+        try:
+            with open(filepath, 'r') as f:
+                paper = f.read()
+            paper_id = file.replace(data_path + "/", "")
+            paragraphs = paragraph_records(extract_paragraphs_from_html(paper, paper_id))
+            figures = figure_records(extract_figures_from_html(paper, paper_id))
+            tables = table_records(extract_tables_from_html(paper, paper_id))
+            store.add_paper(source, paper_id, paragraphs, figures, tables, linker_function(paragraphs, figures, tables))
+        except Exception as e:
+            logger.error(f"Error extracting {filepath}: {e}")
+    store.flush()
+    logger.info("Columnar extraction completed.")
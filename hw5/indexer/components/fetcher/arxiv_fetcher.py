@@ -67,7 +67,7 @@ async def calculate_actual_total(query: str, max_results: int, client: httpx.Asy
         logger.error(f"Error fetching total results from arXiv API: {response.status_code}")
         return 0
 
-async def fetch_arxiv(query: str, max_results: int = 10, start: int = 0, client: httpx.AsyncClient = None) -> int:
+async def fetch_arxiv(query: str, max_results: int = 10, start: int = 0, client: httpx.AsyncClient = None, on_paper=None) -> int:
     search_query = f"all:{query}"
     url=f'https://export.arxiv.org/api/query?search_query={search_query}&start={start}&max_results={max_results}'
     logger.info(f"Fetching arXiv API URL: {url}")
@@ -99,6 +99,9 @@ async def fetch_arxiv(query: str, max_results: int = 10, start: int = 0, client:
                     metadata = {"title": title,"authors": authors,"published": published, "summary": summary,"link": link or arxiv_id}
                     save_metadata_as_json(metadata, f"{filename_base}.json")
                     logger.info(f"Downloaded and saved paper {filename_base}")
+                    if on_paper:
+                        # hand the paper to the pipeline (extract, link, index) as soon as it is on disk
+                        on_paper(os.path.join(source_folder_name, filename_base))
                 logger.info(f"Waiting for {time_to_next_request} seconds to respect rate limiting...")
                 await asyncio.sleep(time_to_next_request)
             else:
@@ -115,7 +118,7 @@ async def fetch_arxiv(query: str, max_results: int = 10, start: int = 0, client:
     await asyncio.sleep(time_to_next_request)
     return entry_count
 
-async def fetch(query: str, total_amount: int, max_results: int = 10, start: int = 0):
+async def fetch(query: str, total_amount: int, max_results: int = 10, start: int = 0, on_paper=None):
     if not os.path.exists(source_folder_name):
         os.makedirs(source_folder_name)
 
@@ -133,7 +136,7 @@ async def fetch(query: str, total_amount: int, max_results: int = 10, start: int
     done: bool = False
     async with httpx.AsyncClient() as client:
         while processed < total and not done:
-            entry_count: int = await fetch_arxiv(query, max_results, processed, client)
+            entry_count: int = await fetch_arxiv(query, max_results, processed, client, on_paper)
             logger.info(f"Fetched {processed}+{entry_count} of {total} results.")
             processed += entry_count
             if entry_count == 0:
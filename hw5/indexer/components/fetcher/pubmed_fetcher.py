@@ -60,7 +60,7 @@ async def download_pmc_xml(pmcid: str, client: httpx.AsyncClient) -> bool:
     logger.info(f"Fetched PMC XML for {pmcid}. URL: {url} Status code: {response.status_code}")
     return response
 
-async def fetch_pubmed_central(query: str, max_results: int = 10, start: int = 0, client: httpx.AsyncClient = None, driver: webdriver.Chrome = None) -> int:
+async def fetch_pubmed_central(query: str, max_results: int = 10, start: int = 0, client: httpx.AsyncClient = None, driver: webdriver.Chrome = None, on_paper=None) -> int:
       # Wait for the page to load
     
     if api_key:
@@ -136,6 +136,9 @@ async def fetch_pubmed_central(query: str, max_results: int = 10, start: int = 0
                         f.write(fetch_response.content)
                     logger.info(f"Downloaded and saved PMC article {relative_path}.xml")
                     save_metadata_as_json(metadata, f"{relative_path}.json")
+                    if on_paper:
+                        # hand the paper to the pipeline (extract, link, index) as soon as it is on disk
+                        on_paper(relative_path)
                     logger.info(f"Waiting for {time_to_next_request} seconds to respect rate limiting...")
                     await asyncio.sleep(time_to_next_request)
                 else:
@@ -154,7 +157,7 @@ async def fetch_pubmed_central(query: str, max_results: int = 10, start: int = 0
     await asyncio.sleep(time_to_next_request)
     return entry_count
 
-async def fetch(query: str, total_amount: int, max_results: int = 10, start: int = 0):
+async def fetch(query: str, total_amount: int, max_results: int = 10, start: int = 0, on_paper=None):
     if not os.path.exists(source_folder_name):
         os.makedirs(source_folder_name)
 
@@ -177,7 +180,7 @@ async def fetch(query: str, total_amount: int, max_results: int = 10, start: int
     driver.implicitly_wait(5)
     async with httpx.AsyncClient() as client:
         while processed < total and not done:
-            entry_count = await fetch_pubmed_central(query, max_results, processed, client, driver)
+            entry_count = await fetch_pubmed_central(query, max_results, processed, client, driver, on_paper)
             logger.info(f"Fetched {processed}+{entry_count} of {total} results.")
             processed += entry_count
             if entry_count == 0:
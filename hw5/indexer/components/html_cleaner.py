@@ -1,10 +1,29 @@
 # Remove all HTML tags from a given string
 
+import html
 import re
 
+# Patterns are compiled once. Each one scans the text a single time (no backtracking across tags):
+# comments and the content of <script>/<style> are dropped, then every tag is removed.
+COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+SCRIPT_STYLE_PATTERN = re.compile(r"<(script|style)\b[^>]*>.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+TAG_PATTERN = re.compile(r"</?[A-Za-z!?][^<>]*>")
+
+
 def clean_html(raw_html):
-    cleanr = re.compile('<.*?>')
-    cleantext = re.sub(cleanr, '', raw_html)
-    cleantext = cleantext.replace('\n', ' ').replace('\r', ' ')
+    if not raw_html:
+        return ""
+    cleantext = raw_html
+    # substring checks are much cheaper than a regex scan, most texts have no comments, scripts or styles
+    if "<" in cleantext:
+        if "<!--" in cleantext:
+            cleantext = COMMENT_PATTERN.sub("", cleantext)
+        if "<s" in cleantext or "<S" in cleantext:
+            cleantext = SCRIPT_STYLE_PATTERN.sub("", cleantext)
+        cleantext = TAG_PATTERN.sub("", cleantext)
+    if "&" in cleantext:
+        # entities are decoded after removing the tags, so an escaped "&lt;b&gt;" stays text
+        cleantext = html.unescape(cleantext)
+    cleantext = cleantext.replace("\n", " ").replace("\r", " ")
     cleantext = cleantext.strip()
-    return cleantext
\ No newline at end of file
+    return cleantext
@@ -3,16 +3,25 @@
 import elasticsearch
 import logging
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+# Comma separated list of Elasticsearch hosts, e.g. "http://es1:9200,http://es2:9200"
+ES_HOSTS = os.getenv("ES_HOST", "http://localhost:9200").split(",")
+
 class Indexer:
-    def __init__(self, index_name: str):
+    def __init__(self, index_name: str, hosts: list[str] = None):
         self.index_name = index_name
-        self.es = elasticsearch.Elasticsearch(hosts=["http://localhost:9200"])
+        self.es = elasticsearch.Elasticsearch(hosts=hosts or ES_HOSTS)
 
-    def create_index(self):
-        settings = json.load(open(f'indexer_settings.json'))[self.index_name]
+    def create_index(self, settings: dict = None):
+        # settings default to the entry of this index in indexer_settings.json
+        settings = settings or json.load(open(f'indexer_settings.json'))[self.index_name]
         logger.info(f"Creating index {self.index_name} with settings: {settings}")
         if not self.es.indices.exists(index=self.index_name):
             self.es.indices.create(index=self.index_name, body=settings)
@@ -27,18 +36,75 @@ class Indexer:
         else:
             logger.info(f"Index {self.index_name} does not exist. No deletion performed.")
 
+    def bump_generation(self) -> int:
+        # The generation counter lives in the mapping _meta, readers (e.g. the client query cache)
+        # use it to drop results computed before the last reindex
+        meta = self.es.indices.get_mapping(index=self.index_name)[self.index_name]["mappings"].get("_meta", {})
+        generation = meta.get("generation", 0) + 1
+        self.es.indices.put_mapping(index=self.index_name, body={"_meta": {**meta, "generation": generation}})
+        logger.info(f"Index {self.index_name} is now at generation {generation}.")
+        return generation
+
     def index_document(self, document: dict):
         status = self.es.index(index=self.index_name, document=document)
         logger.info(f"Indexed document: {document.get('title', 'N/A')}")
         return status
 
-    def index_documents_bulk(self, documents: list):
+    def _to_action(self, doc: dict, id_field: str = None) -> dict:
+        action = {"_index": self.index_name, "_source": doc}
+        if id_field is not None and id_field in doc:
+            doc = dict(doc)
+            action["_id"] = doc.pop(id_field)
+            action["_source"] = doc
+        return action
+
+    def index_documents_bulk(self, documents: list, id_field: str = None, bump_generation: bool = True):
+        # with id_field the documents get a stable _id, so indexing them again overwrites instead of duplicating
         from elasticsearch import helpers
-        actions = [
-            {
-                "_index": self.index_name,
-                "_source": doc
-            }
-            for doc in documents
-        ]
-        return helpers.bulk(self.es, actions, stats_only=True, raise_on_error=False)
\ No newline at end of file
+        actions = [self._to_action(doc, id_field) for doc in documents]
+        status = helpers.bulk(self.es, actions, stats_only=True, raise_on_error=False)
+        if bump_generation:
+            self.bump_generation()
+        return status
+
+    def index_documents_parallel(self, documents, thread_count: int = 4, chunk_size: int = 500, queue_size: int = 4, max_retries: int = 3, id_field: str = None):
+        """Bulk index a (possibly huge) stream of documents with several threads.
+
+        At most thread_count + queue_size chunks are in memory: the reader blocks until a worker is free (backpressure).
+        Chunks rejected by Elasticsearch (429) are retried with exponential backoff. If id_field is given, its value
+        is used as the document _id. Returns (succeeded, failed) like index_documents_bulk.
+        """
+        from elasticsearch import helpers
+
+        def index_chunk(chunk):
+            try:
+                return helpers.bulk(self.es, chunk, stats_only=True, raise_on_error=False, max_retries=max_retries, initial_backoff=2)
+            except Exception as e:
+                logger.error(f"Bulk request of {len(chunk)} documents failed: {e}")
+                return 0, len(chunk)
+            finally:
+                slots.release()
+
+        slots = threading.BoundedSemaphore(thread_count + queue_size)
+        succeeded, failed = 0, 0
+        start = time.monotonic()
+        futures = []
+        documents = iter(documents)
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            while True:
+                chunk = [self._to_action(doc, id_field) for doc in islice(documents, chunk_size)]
+                if not chunk:
+                    break
+                slots.acquire()
+                futures.append(executor.submit(index_chunk, chunk))
+                # collect the completed chunks, so the futures list does not grow with the input
+                while futures and futures[0].done():
+                    ok, ko = futures.pop(0).result()
+                    succeeded, failed = succeeded + ok, failed + ko
+                    elapsed = time.monotonic() - start
+                    logger.info(f"Indexed {succeeded} documents into {self.index_name} ({failed} failed), {succeeded / max(elapsed, 1e-9):.0f} docs/s")
+            for future in futures:
+                ok, ko = future.result()
+                succeeded, failed = succeeded + ok, failed + ko
+        self.bump_generation()
+        return succeeded, failed
@@ -1,4 +1,5 @@
 import logging
+from typing import Callable
 
 logger = logging.getLogger(__name__)
 
@@ -6,7 +7,7 @@ import components.utils as utils
 import os
 import json
 
-def linker(paper: str, linker_function: function = None):
+def linker(paper: str, linker_function: Callable = None):
     logger.info(f"Linking {paper}...")
     paragraphs_file = f"{paper}_paragraphs.json"
     figures_file = f"{paper}_figures.json"
@@ -29,7 +30,7 @@ def linker(paper: str, linker_function: function = None):
         logger.warning(f"Missing files for {paper}. Skipping linking.")
 
 
-def link(data_path: str, linker_function: function = None):
+def link(data_path: str, linker_function: Callable = None):
     logger.info("Linking...")
     paper = utils.collect_papers(data_path)
     for paper in paper:
@@ -0,0 +1,407 @@
+# Indice invertito locale (Python + NumPy) con ranking BM25, usabile al posto di Elasticsearch
+# per corpus piccoli e test offline. Stessa interfaccia di Indexer, più una search().
+#
+# Ogni flush scrive un segmento immutabile in <data_path>/<index_name>/seg_NNNNN/:
+#   sources.jsonl, sources.offsets.npy     documenti originali e offset in byte (letti solo per i risultati)
+#   ids.json                               _id dei documenti del segmento
+#   <campo>.terms.npy                      dizionario dei termini ordinato (ricerca binaria, anche per i range)
+#   <campo>.df.npy, <campo>.offsets.npy    document frequency e offset delle posting list
+#   <campo>.postings.npy                   doc id delta-encoded in variable-byte (uint8)
+#   <campo>.tfs.npy, <campo>.lengths.npy   term frequency e lunghezza del campo per documento
+# Tutti i .npy vengono aperti in mmap.
+import json
+import logging
+import os
+import shutil
+import uuid
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from components.analysis import build_analyzer
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "local_index")
+FLUSH_EVERY = 10000  # buffered documents written as a new segment
+K1 = 1.2
+B = 0.75
+
+
+def vbyte_encode(values: np.ndarray) -> np.ndarray:
+    # 7 bits per byte, little endian, high bit set on every byte but the last of a value
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        n_bytes += values >= (np.uint64(1) << np.uint64(7 * k))
+    starts = np.cumsum(n_bytes) - n_bytes
+    out = np.zeros(int(n_bytes.sum()), dtype=np.uint8)
+    for k in range(int(n_bytes.max(initial=0))):
+        mask = n_bytes > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        byte |= np.where(n_bytes[mask] - 1 > k, np.uint64(0x80), np.uint64(0))
+        out[starts[mask] + k] = byte.astype(np.uint8)
+    return out
+
+
+def vbyte_decode(data: np.ndarray) -> np.ndarray:
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+    last = (data & 0x80) == 0
+    group = np.concatenate(([0], np.cumsum(last)[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    shift = (np.arange(len(data)) - starts[group]) * 7
+    # doc ids fit in the 53 bits represented exactly by float64 weights
+    return np.bincount(group, weights=(data & 0x7F).astype(np.float64) * np.exp2(shift)).astype(np.int64)
+
+
+class Segment:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.source_offsets = np.load(os.path.join(path, "sources.offsets.npy"), mmap_mode="r")
+        self._fields = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def field(self, name: str):
+        if name not in self._fields:
+            files = {}
+            for part in ("terms", "df", "offsets", "postings", "tfs", "lengths"):
+                file_path = os.path.join(self.path, f"{name}.{part}.npy")
+                files[part] = np.load(file_path, mmap_mode="r") if os.path.exists(file_path) else None
+            if files["terms"] is not None:
+                files["tf_offsets"] = np.concatenate(([0], np.cumsum(files["df"], dtype=np.int64)))
+            self._fields[name] = files
+        return self._fields[name]
+
+    def postings(self, name: str, term_index: int):
+        f = self.field(name)
+        gaps = vbyte_decode(f["postings"][f["offsets"][term_index]:f["offsets"][term_index + 1]])
+        tfs = f["tfs"][f["tf_offsets"][term_index]:f["tf_offsets"][term_index + 1]]
+        return np.cumsum(gaps), np.asarray(tfs, dtype=np.float64)
+
+    def lookup(self, name: str, term: str) -> int:
+        terms = self.field(name)["terms"]
+        if terms is None or len(terms) == 0:
+            return -1
+        i = int(np.searchsorted(terms, term))
+        return i if i < len(terms) and terms[i] == term else -1
+
+    def term_range(self, name: str, low, high, include_low: bool, include_high: bool) -> range:
+        terms = self.field(name)["terms"]
+        if terms is None:
+            return range(0)
+        start = 0 if low is None else int(np.searchsorted(terms, low, side="left" if include_low else "right"))
+        end = len(terms) if high is None else int(np.searchsorted(terms, high, side="right" if include_high else "left"))
+        return range(start, max(start, end))
+
+    def source(self, local_id: int) -> dict:
+        with open(os.path.join(self.path, "sources.jsonl"), "rb") as f:
+            f.seek(int(self.source_offsets[local_id]))
+            return json.loads(f.readline())
+
+
+class LocalIndexer:
+    def __init__(self, index_name: str, data_path: str = LOCAL_INDEX_PATH):
+        self.index_name = index_name
+        self.path = os.path.join(data_path, index_name)
+        self.buffer = []
+        self.meta = None
+        self.segments = []
+        self._load()
+
+    # --- Indexer interface ---
+
+    def create_index(self, settings: dict = None):
+        if self.meta is not None:
+            logger.info(f"Index {self.index_name} already exists.")
+            return
+        settings = settings or json.load(open(f'indexer_settings.json'))[self.index_name]
+        logger.info(f"Creating local index {self.index_name} with settings: {settings}")
+        os.makedirs(self.path, exist_ok=True)
+        self.meta = {"settings": settings, "segments": [], "generation": 0}
+        self._save_meta()
+        self._load()
+        logger.info(f"Index {self.index_name} created.")
+
+    def delete_index(self):
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+            logger.info(f"Index {self.index_name} deleted.")
+        else:
+            logger.info(f"Index {self.index_name} does not exist. No deletion performed.")
+        self.meta, self.segments, self.buffer = None, [], []
+
+    def bump_generation(self) -> int:
+        self.meta["generation"] = self.meta.get("generation", 0) + 1
+        self._save_meta()
+        return self.meta["generation"]
+
+    def index_document(self, document: dict, doc_id: str = None):
+        self._require_index()
+        doc_id = doc_id or uuid.uuid4().hex
+        self.buffer.append((doc_id, document))
+        if len(self.buffer) >= FLUSH_EVERY:
+            self.flush()
+        logger.info(f"Indexed document: {document.get('title', 'N/A')}")
+        return {"_id": doc_id, "result": "created"}
+
+    def index_documents_bulk(self, documents: list):
+        self._require_index()
+        succeeded = 0
+        for doc in documents:
+            self.buffer.append((uuid.uuid4().hex, doc))
+            succeeded += 1
+            if len(self.buffer) >= FLUSH_EVERY:
+                self.flush()
+        self.flush()
+        self.bump_generation()
+        # a document is never rejected (no mapping checks): a failed flush raises instead,
+        # the (succeeded, failed) pair only keeps the interface of Indexer.index_documents_bulk
+        return succeeded, 0
+
+    # --- Storage ---
+
+    def _require_index(self):
+        if self.meta is None:
+            raise ValueError(f"Index {self.index_name} does not exist")
+
+    def _load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        settings = self.meta["settings"]
+        analysis = settings.get("settings", {}).get("analysis", {})
+        default_analyzer = "default" if "default" in analysis.get("analyzer", {}) else "standard"
+        # field name -> analyzer (None for keyword and date fields, indexed as exact terms)
+        self.fields = {}
+        for name, mapping in settings.get("mappings", {}).get("properties", {}).items():
+            self.fields[name] = build_analyzer(mapping.get("analyzer", default_analyzer), analysis) if mapping.get("type") == "text" else None
+            for sub_name, sub_mapping in mapping.get("fields", {}).items():
+                if sub_mapping.get("type") == "keyword":
+                    self.fields[f"{name}.{sub_name}"] = None
+        self.segments = [Segment(os.path.join(self.path, s)) for s in self.meta["segments"]]
+
+    def _save_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=4)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        name = f"seg_{len(self.meta['segments']):05d}"
+        seg_path = os.path.join(self.path, name)
+        os.makedirs(seg_path, exist_ok=True)
+
+        offsets = []
+        with open(os.path.join(seg_path, "sources.jsonl"), "wb") as f:
+            for _, doc in self.buffer:
+                offsets.append(f.tell())
+                f.write(json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+        np.save(os.path.join(seg_path, "sources.offsets.npy"), np.array(offsets, dtype=np.int64))
+        with open(os.path.join(seg_path, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump([doc_id for doc_id, _ in self.buffer], f)
+
+        for field, analyzer in self.fields.items():
+            postings = defaultdict(list)  # term -> [(local doc id, tf)]
+            lengths = np.zeros(len(self.buffer), dtype=np.uint32)
+            for local_id, (_, doc) in enumerate(self.buffer):
+                # multi-fields ("title.raw") index the value of their parent field
+                value = doc.get(field.split(".")[0])
+                if value is None:
+                    continue
+                if analyzer is None:
+                    terms = [str(v) for v in value] if isinstance(value, list) else [str(value)]
+                else:
+                    terms = analyzer(value)
+                lengths[local_id] = len(terms)
+                for term, tf in Counter(terms).items():
+                    postings[term].append((local_id, tf))
+            self._write_field(seg_path, field, postings, lengths)
+
+        self.meta["segments"].append(name)
+        self._save_meta()
+        self.segments.append(Segment(seg_path))
+        logger.info(f"Flushed {len(self.buffer)} documents to segment {name} of {self.index_name}")
+        self.buffer = []
+
+    def _write_field(self, seg_path: str, field: str, postings: dict, lengths: np.ndarray):
+        terms = sorted(postings)
+        df = np.array([len(postings[t]) for t in terms], dtype=np.uint32)
+        doc_ids = np.array([d for t in terms for d, _ in postings[t]], dtype=np.int64)
+        tfs = np.array([tf for t in terms for _, tf in postings[t]], dtype=np.uint32)
+        # delta encoding restarts at the beginning of every posting list
+        tf_offsets = np.concatenate(([0], np.cumsum(df, dtype=np.int64)))
+        gaps = np.diff(doc_ids, prepend=0)
+        gaps[tf_offsets[:-1][df > 0]] = doc_ids[tf_offsets[:-1][df > 0]]
+        sizes = np.array([len(vbyte_encode(gaps[tf_offsets[i]:tf_offsets[i + 1]])) for i in range(len(terms))], dtype=np.int64)
+        base = os.path.join(seg_path, field)
+        np.save(f"{base}.terms.npy", np.array(terms, dtype=str) if terms else np.array([], dtype="<U1"))
+        np.save(f"{base}.df.npy", df)
+        np.save(f"{base}.offsets.npy", np.concatenate(([0], np.cumsum(sizes))).astype(np.int64))
+        np.save(f"{base}.postings.npy", vbyte_encode(gaps))
+        np.save(f"{base}.tfs.npy", np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16))
+        np.save(f"{base}.lengths.npy", lengths)
+
+    # --- Search ---
+
+    def search(self, query=None, size: int = 10, from_: int = 0, fields: list = None) -> dict:
+        """Search with a query string (multi_match on all the text fields) or an Elasticsearch query dict.
+
+        Supported queries: match_all, match, match_phrase, multi_match, term, terms, range, bool.
+        Phrases match the documents containing all of their terms.
+        Returns a response shaped like the one of Elasticsearch.
+        """
+        self._require_index()
+        self.flush()
+        self._bases = np.cumsum([0] + [len(s) for s in self.segments])
+        self._n_docs = int(self._bases[-1])
+        if query is None:
+            query = {"match_all": {}}
+        elif isinstance(query, str):
+            text_fields = fields or [f for f, a in self.fields.items() if a is not None]
+            query = {"multi_match": {"query": query, "fields": text_fields}}
+        scores, matched = self._evaluate(query)
+
+        total = int(matched.sum())
+        candidates = np.flatnonzero(matched)
+        top = from_ + size
+        if len(candidates) > top:
+            candidates = candidates[np.argpartition(-scores[candidates], top - 1)[:top]]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))][from_:top]
+        hits = []
+        for global_id in candidates:
+            seg_index = int(np.searchsorted(self._bases, global_id, side="right")) - 1
+            segment = self.segments[seg_index]
+            local_id = int(global_id - self._bases[seg_index])
+            hits.append({"_index": self.index_name, "_id": segment.ids[local_id], "_score": float(scores[global_id]), "_source": segment.source(local_id)})
+        return {"hits": {"total": {"value": total, "relation": "eq"}, "max_score": hits[0]["_score"] if hits else None, "hits": hits}}
+
+    def _evaluate(self, query: dict):
+        (kind, body), = query.items()
+        n = self._n_docs
+        if kind == "match_all":
+            return np.ones(n), np.ones(n, dtype=bool)
+        if kind == "match":
+            (field, spec), = body.items()
+            spec = spec if isinstance(spec, dict) else {"query": spec}
+            return self._match(field, spec["query"], spec.get("operator", "or"), spec.get("boost", 1.0))
+        if kind == "match_phrase":
+            (field, spec), = body.items()
+            spec = spec if isinstance(spec, dict) else {"query": spec}
+            return self._match(field, spec["query"], "and", spec.get("boost", 1.0))
+        if kind == "multi_match":
+            return self._multi_match(body)
+        if kind in ("term", "terms"):
+            (field, values), = body.items()
+            values = values if isinstance(values, list) else [values.get("value") if isinstance(values, dict) else values]
+            matched = np.zeros(n, dtype=bool)
+            for value in values:
+                for doc_ids, _ in self._term_postings(field, str(value)):
+                    matched[doc_ids] = True
+            return matched.astype(np.float64), matched
+        if kind == "range":
+            (field, bounds), = body.items()
+            return self._range(field, bounds)
+        if kind == "bool":
+            return self._bool(body)
+        raise ValueError(f"Unsupported query type for the local index: {kind}")
+
+    def _term_postings(self, field: str, term: str):
+        # yields (global doc ids, tfs) of the term in every segment
+        for base, segment in zip(self._bases, self.segments):
+            i = segment.lookup(field, term)
+            if i >= 0:
+                doc_ids, tfs = segment.postings(field, i)
+                yield doc_ids + base, tfs
+
+    def _field_lengths(self, field: str) -> np.ndarray:
+        parts = [segment.field(field)["lengths"] for segment in self.segments]
+        return np.concatenate([np.asarray(p, dtype=np.float64) if p is not None else np.zeros(len(s)) for p, s in zip(parts, self.segments)]) if parts else np.zeros(0)
+
+    def _match(self, field: str, text, operator: str = "or", boost: float = 1.0):
+        n = self._n_docs
+        analyzer = self.fields.get(field)
+        terms = analyzer(text) if analyzer is not None else [str(text)]
+        scores = np.zeros(n)
+        counts = np.zeros(n, dtype=np.int64)
+        if not terms:
+            return scores, np.zeros(n, dtype=bool)
+        lengths = self._field_lengths(field)
+        avgdl = lengths.mean() if n and lengths.mean() > 0 else 1.0
+        norms = K1 * (1 - B + B * lengths / avgdl)
+        for term in terms:
+            postings = list(self._term_postings(field, term))
+            if not postings:
+                continue
+            doc_ids = np.concatenate([p[0] for p in postings])
+            tfs = np.concatenate([p[1] for p in postings])
+            df = len(doc_ids)
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[doc_ids] += boost * idf * tfs / (tfs + norms[doc_ids])
+            counts[doc_ids] += 1
+        matched = counts >= len(terms) if operator == "and" else counts > 0
+        return np.where(matched, scores, 0.0), matched
+
+    def _multi_match(self, body: dict):
+        n = self._n_docs
+        field_results = []
+        # positions are not indexed: a phrase matches the documents containing all of its terms
+        operator = "and" if body.get("type") == "phrase" else body.get("operator", "or")
+        for spec in body.get("fields") or [f for f, a in self.fields.items() if a is not None]:
+            field, _, boost = spec.partition("^")
+            if field in self.fields:
+                field_results.append(self._match(field, body["query"], operator, float(boost) if boost else 1.0))
+        if not field_results:
+            return np.zeros(n), np.zeros(n, dtype=bool)
+        scores = np.stack([s for s, _ in field_results])
+        matched = np.any(np.stack([m for _, m in field_results]), axis=0)
+        if body.get("type") == "most_fields":
+            total = scores.sum(axis=0)
+        else:
+            # best_fields, also used for phrase and the other types
+            best = scores.max(axis=0)
+            total = best + body.get("tie_breaker", 0.0) * (scores.sum(axis=0) - best)
+        return total * body.get("boost", 1.0), matched
+
+    def _range(self, field: str, bounds: dict):
+        n = self._n_docs
+        matched = np.zeros(n, dtype=bool)
+        low = bounds.get("gte", bounds.get("gt"))
+        high = bounds.get("lte", bounds.get("lt"))
+        for base, segment in zip(self._bases, self.segments):
+            # keyword and date values are compared as strings (ISO dates sort chronologically)
+            for i in segment.term_range(field, None if low is None else str(low), None if high is None else str(high), "gte" in bounds, "lte" in bounds):
+                doc_ids, _ = segment.postings(field, i)
+                matched[doc_ids + base] = True
+        return matched.astype(np.float64), matched
+
+    def _bool(self, body: dict):
+        n = self._n_docs
+        scores = np.zeros(n)
+        matched = np.ones(n, dtype=bool)
+        as_list = lambda clauses: clauses if isinstance(clauses, list) else [clauses]
+        for clause in as_list(body.get("must", [])):
+            s, m = self._evaluate(clause)
+            scores += s
+            matched &= m
+        for clause in as_list(body.get("filter", [])):
+            matched &= self._evaluate(clause)[1]
+        for clause in as_list(body.get("must_not", [])):
+            matched &= ~self._evaluate(clause)[1]
+        should = as_list(body.get("should", []))
+        if should:
+            should_count = np.zeros(n, dtype=np.int64)
+            for clause in should:
+                s, m = self._evaluate(clause)
+                scores += s
+                should_count += m
+            default_minimum = 0 if body.get("must") or body.get("filter") else 1
+            matched &= should_count >= int(body.get("minimum_should_match", default_minimum))
+        return np.where(matched, scores, 0.0), matched
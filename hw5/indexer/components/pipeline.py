@@ -0,0 +1,144 @@
+# Esecuzione per paper delle fasi della pipeline (extract, link, index) appena il paper viene scaricato,
+# con checkpoint per fase, così un'esecuzione interrotta riprende da dove si era fermata.
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    # function(paper, context) works on one paper, paper is the path without extension (e.g. output/arxiv/2401.00001)
+    def __init__(self, name: str, function: Callable, depends_on: tuple = ()):
+        self.name = name
+        self.function = function
+        self.depends_on = tuple(depends_on)
+
+
+def topological_order(stages: list[Stage]) -> list[Stage]:
+    by_name = {stage.name: stage for stage in stages}
+    order, visiting, visited = [], set(), set()
+
+    def visit(stage: Stage):
+        if stage.name in visited:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Cycle in the pipeline at stage {stage.name}")
+        visiting.add(stage.name)
+        for dependency in stage.depends_on:
+            if dependency not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dependency}")
+            visit(by_name[dependency])
+        visiting.discard(stage.name)
+        visited.add(stage.name)
+        order.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return order
+
+
+class Checkpoint:
+    # Append-only log of the completed (paper, stage) pairs, one JSON object per line
+    def __init__(self, path: str):
+        self.path = path
+        self.completed = set()
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.completed.add((record["paper"], record["stage"]))
+            logger.info(f"Loaded {len(self.completed)} completed stages from {path}")
+
+    def is_done(self, paper: str, stage: str) -> bool:
+        return (paper, stage) in self.completed
+
+    def mark_done(self, paper: str, stage: str):
+        with self.lock:
+            self.completed.add((paper, stage))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"paper": paper, "stage": stage}) + "\n")
+
+
+class PipelineRunner:
+    """Runs the stages of every submitted paper, in dependency order, on a pool of worker threads.
+
+    Papers are submitted while the fetchers are still downloading (submit is the on_paper callback of the
+    fetchers) and the ones already on disk are submitted at start: stages already in the checkpoint are skipped.
+    If a stage fails, the stages depending on it are skipped for that paper and retried at the next run.
+    """
+
+    def __init__(self, stages: list[Stage], checkpoint: Checkpoint, workers: int = 4):
+        self.stages = topological_order(stages)
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.queue = asyncio.Queue()
+        self.submitted = set()
+        self.stage_times = {stage.name: [] for stage in self.stages}
+        self.failures = 0
+
+    def submit(self, paper: str, context=None):
+        if paper in self.submitted:
+            return
+        self.submitted.add(paper)
+        if all(self.checkpoint.is_done(paper, stage.name) for stage in self.stages):
+            return
+        self.queue.put_nowait((paper, context, time.monotonic()))
+
+    async def _worker(self, executor: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            paper, context, submitted_at = item
+            try:
+                await loop.run_in_executor(executor, self._process, paper, context)
+                logger.info(f"Paper {paper} completed {time.monotonic() - submitted_at:.1f}s after being fetched")
+            finally:
+                self.queue.task_done()
+
+    def _process(self, paper: str, context):
+        failed = set()
+        for stage in self.stages:
+            if any(dependency in failed for dependency in stage.depends_on):
+                failed.add(stage.name)
+                logger.warning(f"Skipping stage {stage.name} of {paper}: a dependency failed")
+                continue
+            if self.checkpoint.is_done(paper, stage.name):
+                continue
+            start = time.monotonic()
+            try:
+                stage.function(paper, context)
+            except Exception as e:
+                logger.error(f"Stage {stage.name} failed for {paper}: {e}")
+                failed.add(stage.name)
+                self.failures += 1
+                continue
+            self.stage_times[stage.name].append(time.monotonic() - start)
+            self.checkpoint.mark_done(paper, stage.name)
+
+    async def run(self, producers: list = ()):
+        """Process the submitted papers while the producers (e.g. the fetchers) run, until both are done."""
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        workers = [asyncio.create_task(self._worker(executor)) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*producers)
+            await self.queue.join()
+        finally:
+            for _ in workers:
+                self.queue.put_nowait(None)
+            await asyncio.gather(*workers)
+            executor.shutdown()
+        for name, times in self.stage_times.items():
+            if times:
+                logger.info(f"Stage {name}: {len(times)} papers, {sum(times) / len(times):.2f}s per paper")
+        return self.failures
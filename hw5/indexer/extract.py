@@ -11,6 +11,30 @@ import components.extractor.pubmed.pubmed_paragraph_extractor as pubmed_para_ext
 import components.extractor.pubmed.pubmed_figures_extractor as pubmed_figures_extractor
 import components.extractor.pubmed.pubmed_tables_extractor as pubmed_tables_extractor
 
+def main_columnar(from_json: bool = False):
+    # paragraphs, figures, tables and links of both sources in output/columnar (see components/columnar_store.py)
+    from components.columnar_store import ColumnarStore
+    import components.linker.arxiv as linker_arxiv
+    import components.linker.pubmed as linker_pubmed
+    store = ColumnarStore()
+    if from_json:
+        print("Converting the JSON files of the previous extraction...")
+        print(f"arxiv: {store.import_json('output/arxiv', 'arxiv')} papers, pubmed: {store.import_json('output/pubmed', 'pubmed')} papers")
+        return
+    print("Extracting and linking documents to the columnar store...")
+    common_extractor.extract_to_store("output/arxiv", "arxiv", store,
+                                      arxiv_para_extractor.extract_paragraphs_from_html,
+                                      arxiv_figures_extractor.extract_figures_from_html,
+                                      arxiv_tables_extractor.extract_table_from_html,
+                                      linker_arxiv.linker)
+    print("arxiv extraction completed.")
+    common_extractor.extract_to_store("output/pubmed", "pubmed", store,
+                                      pubmed_para_extractor.extract_paragraphs_from_xml,
+                                      pubmed_figures_extractor.extract_figures_from_xml,
+                                      pubmed_tables_extractor.extract_tables_from_xml,
+                                      linker_pubmed.linker)
+    print("pubmed extraction completed.")
+
 def main():
     print("Extracting paragraphs from documents...")
     common_extractor.extract("output/arxiv", 
@@ -26,4 +50,12 @@ def main():
     print("Paragraph extraction completed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Extract paragraphs, figures and tables of the downloaded papers.")
+    parser.add_argument("--columnar", action="store_true", help="Extract and link to the Parquet store in output/columnar instead of the per-paper JSON files (the link step is included).")
+    parser.add_argument("--from-json", action="store_true", help="With --columnar, convert the JSON files of a previous extraction instead of extracting again.")
+    args = parser.parse_args()
+    if args.columnar:
+        main_columnar(args.from_json)
+    else:
+        main()
\ No newline at end of file
@@ -27,5 +27,29 @@ def main():
     print("Indexing completed.")
 
 
+def main_columnar():
+    # figures and tables from the columnar store written by "extract --columnar"
+    from components.columnar_store import ColumnarStore
+    store = ColumnarStore()
+    print("Indexing documents...")
+    indexer: Indexer = Indexer("research_papers")
+    for source in ("arxiv", "pubmed"):
+        status = indexer.index_documents_bulk(dataloader.load_research_papers_data_from_directory(f"output/{source}"))
+        print(f"Succeeded :{status[0]}, Failed: {status[1]}")
+    for index_name, load in (("figures", dataloader.load_figures_data_from_store), ("tables", dataloader.load_tables_data_from_store)):
+        indexer = Indexer(index_name)
+        for source in ("arxiv", "pubmed"):
+            status = indexer.index_documents_bulk(load(store, source))
+            print(f"Succeeded :{status[0]}, Failed: {status[1]}")
+    print("Indexing completed.")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Index papers, figures and tables into Elasticsearch.")
+    parser.add_argument("--columnar", action="store_true", help="Read figures, tables, paragraphs and links from the columnar store (output/columnar).")
+    args = parser.parse_args()
+    if args.columnar:
+        main_columnar()
+    else:
+        main()
\ No newline at end of file
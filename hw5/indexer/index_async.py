@@ -0,0 +1,43 @@
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', filemode='w', filename='index_async.log')
+logger = logging.getLogger(__name__)
+
+import asyncio
+from elasticsearch import AsyncElasticsearch
+
+import components.dataloader as dataloader
+from components.async_indexer import AsyncIndexer
+from components.indexer import ES_HOSTS
+
+
+async def index_source(indexer: AsyncIndexer, documents, source: str):
+    status = await indexer.index_documents_bulk(documents, bump_generation=False)
+    print(f"[{indexer.index_name}/{source}] Succeeded :{status[0]}, Failed: {status[1]}")
+    return status
+
+
+async def main():
+    print("Indexing documents...")
+    # One client (and one connection pool) shared by all the indexers
+    es = AsyncElasticsearch(hosts=ES_HOSTS, maxsize=20)
+    try:
+        research_papers = AsyncIndexer("research_papers", es=es)
+        figures = AsyncIndexer("figures", es=es)
+        tables = AsyncIndexer("tables", es=es)
+        await asyncio.gather(
+            index_source(research_papers, dataloader.load_research_papers_data_from_directory("output/arxiv"), "arxiv"),
+            index_source(research_papers, dataloader.load_research_papers_data_from_directory("output/pubmed"), "pubmed"),
+            index_source(figures, dataloader.load_figures_data_from_directory("output/arxiv"), "arxiv"),
+            index_source(figures, dataloader.load_figures_data_from_directory("output/pubmed"), "pubmed"),
+            index_source(tables, dataloader.load_tables_data_from_directory("output/arxiv"), "arxiv"),
+            index_source(tables, dataloader.load_tables_data_from_directory("output/pubmed"), "pubmed"),
+        )
+        # two sources per index: one generation bump per index once both are loaded
+        await asyncio.gather(*(indexer.bump_generation() for indexer in (research_papers, figures, tables)))
+    finally:
+        await es.close()
+    print("Indexing completed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', filemode='w', filename='pipeline.log')
+logger = logging.getLogger(__name__)
+
+import argparse
+import asyncio
+import os
+
+import components.dataloader as dataloader
+import components.extractor.common as common_extractor
+import components.linker.common as linker_common
+import components.utils as utils
+from components.indexer import Indexer
+from components.pipeline import Checkpoint, PipelineRunner, Stage
+
+CHECKPOINT_PATH = "output/pipeline_checkpoint.jsonl"
+GENERATION_INTERVAL = 30  # seconds between two generation bumps while indexing (invalidates the client cache)
+
+arxiv_query = "text-to-sql+OR+\"Natural language to SQL\""
+pubmed_query = "glyphosate+AND+cancer+risk"
+total_amount = 3000
+
+
+class Source:
+    # Everything the stages need to know about a source, passed to them as context
+    def __init__(self, name: str, data_path: str, paragraphs_extractor, figures_extractor, tables_extractor, linker_function):
+        self.name = name
+        self.data_path = data_path
+        self.paragraphs_extractor = paragraphs_extractor
+        self.figures_extractor = figures_extractor
+        self.tables_extractor = tables_extractor
+        self.linker_function = linker_function
+
+
+def load_sources() -> dict[str, Source]:
+    # imported here, the extractors and linkers pull in bs4/lxml
+    import components.extractor.arxiv.arxiv_paragraph_extractor as arxiv_para_extractor
+    import components.extractor.arxiv.arxiv_figures_extractor as arxiv_figures_extractor
+    import components.extractor.arxiv.arxiv_tables_extractor as arxiv_tables_extractor
+    import components.extractor.pubmed.pubmed_paragraph_extractor as pubmed_para_extractor
+    import components.extractor.pubmed.pubmed_figures_extractor as pubmed_figures_extractor
+    import components.extractor.pubmed.pubmed_tables_extractor as pubmed_tables_extractor
+    import components.linker.arxiv as linker_arxiv
+    import components.linker.pubmed as linker_pubmed
+    return {
+        "arxiv": Source("arxiv", "output/arxiv", arxiv_para_extractor.extract_paragraphs_from_html, arxiv_figures_extractor.extract_figures_from_html,
+                        arxiv_tables_extractor.extract_table_from_html, linker_arxiv.linker),
+        "pubmed": Source("pubmed", "output/pubmed", pubmed_para_extractor.extract_paragraphs_from_xml, pubmed_figures_extractor.extract_figures_from_xml,
+                         pubmed_tables_extractor.extract_tables_from_xml, linker_pubmed.linker),
+    }
+
+
+def paper_filename(paper: str) -> str:
+    return os.path.basename(paper) + (".html" if os.path.exists(f"{paper}.html") else ".xml")
+
+
+def build_stages(indexers: dict[str, Indexer]) -> list[Stage]:
+    def extract(paper: str, source: Source):
+        common_extractor.extract_paragraphs(paper, source.data_path, source.paragraphs_extractor)
+        common_extractor.extract_figures(paper, source.data_path, source.figures_extractor)
+        common_extractor.extract_tables(paper, source.data_path, source.tables_extractor)
+
+    def link(paper: str, source: Source):
+        linker_common.linker(paper, source.linker_function)
+        # the linker only logs a warning when the extracted files are missing
+        if not os.path.exists(f"{paper}_links.json"):
+            raise RuntimeError(f"No links written for {paper}")
+
+    # stable ids: a stage that is run again after a crash overwrites its documents instead of duplicating them
+    def index_paper(paper: str, source: Source):
+        document = dataloader.load_research_paper(source.data_path, paper_filename(paper))
+        _, failed = indexers["research_papers"].index_documents_bulk([{**document, "doc_id": os.path.basename(paper)}], id_field="doc_id", bump_generation=False)
+        if failed:
+            raise RuntimeError(f"{paper} not indexed into research_papers")
+
+    def index_figures_and_tables(paper: str, source: Source):
+        filename = paper_filename(paper)
+        figures = [{**f, "doc_id": f"{os.path.basename(paper)}/{f['figure_id']}"} for f in dataloader.load_figures(source.data_path, filename)]
+        tables = [{**t, "doc_id": f"{os.path.basename(paper)}/{t['table_id']}"} for t in dataloader.load_tables(source.data_path, filename)]
+        for index_name, documents in (("figures", figures), ("tables", tables)):
+            if documents:
+                _, failed = indexers[index_name].index_documents_bulk(documents, id_field="doc_id", bump_generation=False)
+                if failed:
+                    raise RuntimeError(f"{failed} documents of {paper} not indexed into {index_name}")
+
+    # the paper itself is searchable right after the download, figures and tables after extraction and linking
+    return [
+        Stage("extract", extract),
+        Stage("link", link, depends_on=["extract"]),
+        Stage("index_paper", index_paper),
+        Stage("index_figures_tables", index_figures_and_tables, depends_on=["link"]),
+    ]
+
+
+async def bump_generations(indexers: dict[str, Indexer], done: asyncio.Event):
+    while True:
+        try:
+            await asyncio.wait_for(done.wait(), timeout=GENERATION_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        for indexer in indexers.values():
+            await asyncio.to_thread(indexer.bump_generation)
+        if done.is_set():
+            return
+
+
+async def main(source_names: list[str], fetch: bool, workers: int, checkpoint_path: str):
+    sources = {name: source for name, source in load_sources().items() if name in source_names}
+    indexers = {name: Indexer(name) for name in ("research_papers", "figures", "tables")}
+    for indexer in indexers.values():
+        indexer.create_index()
+    runner = PipelineRunner(build_stages(indexers), Checkpoint(checkpoint_path), workers=workers)
+
+    # papers downloaded by previous runs: only the stages missing from the checkpoint are run
+    for source in sources.values():
+        for paper in utils.collect_papers(source.data_path):
+            runner.submit(paper, source)
+    print(f"{runner.queue.qsize()} papers already on disk to process")
+
+    producers = []
+    if fetch:
+        if "arxiv" in sources:
+            import components.fetcher.arxiv_fetcher as arxiv_fetcher
+            producers.append(arxiv_fetcher.fetch(arxiv_query, total_amount, 1000, on_paper=lambda paper: runner.submit(paper, sources["arxiv"])))
+        if "pubmed" in sources:
+            import components.fetcher.pubmed_fetcher as pubmed_fetcher
+            producers.append(pubmed_fetcher.fetch(pubmed_query, total_amount, max_results=50, on_paper=lambda paper: runner.submit(paper, sources["pubmed"])))
+
+    done = asyncio.Event()
+    bumper = asyncio.create_task(bump_generations(indexers, done))
+    try:
+        failures = await runner.run(producers)
+    finally:
+        done.set()
+        await bumper
+    print(f"Pipeline completed: {len(runner.submitted)} papers, {failures} failed stages (retried at the next run).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch, extract, link and index every paper as soon as it is downloaded, resuming from the checkpoint.")
+    parser.add_argument("--sources", nargs="+", choices=["arxiv", "pubmed"], default=["arxiv", "pubmed"], help="Sources to process.")
+    parser.add_argument("--no-fetch", action="store_true", help="Only process the papers already downloaded.")
+    parser.add_argument("--workers", type=int, default=4, help="Papers processed in parallel.")
+    parser.add_argument("--checkpoint", type=str, default=CHECKPOINT_PATH, help="File with the completed stages of every paper.")
+    args = parser.parse_args()
+    asyncio.run(main(args.sources, not args.no_fetch, args.workers, args.checkpoint))
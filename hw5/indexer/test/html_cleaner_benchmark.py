@@ -0,0 +1,59 @@
+# Micro-benchmark of clean_html and of the paragraph cleaning done by the dataloader,
+# against the previous implementations. Run from the indexer folder: python -m test.html_cleaner_benchmark
+import re
+import timeit
+
+import components.dataloader as dataloader
+import components.html_cleaner as html_cleaner
+
+def clean_html_regex_per_call(raw_html):
+    cleanr = re.compile('<.*?>')
+    cleantext = re.sub(cleanr, '', raw_html)
+    cleantext = cleantext.replace('\n', ' ').replace('\r', ' ')
+    cleantext = cleantext.strip()
+    return cleantext
+
+def referencing_text_per_figure(paragraphs_data, links):
+    # previous dataloader loop: every paragraph cleaned for every figure, then the joined text cleaned again
+    referencing_text = []
+    for paragraph in paragraphs_data:
+        text = clean_html_regex_per_call(paragraph.get("text", ""))
+        if paragraph.get("paragraph_id") in links:
+            referencing_text.append(text)
+    return clean_html_regex_per_call("\n".join(referencing_text))
+
+def referencing_text_per_paper(paragraphs_data, links_per_figure):
+    paragraphs = dataloader.ParagraphTexts(paragraphs_data)
+    return [paragraphs.referencing_text(links) for links in links_per_figure]
+
+def make_inputs():
+    paragraph = "<p>Deep <b>neural</b> networks, as shown in <a href='#fig1'>Figure 1</a>, reach &lt;5% error.</p>\n"
+    page = "<html><head><style>p { color: red; }</style></head><body>" + paragraph * 20000 + "</body></html>"
+    return {
+        "paragraph (html)": paragraph,
+        "paragraph (clean)": html_cleaner.clean_html(paragraph),
+        f"page ({len(page) // 1024} KB)": page,
+    }
+
+def make_paper(n_paragraphs: int = 300, n_figures: int = 20, links_per_figure: int = 3):
+    paragraphs_data = [{"paragraph_id": f"p{i}", "text": f"<p>Paragraph {i} cites <a href='#f{i % n_figures}'>Figure</a>.</p>"} for i in range(n_paragraphs)]
+    links = [[f"p{(f * 7 + j * 13) % n_paragraphs}" for j in range(links_per_figure)] for f in range(n_figures)]
+    return paragraphs_data, links
+
+def best_time(function, number: int, repeat: int) -> float:
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+def main(repeat: int = 5):
+    for name, text in make_inputs().items():
+        number = max(1, 200000 // len(text))
+        for label, function in (("old", clean_html_regex_per_call), ("new", html_cleaner.clean_html)):
+            print(f"{name:<24} {label}: {best_time(lambda: function(text), number, repeat) * 1e6:10.1f} us/call")
+
+    paragraphs_data, links = make_paper()
+    old = best_time(lambda: [referencing_text_per_figure(paragraphs_data, l) for l in links], 5, repeat)
+    new = best_time(lambda: referencing_text_per_paper(paragraphs_data, links), 5, repeat)
+    print(f"{'figures of one paper':<24} old: {old * 1e6:10.1f} us/paper")
+    print(f"{'figures of one paper':<24} new: {new * 1e6:10.1f} us/paper")
+
+if __name__ == "__main__":
+    main()
@@ -14,4 +14,16 @@ def test_clean_html():
     assert html_cleaner.clean_html(raw_html) == expected_output
 # Remove all HTML tags from a given string
 
-test_clean_html()
\ No newline at end of file
+test_clean_html()
+
+def test_clean_html_entities_and_scripts():
+    raw_html = "<html><head><style>p { color: red; }</style><script>if (a < b) { alert('<b>'); }</script></head><body><p>Fish &amp; chips &lt;3</p></body></html>"
+    assert html_cleaner.clean_html(raw_html) == "Fish & chips <3"
+
+    # text around a lone "<" is not a tag
+    assert html_cleaner.clean_html("x < y and y > z") == "x < y and y > z"
+
+    assert html_cleaner.clean_html("<!-- comment <b>x</b> -->line one\nline two") == "line one line two"
+    assert html_cleaner.clean_html(None) == ""
+
+test_clean_html_entities_and_scripts()
@@ -0,0 +1,35 @@
+import tempfile
+
+import numpy as np
+
+import components.local_index as local_index
+
+def test_vbyte_roundtrip():
+    values = np.array([0, 1, 127, 128, 300, 16384, 2**31 + 5])
+    assert local_index.vbyte_decode(local_index.vbyte_encode(values)).tolist() == values.tolist()
+
+def test_local_search():
+    with tempfile.TemporaryDirectory() as data_path:
+        indexer = local_index.LocalIndexer("research_papers", data_path=data_path)
+        indexer.create_index()
+        succeeded, failed = indexer.index_documents_bulk([
+            {"title": "Running neural networks", "summary": "Training deep networks", "authors": ["Rossi"], "published": "2023-01-10"},
+            {"title": "Graph databases", "summary": "Queries on graphs", "authors": ["Bianchi"], "published": "2019-05-02"},
+        ])
+        assert (succeeded, failed) == (2, 0)
+        indexer.index_document({"title": "A network of graphs", "summary": "", "authors": ["Rossi"], "published": "2021-03-01"}, doc_id="net")
+        indexer.flush()
+
+        # reopened from disk, the english analyzer stems "network" and "run"
+        reopened = local_index.LocalIndexer("research_papers", data_path=data_path)
+        response = reopened.search("run network")
+        assert response["hits"]["total"]["value"] == 2
+        assert response["hits"]["hits"][0]["_source"]["title"] == "Running neural networks"
+
+        query = {"bool": {"must": [{"multi_match": {"query": "graph", "fields": ["title^2", "summary"]}}],
+                          "filter": [{"term": {"authors": "Rossi"}}, {"range": {"published": {"gte": "2020"}}}]}}
+        hits = reopened.search(query)["hits"]["hits"]
+        assert [h["_id"] for h in hits] == ["net"]
+
+test_vbyte_roundtrip()
+test_local_search()
@@ -1,8 +1,8 @@
-import jellyfish
 import argparse
 import os
 import pandas as pd
-import hashlib
+
+import blocking_keys
 
 WORKING_DIR = "blocks1"
 COLUMN_NAMES = []
@@ -20,31 +20,11 @@ def init():
                 SUFFIXES.append(suffix)
 
 
-def get_typo_tolerant_keys(row) -> str:
-    brand = str(row.get('manufacturer', '')).lower().strip()
-    model = str(row.get('model', '')).lower().strip()
-    brand_key = jellyfish.soundex(brand)
-    model_key = jellyfish.soundex(model)
-    key_string = f"{brand_key}_{model_key}"
-    key_hash = hashlib.md5(key_string.encode()).hexdigest()
-    return key_hash
-
-
-def handle_row(row):
-    # row is now a pandas Series, so we can access keys directly with brackets
-    # Create clean series for each entity based on the schema
-    first_row_data = {col: row[f"{col}_used_cars"] for col in COLUMN_NAMES if f"{col}_used_cars" in row}
-    second_row_data = {col: row[f"{col}_vehicles"] for col in COLUMN_NAMES if f"{col}_vehicles" in row}
-
-    first_row = pd.Series(first_row_data)
-    second_row = pd.Series(second_row_data)
-
-    first_key = get_typo_tolerant_keys(first_row)
-    second_key = get_typo_tolerant_keys(second_row)
-    #print(f"Processed row with keys: {first_key} (used_cars) vs {second_key} (vehicles)")
-    if first_key == second_key:
-        return row, first_key  # Return the key as well for file naming
-    return row, None
+def block_chunk(chunk: pd.DataFrame) -> pd.Series:
+    # A pair is blocked when both entities have the same soundex(manufacturer)_soundex(model) key
+    first_key = blocking_keys.brand_model_soundex_key(chunk, SUFFIXES[0])
+    second_key = blocking_keys.brand_model_soundex_key(chunk, SUFFIXES[1])
+    return first_key == second_key
 
 
 def main():
@@ -56,17 +36,10 @@ def main():
     args = parser.parse_args()
 
     # Process first table
+    header = {args.output: not os.path.exists(args.output), args.excluded: not os.path.exists(args.excluded)}
     for chunk in pd.read_csv(args.table1, chunksize=100000):
-        # Using iterrows allows access by string keys, handling spaces correctly
-        for index, row in chunk.iterrows():
-            processed_row, key = handle_row(row)
-            if key is not None:
-                # Append to the file for that specific block
-                processed_row.to_frame().T.to_csv(args.output, mode='a', index=False,
-                                                  header=not os.path.exists(args.output))
-            else:
-                processed_row.to_frame().T.to_csv(args.excluded, mode='a', index=False,
-                                                  header=not os.path.exists(args.excluded))
+        blocked = block_chunk(chunk)
+        blocking_keys.write_partitions(chunk, blocked, args.output, args.excluded, header)
 
 
 if __name__ == "__main__":
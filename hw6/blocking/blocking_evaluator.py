@@ -1,24 +1,158 @@
 import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
 import argparse
+import math
+import time
 # we have excluded_pairs.csv e blocked_pairs.csv.
 # if match label is 1 in blocked_pairs.csv we have a true positive, if match label is 0 we have a false positive.
 # if match label is 1 in excluded_pairs.csv we have a false negative, if match label is 0 we have a true negative.
+# Candidate pairs generated from the whole tables (entity_blocking.py, sorted_neighborhood.py, canopy_blocking.py)
+# are evaluated against the match table instead: pair completeness, pair quality and reduction ratio.
+# With --key_report every blocking key is evaluated on its own, with the distribution of its block sizes.
+# Every file is read in chunks and only the needed columns.
 
+CHUNK_SIZE = 1000000
+# buckets of the block size histogram, in comparisons (rows of the block in table1 * rows in table2)
+HISTOGRAM_EDGES = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def count_rows(path):
+    if path.endswith(".parquet"):
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=["row_id"], chunksize=CHUNK_SIZE))
+
+
+def label_counts(path):
+    # (matches, non matches) of a pairs file
+    positives, negatives = 0, 0
+    for chunk in pd.read_csv(path, usecols=["match_label"], chunksize=CHUNK_SIZE):
+        positives += int((chunk["match_label"] == 1).sum())
+        negatives += int((chunk["match_label"] == 0).sum())
+    return positives, negatives
+
+
+def pair_keys(first, second):
+    return (first.astype(np.uint64) << np.uint64(32)) | second.astype(np.uint64)
+
+
+def read_matches(match_table_path):
+    keys = [pair_keys(chunk["row_id_used_cars"].to_numpy(), chunk["row_id_vehicles"].to_numpy())
+            for chunk in pd.read_csv(match_table_path, usecols=["row_id_used_cars", "row_id_vehicles"], chunksize=CHUNK_SIZE)]
+    return np.unique(np.concatenate(keys)) if keys else np.array([], dtype=np.uint64)
+
+
+def print_pair_metrics(found, candidates, matches, rows1, rows2):
+    pair_completeness = found / matches if matches > 0 else 0
+    pair_quality = found / candidates if candidates > 0 else 0
+    reduction_ratio = 1 - candidates / (rows1 * rows2) if rows1 * rows2 > 0 else 0
+    f_score = 2 * (pair_completeness * reduction_ratio) / (pair_completeness + reduction_ratio) if (pair_completeness + reduction_ratio) > 0 else 0
+    print("Pair completeness: ", pair_completeness)
+    print("Pair quality: ", pair_quality)
+    print("Reduction ratio: ", reduction_ratio)
+    print("F Score (PC, RR): ", f_score)
+    print("Candidates: ", candidates)
+    print("Matches found: ", found)
+    print("Matches: ", matches)
+
+
+def evaluate_candidates(candidates_path, match_table_path, rows1, rows2):
+    matches = read_matches(match_table_path)
+    candidates, found = 0, 0
+    for chunk in pd.read_csv(candidates_path, usecols=["row_id_used_cars", "row_id_vehicles"], chunksize=CHUNK_SIZE):
+        keys = pair_keys(chunk["row_id_used_cars"].to_numpy(), chunk["row_id_vehicles"].to_numpy())
+        found += int(np.isin(keys, matches).sum())
+        candidates += len(chunk)
+    print_pair_metrics(found, candidates, len(matches), rows1, rows2)
+
+
+def row_keys(index):
+    # key of every row of an inverted index, sorted by row id
+    keys = np.repeat(index.keys, index.sizes)
+    order = np.argsort(index.row_ids, kind="stable")
+    return index.row_ids[order], keys[order]
+
+
+def keys_of(row_ids, keys, query):
+    # (has a key, key) for every queried row id
+    if not len(row_ids):
+        return np.zeros(len(query), dtype=bool), np.zeros(len(query), dtype=np.uint64)
+    positions = np.minimum(np.searchsorted(row_ids, query), len(row_ids) - 1)
+    return row_ids[positions] == query, keys[positions]
+
+
+def print_block_sizes(comparisons):
+    if not len(comparisons):
+        print("Block size: no blocks")
+        return
+    total = comparisons.sum()
+    ordered = np.sort(comparisons)
+    top = ordered[-max(1, math.ceil(len(ordered) * 0.01)):]
+    # Gini coefficient of the comparisons over the blocks: 0 all blocks alike, close to 1 a few blocks hold everything
+    ranks = np.arange(1, len(ordered) + 1)
+    gini = 2 * (ranks * ordered).sum() / (len(ordered) * total) - (len(ordered) + 1) / len(ordered) if total > 0 else 0
+    print(f"Block size (comparisons): max {ordered[-1]}, mean {ordered.mean():.1f}, median {np.median(ordered):.1f}")
+    print(f"Skew: top 1% of the blocks hold {top.sum() / total:.2%} of the comparisons, Gini {gini:.3f}")
+    counts, _ = np.histogram(comparisons, bins=HISTOGRAM_EDGES + [math.inf])
+    sums, _ = np.histogram(comparisons, bins=HISTOGRAM_EDGES + [math.inf], weights=comparisons)
+    for low, high, count, share in zip(HISTOGRAM_EDGES, HISTOGRAM_EDGES[1:] + [math.inf], counts, sums / total):
+        print(f"  [{low}, {high}): {count} blocks, {share:.2%} of the comparisons")
+
+
+def key_report(table1, table2, match_table_path, strategies=None, chunk_size=CHUNK_SIZE):
+    # imported here: the blocking keys pull in jellyfish, not needed by the other evaluations
+    import entity_blocking
+
+    strategies = strategies or entity_blocking.STRATEGIES
+    timings = {}
+    indexes1, rows1 = entity_blocking.build_indexes(table1, strategies, chunk_size, timings)
+    indexes2, rows2 = entity_blocking.build_indexes(table2, strategies, chunk_size, timings)
+    matches = read_matches(match_table_path)
+    match_ids1 = (matches >> np.uint64(32)).astype(np.int64)
+    match_ids2 = (matches & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    print(f"{rows1} x {rows2} rows, {len(matches)} matches")
+
+    for strategy in strategies:
+        start_time = time.perf_counter()
+        first, second = indexes1[strategy], indexes2[strategy]
+        _, i1, i2 = np.intersect1d(first.keys, second.keys, assume_unique=True, return_indices=True)
+        comparisons = first.sizes[i1] * second.sizes[i2]
+        # a match is found by the key when both rows have the same key
+        has_key1, keys1 = keys_of(*row_keys(first), match_ids1)
+        has_key2, keys2 = keys_of(*row_keys(second), match_ids2)
+        found = int((has_key1 & has_key2 & (keys1 == keys2)).sum())
+        over_cap = comparisons > entity_blocking.DEFAULT_CAPS.get(strategy, math.inf)
+        timings[strategy] += time.perf_counter() - start_time
+
+        print(f"\n== {strategy} ==")
+        print(f"Time: {timings[strategy]:.2f} seconds (keys, index and evaluation)")
+        print(f"Blocks: {len(comparisons)} shared by the two tables, {len(first)} + {len(second)} keys")
+        print_pair_metrics(found, int(comparisons.sum()), len(matches), rows1, rows2)
+        print(f"Over the cap of entity_blocking: {int(over_cap.sum())} blocks, {int(comparisons[over_cap].sum())} comparisons")
+        print_block_sizes(comparisons)
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-b", "--blocked", type=str, default="blocked_pairs.csv", help="CSV file containing the blocked pairs with match labels")
     parser.add_argument("-e", "--excluded", type=str, default="excluded_pairs.csv", help="CSV file containing the excluded pairs with match labels")
+    parser.add_argument("-c", "--candidates", type=str, default=None, help="CSV file with candidate pairs (row_id_used_cars, row_id_vehicles) to evaluate against the match table")
+    parser.add_argument("-k", "--key_report", action="store_true", help="Evaluate every blocking key on the aligned datasets, with block sizes and timing")
+    parser.add_argument("--keys", nargs="+", default=None, help="Blocking keys of --key_report (default: all the keys of blocking2)")
+    parser.add_argument("-m", "--match_table", type=str, default="../dataset/match_table.csv", help="Match table, used with --candidates and --key_report")
+    parser.add_argument("--tables", nargs=2, default=["../dataset/a_used_cars_data.csv", "../dataset/a_vehicles.csv"], help="Aligned datasets, used with --candidates and --key_report")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE, help="Rows read at a time by --key_report")
     args = parser.parse_args()
 
-    blocked_df = pd.read_csv(args.blocked)
-    excluded_df = pd.read_csv(args.excluded)
+    if args.key_report:
+        key_report(args.tables[0], args.tables[1], args.match_table, args.keys, args.chunk_size)
+        return
+    if args.candidates:
+        evaluate_candidates(args.candidates, args.match_table, count_rows(args.tables[0]), count_rows(args.tables[1]))
+        return
 
-    TP = len(blocked_df[blocked_df['match_label'] == 1])
-    FP = len(blocked_df[blocked_df['match_label'] == 0])
-    FN = len(excluded_df[excluded_df['match_label'] == 1])
-    TN = len(excluded_df[excluded_df['match_label'] == 0])
+    TP, FP = label_counts(args.blocked)
+    FN, TN = label_counts(args.excluded)
 
     precision = TP / (TP + FP) if (TP + FP) > 0 else 0
     recall = TP / (TP + FN) if (TP + FN) > 0 else 0
@@ -32,4 +166,4 @@ def main():
     print("TN: ", TN)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,84 @@
+import jellyfish
+import numpy as np
+import pandas as pd
+
+# Vectorized blocking keys, shared by blocking1.py and blocking2.py.
+# Keys are computed for a whole chunk at once: the phonetic encoding runs once per distinct value,
+# and the keys of the two entities of a pair are compared column-wise.
+
+
+def entity_column(chunk: pd.DataFrame, column: str, suffix: str) -> pd.Series:
+    # Same text as str(row.get(column, '')).lower().strip() on the entity (missing values become "nan")
+    name = f"{column}{suffix}"
+    if name not in chunk.columns:
+        return pd.Series("", index=chunk.index, dtype="object")
+    return chunk[name].map(str).str.lower().str.strip()
+
+
+def soundex(values: pd.Series) -> pd.Series:
+    codes, uniques = pd.factorize(values)
+    encoded = np.array([jellyfish.soundex(v) for v in uniques], dtype=object)
+    return pd.Series(encoded[codes], index=values.index, dtype="object")
+
+
+def brand_model_soundex_key(chunk: pd.DataFrame, suffix: str) -> pd.Series:
+    # blocking1: soundex(manufacturer)_soundex(model)
+    return soundex(entity_column(chunk, "manufacturer", suffix)) + "_" + soundex(entity_column(chunk, "model", suffix))
+
+
+def year_column(chunk: pd.DataFrame, suffix: str) -> pd.Series:
+    if f"year{suffix}" not in chunk.columns:
+        return pd.Series("", index=chunk.index, dtype="object")
+    return chunk[f"year{suffix}"].map(str).str.strip()
+
+
+# blocking2 key strategies, each one None where it does not apply to the row
+
+def brand_model_soundex(chunk: pd.DataFrame, suffix: str) -> pd.Series:
+    # 1. Brand+Model soundex
+    brand, model = entity_column(chunk, "manufacturer", suffix), entity_column(chunk, "model", suffix)
+    return (soundex(brand) + "_" + soundex(model)).where((brand != "") & (model != ""))
+
+
+def brand_model_initial(chunk: pd.DataFrame, suffix: str) -> pd.Series:
+    # 2. Brand + first char of Model
+    brand, model = entity_column(chunk, "manufacturer", suffix), entity_column(chunk, "model", suffix)
+    return (brand + "_" + model.str[:1]).where((brand != "") & (model != ""))
+
+
+def model_only(chunk: pd.DataFrame, suffix: str) -> pd.Series:
+    # 3. Model only
+    model = entity_column(chunk, "model", suffix)
+    return model.where(model != "")
+
+
+def year_key(chunk: pd.DataFrame, suffix: str) -> pd.Series:
+    # 4. Year (if present and valid) used as a loose block key
+    year = year_column(chunk, suffix)
+    return ("year_" + year).where(year.str.fullmatch(r"\d{4}"))
+
+
+KEY_STRATEGIES = {
+    "brand_model_soundex": brand_model_soundex,
+    "brand_model_initial": brand_model_initial,
+    "model": model_only,
+    "year": year_key,
+}
+
+
+def multi_keys(chunk: pd.DataFrame, suffix: str) -> pd.DataFrame:
+    # blocking2: one column per key strategy
+    return pd.DataFrame({name: key(chunk, suffix) for name, key in KEY_STRATEGIES.items()}, index=chunk.index)
+
+
+def any_key_matches(keys1: pd.DataFrame, keys2: pd.DataFrame) -> pd.Series:
+    # True where the two entities share at least one key of the same strategy
+    return ((keys1 == keys2) & keys1.notna()).any(axis=1)
+
+
+def write_partitions(chunk: pd.DataFrame, mask: pd.Series, output: str, excluded: str, header: dict):
+    # One buffered write per partition and chunk; header holds whether each file still needs its header
+    for path, rows in ((output, chunk[mask]), (excluded, chunk[~mask])):
+        if len(rows):
+            rows.to_csv(path, mode='a', index=False, header=header[path])
+            header[path] = False
@@ -0,0 +1,195 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import entity_blocking
+from external_sort import ExternalSorter, RUN_ROWS
+
+# Canopy clustering over TF-IDF vectors of manufacturer/model/description, in three streaming passes:
+# 1. document frequencies of the tokens of both tables (only tokens found in both tables can pair rows);
+# 2. every row becomes a signature with its top TF-IDF tokens, and one posting per signature token goes to an
+#    external sort by token: the rows sharing a token are the cheap neighbourhood of canopy clustering;
+# 3. canopies are built inside every posting list (cosine similarity of the signatures, loose and tight
+#    thresholds) and the cross-table pairs of every canopy go to a second external sort, which removes the
+#    pairs found in more than one posting list.
+
+DEFAULT_FIELDS = ["manufacturer", "model", "description"]
+TOKEN_PATTERN = r"[a-z0-9]+"
+TOP_TOKENS = 5
+LOOSE = 0.3  # members of a canopy: similarity to the center >= loose
+TIGHT = 0.7  # rows with similarity >= tight cannot become centers of other canopies
+MAX_POSTINGS = 5000  # posting lists longer than this (stop words) are skipped
+
+
+def tokens_of(chunk, fields):
+    # one row per (chunk row position, token)
+    text = chunk[fields[0]]
+    for field in fields[1:]:
+        text = text + " " + chunk[field]
+    tokens = text.str.lower().str.findall(TOKEN_PATTERN).explode().dropna()
+    return pd.DataFrame({"position": tokens.index.to_numpy(), "token": tokens.to_numpy()})
+
+
+def document_frequencies(paths, fields, chunk_size):
+    frequencies, rows = [], []
+    for path in paths:
+        frequency = pd.Series(dtype=np.int64)
+        count = 0
+        for chunk in entity_blocking.read_entities(path, fields + ["row_id"], chunk_size):
+            chunk = chunk.reset_index(drop=True)
+            counts = tokens_of(chunk, fields).drop_duplicates()["token"].value_counts()
+            frequency = frequency.add(counts, fill_value=0)
+            count += len(chunk)
+        frequencies.append(frequency)
+        rows.append(count)
+    return frequencies, rows
+
+
+def build_vocabulary(frequencies, rows):
+    # tokens of both tables, rarest first: the token id order is the IDF order
+    df = pd.concat(frequencies, axis=1, keys=[0, 1]).dropna()
+    df = df.sum(axis=1).sort_values(kind="stable")
+    return pd.DataFrame({"token_id": np.arange(len(df), dtype=np.int64), "idf": np.log(sum(rows) / df.to_numpy())}, index=df.index)
+
+
+def signatures(chunk, fields, vocabulary, top_tokens):
+    # top_tokens TF-IDF tokens of every row, L2 normalized: token ids (-1 padded) and weights, one row per chunk row
+    token_ids = np.full((len(chunk), top_tokens), -1, dtype=np.int64)
+    weights = np.zeros((len(chunk), top_tokens), dtype=np.float64)
+    tokens = tokens_of(chunk, fields)
+    tokens = tokens[tokens["token"].isin(vocabulary.index)]
+    if len(tokens):
+        tf = tokens.groupby(["position", "token"], sort=False).size().rename("tf").reset_index()
+        tf = tf.join(vocabulary, on="token")
+        tf["weight"] = tf["tf"] * tf["idf"]
+        top = tf.sort_values(["position", "weight", "token_id"], ascending=[True, False, True]).groupby("position").head(top_tokens)
+        slot = top.groupby("position").cumcount().to_numpy()
+        rows = top["position"].to_numpy()
+        token_ids[rows, slot] = top["token_id"].to_numpy()
+        weights[rows, slot] = top["weight"].to_numpy()
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        weights = np.divide(weights, norms, out=np.zeros_like(weights), where=norms > 0)
+    return token_ids, weights
+
+
+def similarity(token_ids, weights, center_ids, center_weights):
+    # cosine similarity of every signature with the center signature
+    shared = (token_ids[:, :, None] == center_ids[None, None, :]) & (center_ids >= 0)[None, None, :]
+    return (shared * weights[:, :, None] * center_weights[None, None, :]).sum(axis=(1, 2))
+
+
+def canopy_pairs(token_ids, weights, sources, row_ids, loose, tight, rng):
+    # cross-table pairs of the canopies of one posting list, as table1 row id << 32 | table2 row id
+    pairs = []
+    can_be_center = np.ones(len(row_ids), dtype=bool)
+    for center in rng.permutation(len(row_ids)):
+        if not can_be_center[center]:
+            continue
+        sims = similarity(token_ids, weights, token_ids[center], weights[center])
+        members = np.flatnonzero(sims >= loose)
+        can_be_center[sims >= tight] = False
+        can_be_center[center] = False
+        first = row_ids[members[sources[members] == 0]].astype(np.uint64)
+        second = row_ids[members[sources[members] == 1]].astype(np.uint64)
+        if len(first) and len(second):
+            pairs.append((np.repeat(first, len(second)) << np.uint64(32)) | np.tile(second, len(first)))
+    return pairs
+
+
+def posting_lists(sorter):
+    # complete posting lists out of the merged batches (a list can span two batches)
+    pending = None
+    for batch in sorter.merged():
+        if pending is not None:
+            batch = pd.concat([pending, batch], ignore_index=True)
+        last = batch["token_id"].iloc[-1]
+        complete = batch["token_id"].to_numpy() != last
+        pending = batch[~complete]
+        for _, postings in batch[complete].groupby("token_id", sort=False):
+            yield postings
+    if pending is not None and len(pending):
+        yield pending
+
+
+def canopy_blocking(table1, table2, output, fields=None, top_tokens=TOP_TOKENS, loose=LOOSE, tight=TIGHT, max_postings=MAX_POSTINGS,
+                    seed=None, chunk_size=entity_blocking.CHUNK_SIZE, run_rows=RUN_ROWS, suffixes=("used_cars", "vehicles")):
+    fields = fields or DEFAULT_FIELDS
+    rng = np.random.default_rng(seed)
+    frequencies, rows = document_frequencies((table1, table2), fields, chunk_size)
+    vocabulary = build_vocabulary(frequencies, rows)
+    signature_columns = [f"t{i}" for i in range(top_tokens)] + [f"w{i}" for i in range(top_tokens)]
+    skipped = 0
+    candidates = 0
+    with ExternalSorter("token_id", run_rows) as postings_sorter, ExternalSorter("pair", run_rows) as pairs_sorter:
+        for source, path in enumerate((table1, table2)):
+            for chunk in entity_blocking.read_entities(path, fields + ["row_id"], chunk_size):
+                chunk = chunk.reset_index(drop=True)
+                token_ids, weights = signatures(chunk, fields, vocabulary, top_tokens)
+                signature = pd.DataFrame(np.hstack([token_ids, weights]), columns=signature_columns).astype({f"t{i}": np.int64 for i in range(top_tokens)})
+                signature["source"] = np.int8(source)
+                signature["row_id"] = chunk["row_id"].astype(np.int64)
+                # one posting per token of the signature
+                for slot in range(top_tokens):
+                    postings = signature[token_ids[:, slot] >= 0]
+                    postings_sorter.add(postings.assign(token_id=token_ids[token_ids[:, slot] >= 0, slot]))
+
+        for postings in posting_lists(postings_sorter):
+            sources = postings["source"].to_numpy()
+            if len(postings) > max_postings:
+                skipped += 1
+                continue
+            if sources.min() == sources.max():
+                continue
+            pairs = canopy_pairs(postings[signature_columns[:top_tokens]].to_numpy(), postings[signature_columns[top_tokens:]].to_numpy(),
+                                 sources, postings["row_id"].to_numpy(), loose, tight, rng)
+            if pairs:
+                pairs_sorter.add(pd.DataFrame({"pair": np.unique(np.concatenate(pairs))}))
+
+        header = True
+        last_pair = None
+        for batch in pairs_sorter.merged():
+            pairs = batch["pair"].drop_duplicates().to_numpy(dtype=np.uint64)
+            if last_pair is not None:
+                pairs = pairs[pairs != last_pair]
+            if not len(pairs):
+                continue
+            last_pair = pairs[-1]
+            pd.DataFrame({f"row_id_{suffixes[0]}": (pairs >> np.uint64(32)).astype(np.int64),
+                          f"row_id_{suffixes[1]}": (pairs & np.uint64(0xFFFFFFFF)).astype(np.int64)}).to_csv(output, mode='w' if header else 'a', index=False, header=header)
+            header = False
+            candidates += len(pairs)
+    if header:
+        pd.DataFrame(columns=[f"row_id_{suffixes[0]}", f"row_id_{suffixes[1]}"]).to_csv(output, index=False)
+    return candidates, rows, len(vocabulary), skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate candidate pairs with TF-IDF canopy clustering over the two aligned tables.")
+    parser.add_argument("table1", help="Path to the first aligned dataset, CSV or Parquet (e.g., a_used_cars_data.csv)")
+    parser.add_argument("table2", help="Path to the second aligned dataset, CSV or Parquet (e.g., a_vehicles.csv)")
+    parser.add_argument("-o", "--output", help="Path to the output candidate pairs CSV file", default="canopy_candidate_pairs.csv")
+    parser.add_argument("--fields", nargs="+", default=DEFAULT_FIELDS, help="Text columns of the TF-IDF vectors")
+    parser.add_argument("--top_tokens", type=int, default=TOP_TOKENS, help="TF-IDF tokens kept for every row")
+    parser.add_argument("--loose", type=float, default=LOOSE, help="Loose similarity threshold (canopy members)")
+    parser.add_argument("--tight", type=float, default=TIGHT, help="Tight similarity threshold (removed from the centers)")
+    parser.add_argument("--max_postings", type=int, default=MAX_POSTINGS, help="Skip the tokens shared by more rows than this")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the choice of the canopy centers")
+    parser.add_argument("--run_rows", type=int, default=RUN_ROWS, help="Rows sorted in memory at a time by the external sort")
+    parser.add_argument("--chunk_size", type=int, default=entity_blocking.CHUNK_SIZE, help="Rows read at a time")
+    args = parser.parse_args()
+    if args.loose > args.tight:
+        parser.error("--loose must not be greater than --tight")
+
+    start_time = time.time()
+    candidates, rows, vocabulary_size, skipped = canopy_blocking(args.table1, args.table2, args.output, args.fields, args.top_tokens, args.loose, args.tight,
+                                                                 args.max_postings, args.seed, args.chunk_size, args.run_rows)
+    cross_product = rows[0] * rows[1]
+    print(f"{vocabulary_size} shared tokens, {skipped} posting lists skipped (longer than {args.max_postings}).")
+    print(f"{candidates} candidate pairs from {rows[0]} + {rows[1]} rows, "
+          f"reduction ratio {1 - candidates / cross_product if cross_product else 0:.6f}, written to {args.output} in {time.time() - start_time:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
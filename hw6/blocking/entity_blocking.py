@@ -0,0 +1,222 @@
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import blocking_keys
+
+# Entity-level blocking: the two aligned tables are indexed by blocking key (one inverted index key -> row_ids
+# per table and key strategy) and the candidate pairs are generated from the blocks the two tables share,
+# without ever forming the cross product. Oversized blocks are dropped (per-strategy caps and block purging),
+# the remaining pairs are weighted with meta-blocking and streamed to disk one partition of row ids at a time.
+
+KEY_COLUMNS = ["manufacturer", "model", "year", "row_id"]
+STRATEGIES = list(blocking_keys.KEY_STRATEGIES)
+# Maximum comparisons (rows of the block in table1 * rows in table2) of a block, per strategy
+DEFAULT_CAPS = {"brand_model_soundex": 1_000_000, "brand_model_initial": 1_000_000, "model": 1_000_000, "year": 100_000}
+WEIGHTING_SCHEMES = ["cbs", "ecbs", "jaccard", "arcs"]
+CHUNK_SIZE = 500000
+MEMORY_PAIRS = 20_000_000  # pairs generated in memory at a time (before deduplication)
+
+
+def read_entities(path, columns=KEY_COLUMNS, chunk_size=CHUNK_SIZE):
+    # Only the given columns (row_id included), as text: missing values become "" and produce no key
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            chunk = batch.to_pandas()
+            if "year" in chunk.columns:
+                # the Parquet output of align_schema stores the year as a float
+                years = pd.to_numeric(chunk["year"], errors="coerce").astype("Int64")
+                chunk["year"] = years.astype(str).where(years.notna(), "")
+            yield chunk.fillna("")
+    else:
+        for chunk in pd.read_csv(path, usecols=columns, dtype={c: str for c in columns if c != "row_id"}, chunksize=chunk_size):
+            yield chunk.fillna("")
+
+
+class InvertedIndex:
+    # key -> row_ids of one table for one strategy. Keys are stored as 64-bit hashes, sorted, with the row ids
+    # grouped by key: the block of keys[i] is row_ids[starts[i]:starts[i] + sizes[i]]
+    def __init__(self, keys, row_ids):
+        order = np.argsort(keys, kind="stable")
+        self.row_ids = row_ids[order]
+        self.keys, self.starts, self.sizes = np.unique(keys[order], return_index=True, return_counts=True)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def block(self, i):
+        return self.row_ids[self.starts[i]:self.starts[i] + self.sizes[i]]
+
+
+def build_indexes(path, strategies=STRATEGIES, chunk_size=CHUNK_SIZE, timings=None):
+    # timings, if given, accumulates the seconds spent on every strategy (keys, hashing and index)
+    timings = {} if timings is None else timings
+    keys = {s: [] for s in strategies}
+    row_ids = {s: [] for s in strategies}
+    entities, max_row_id = 0, -1
+    for chunk in read_entities(path, KEY_COLUMNS, chunk_size):
+        chunk_row_ids = chunk["row_id"].to_numpy(dtype=np.int64)
+        for s in strategies:
+            start_time = time.perf_counter()
+            chunk_keys = blocking_keys.KEY_STRATEGIES[s](chunk, "")
+            has_key = chunk_keys.notna()
+            keys[s].append(pd.util.hash_pandas_object(chunk_keys[has_key], index=False).to_numpy())
+            row_ids[s].append(chunk_row_ids[has_key.to_numpy()])
+            timings[s] = timings.get(s, 0.0) + time.perf_counter() - start_time
+        entities += len(chunk)
+        max_row_id = max(max_row_id, int(chunk_row_ids.max(initial=-1)))
+    if max_row_id >= 2 ** 32:
+        raise ValueError(f"{path}: row ids must be smaller than 2^32")
+    indexes = {}
+    for s in strategies:
+        start_time = time.perf_counter()
+        indexes[s] = InvertedIndex(np.concatenate(keys[s]) if keys[s] else np.array([], dtype=np.uint64),
+                                   np.concatenate(row_ids[s]) if row_ids[s] else np.array([], dtype=np.int64))
+        timings[s] = timings.get(s, 0.0) + time.perf_counter() - start_time
+    return indexes, entities
+
+
+def select_blocks(indexes1, indexes2, entities1, entities2, caps=DEFAULT_CAPS, purge_fraction=0.05):
+    # Blocks shared by the two tables, as (row_ids in table1, row_ids in table2), without the oversized ones
+    blocks, stats = [], {}
+    for strategy in indexes1:
+        first, second = indexes1[strategy], indexes2[strategy]
+        _, i1, i2 = np.intersect1d(first.keys, second.keys, assume_unique=True, return_indices=True)
+        sizes1, sizes2 = first.sizes[i1], second.sizes[i2]
+        comparisons = sizes1 * sizes2
+        capped = comparisons > caps.get(strategy, math.inf)
+        # block purging: a key shared by a large fraction of a table does not discriminate
+        purged = ~capped & ((sizes1 > purge_fraction * entities1) | (sizes2 > purge_fraction * entities2))
+        keep = ~capped & ~purged
+        blocks.extend((first.block(a), second.block(b)) for a, b in zip(i1[keep], i2[keep]))
+        stats[strategy] = {"blocks": int(keep.sum()), "capped": int(capped.sum()), "purged": int(purged.sum()), "comparisons": int(comparisons[keep].sum())}
+    return blocks, stats
+
+
+def blocks_per_entity(blocks, side):
+    # sorted row ids and the number of blocks each one belongs to
+    if not blocks:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.unique(np.concatenate([block[side] for block in blocks]), return_counts=True)
+
+
+def lookup(ids, counts, row_ids):
+    return counts[np.searchsorted(ids, row_ids)]
+
+
+def weigh_partition(blocks, partition, partitions, scheme, entity_blocks1, entity_blocks2):
+    # Candidate pairs whose table1 row id falls in the partition, deduplicated across blocks, with their weight
+    pair_keys, block_weights = [], []
+    for ids1, ids2 in blocks:
+        part = ids1[ids1 % partitions == partition]
+        if not len(part):
+            continue
+        keys = (np.repeat(part, len(ids2)).astype(np.uint64) << np.uint64(32)) | np.tile(ids2, len(part)).astype(np.uint64)
+        pair_keys.append(keys)
+        if scheme == "arcs":
+            block_weights.append(np.full(len(keys), 1.0 / (len(ids1) * len(ids2))))
+    if not pair_keys:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+    pairs, inverse = np.unique(np.concatenate(pair_keys), return_inverse=True)
+    row_ids1 = (pairs >> np.uint64(32)).astype(np.int64)
+    row_ids2 = (pairs & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    # common blocks scheme: number of blocks shared by the two entities
+    common = np.bincount(inverse, minlength=len(pairs)).astype(np.float64)
+    if scheme == "cbs":
+        weights = common
+    elif scheme == "arcs":
+        # aggregate reciprocal comparisons: small blocks count more
+        weights = np.bincount(inverse, weights=np.concatenate(block_weights), minlength=len(pairs))
+    else:
+        count1 = lookup(*entity_blocks1, row_ids1)
+        count2 = lookup(*entity_blocks2, row_ids2)
+        if scheme == "jaccard":
+            weights = common / (count1 + count2 - common)
+        else:
+            # enhanced common blocks: entities that are in few blocks count more
+            total = len(blocks)
+            weights = common * np.log(total / count1) * np.log(total / count2)
+    return row_ids1, row_ids2, weights
+
+
+def prune_below(output, threshold, chunk_size=CHUNK_SIZE):
+    # weighted edge pruning: keep the candidate pairs with weight >= threshold
+    pruned_file = f"{output}.pruned"
+    kept = 0
+    header = True
+    for chunk in pd.read_csv(output, chunksize=chunk_size):
+        chunk = chunk[chunk["weight"] >= threshold]
+        chunk.to_csv(pruned_file, mode='a', index=False, header=header)
+        header = False
+        kept += len(chunk)
+    os.replace(pruned_file, output)
+    return kept
+
+
+def generate_candidates(blocks, output, scheme="cbs", prune="none", memory_pairs=MEMORY_PAIRS, suffixes=("used_cars", "vehicles")):
+    # Candidates are generated by hash partition of the table1 row id, so only one partition is in memory
+    total_comparisons = sum(len(ids1) * len(ids2) for ids1, ids2 in blocks)
+    partitions = max(1, math.ceil(total_comparisons / memory_pairs))
+    entity_blocks1 = blocks_per_entity(blocks, 0) if scheme in ("ecbs", "jaccard") else None
+    entity_blocks2 = blocks_per_entity(blocks, 1) if scheme in ("ecbs", "jaccard") else None
+
+    candidates, weight_sum = 0, 0.0
+    pd.DataFrame(columns=[f"row_id_{suffixes[0]}", f"row_id_{suffixes[1]}", "weight"]).to_csv(output, index=False)
+    for partition in range(partitions):
+        row_ids1, row_ids2, weights = weigh_partition(blocks, partition, partitions, scheme, entity_blocks1, entity_blocks2)
+        if len(row_ids1):
+            pd.DataFrame({f"row_id_{suffixes[0]}": row_ids1, f"row_id_{suffixes[1]}": row_ids2, "weight": weights}).to_csv(output, mode='a', index=False, header=False)
+            candidates += len(row_ids1)
+            weight_sum += weights.sum()
+    if prune == "wep" and candidates:
+        candidates = prune_below(output, weight_sum / candidates)
+    return candidates, total_comparisons, partitions
+
+
+def parse_caps(values):
+    caps = dict(DEFAULT_CAPS)
+    for value in values or []:
+        strategy, cap = value.split("=")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown key strategy {strategy}, expected one of {STRATEGIES}")
+        caps[strategy] = int(cap)
+    return caps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate candidate pairs from inverted indexes of blocking keys over the two aligned tables.")
+    parser.add_argument("table1", help="Path to the first aligned dataset, CSV or Parquet (e.g., a_used_cars_data.csv)")
+    parser.add_argument("table2", help="Path to the second aligned dataset, CSV or Parquet (e.g., a_vehicles.csv)")
+    parser.add_argument("-o", "--output", help="Path to the output candidate pairs CSV file", default="candidate_pairs.csv")
+    parser.add_argument("--keys", nargs="+", choices=STRATEGIES, default=STRATEGIES, help="Key strategies used for blocking")
+    parser.add_argument("--cap", action="append", metavar="STRATEGY=N", help=f"Maximum comparisons of a block of a strategy (default: {DEFAULT_CAPS})")
+    parser.add_argument("--purge_fraction", type=float, default=0.05, help="Purge the blocks holding more than this fraction of the rows of a table")
+    parser.add_argument("--weighting", choices=WEIGHTING_SCHEMES, default="cbs", help="Meta-blocking weighting scheme")
+    parser.add_argument("--prune", choices=["none", "wep"], default="none", help="wep keeps only the pairs with weight >= the mean weight")
+    parser.add_argument("--memory_pairs", type=int, default=MEMORY_PAIRS, help="Pairs generated in memory at a time")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE, help="Rows read at a time")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    caps = parse_caps(args.cap)
+    indexes1, entities1 = build_indexes(args.table1, args.keys, args.chunk_size)
+    indexes2, entities2 = build_indexes(args.table2, args.keys, args.chunk_size)
+    print(f"Indexed {entities1} rows of {args.table1} and {entities2} rows of {args.table2} in {time.time() - start_time:.2f} seconds.")
+
+    blocks, stats = select_blocks(indexes1, indexes2, entities1, entities2, caps, args.purge_fraction)
+    for strategy, s in stats.items():
+        print(f"{strategy}: {s['blocks']} blocks, {s['comparisons']} comparisons ({s['capped']} blocks over the cap, {s['purged']} purged)")
+
+    candidates, comparisons, partitions = generate_candidates(blocks, args.output, args.weighting, args.prune, args.memory_pairs)
+    cross_product = entities1 * entities2
+    print(f"{candidates} candidate pairs out of {comparisons} block comparisons ({partitions} partitions), "
+          f"reduction ratio {1 - candidates / cross_product if cross_product else 0:.6f}, written to {args.output} in {time.time() - start_time:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# External sort for the streaming blocking stages: rows are buffered, every run of RUN_ROWS rows is sorted
+# in memory and written to a temporary Parquet file, then the runs are merged batch by batch.
+# The merge is vectorized: at every step all the buffered rows up to the smallest "last key" of the runs
+# still being read are already in their final position, so they are sorted together and emitted.
+
+RUN_ROWS = 2_000_000
+BATCH_ROWS = 200_000
+
+
+class ExternalSorter:
+    def __init__(self, key, run_rows=RUN_ROWS, batch_rows=BATCH_ROWS, tmp_dir=None):
+        self.key = key
+        self.run_rows = run_rows
+        self.batch_rows = batch_rows
+        self.directory = tempfile.mkdtemp(prefix="external_sort_", dir=tmp_dir)
+        self.buffer = []
+        self.buffered_rows = 0
+        self.runs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def add(self, rows: pd.DataFrame):
+        if len(rows):
+            self.buffer.append(rows)
+            self.buffered_rows += len(rows)
+        if self.buffered_rows >= self.run_rows:
+            self.write_run()
+
+    def write_run(self):
+        if not self.buffer:
+            return
+        run = pd.concat(self.buffer, ignore_index=True).sort_values(self.key, kind="stable")
+        path = os.path.join(self.directory, f"run-{len(self.runs)}.parquet")
+        pq.write_table(pa.Table.from_pandas(run, preserve_index=False), path)
+        self.runs.append(path)
+        self.buffer = []
+        self.buffered_rows = 0
+
+    def merged(self):
+        """Yield all the added rows as DataFrames, in key order."""
+        self.write_run()
+        readers = [pq.ParquetFile(path).iter_batches(batch_size=self.batch_rows) for path in self.runs]
+        buffers = [self._next_batch(reader) for reader in readers]
+        while any(buffer is not None for buffer in buffers):
+            # fully read runs do not bound the merge, their remaining rows are all in memory
+            last_keys = [buffer[self.key].iloc[-1] for buffer, reader in zip(buffers, readers) if buffer is not None and reader is not None]
+            bound = min(last_keys) if last_keys else None
+            parts = []
+            for i, buffer in enumerate(buffers):
+                if buffer is None:
+                    continue
+                taken = len(buffer) if bound is None else int(np.searchsorted(buffer[self.key].to_numpy(), bound, side="right"))
+                parts.append(buffer.iloc[:taken])
+                if taken < len(buffer):
+                    buffers[i] = buffer.iloc[taken:]
+                else:
+                    buffers[i] = self._next_batch(readers[i]) if readers[i] is not None else None
+                    if buffers[i] is None:
+                        readers[i] = None
+            merged = pd.concat(parts, ignore_index=True).sort_values(self.key, kind="stable")
+            if len(merged):
+                yield merged
+
+    @staticmethod
+    def _next_batch(reader):
+        batch = next(reader, None)
+        return batch.to_pandas() if batch is not None else None
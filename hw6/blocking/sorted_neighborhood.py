@@ -0,0 +1,103 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import entity_blocking
+from external_sort import ExternalSorter, RUN_ROWS
+
+# Sorted neighborhood blocking: the rows of both aligned tables are sorted together by a composite key
+# (with an external sort, the tables do not have to fit in memory) and every row is paired with the rows
+# of the other table among the window - 1 rows preceding it in the sorted order.
+
+DEFAULT_KEY = ["manufacturer", "model", "year"]
+WINDOW = 10
+SEPARATOR = "\x01"  # lower than every printable character: a shorter field sorts before its extensions
+
+
+def parse_key(fields):
+    # "model:3" uses the first 3 characters of model
+    key = []
+    for field in fields:
+        column, _, prefix = field.partition(":")
+        key.append((column, int(prefix) if prefix else None))
+    return key
+
+
+def composite_key(chunk, key):
+    parts = []
+    for column, prefix in key:
+        values = chunk[column].str.lower().str.strip()
+        parts.append(values.str[:prefix] if prefix else values)
+    composite = parts[0]
+    for part in parts[1:]:
+        composite = composite + SEPARATOR + part
+    # rows with no key field at all are not blocked
+    has_key = pd.concat(parts, axis=1).ne("").any(axis=1)
+    return composite, has_key
+
+
+def window_pairs(sources, row_ids, carry, window):
+    # Pairs of rows of different tables at distance < window; the first carry rows were already paired among themselves
+    first, second = [], []
+    for distance in range(1, window):
+        i = np.arange(max(distance, carry), len(sources))
+        j = i - distance
+        cross = sources[i] != sources[j]
+        i, j = i[cross], j[cross]
+        from_first = sources[i] == 0
+        first.append(np.where(from_first, row_ids[i], row_ids[j]))
+        second.append(np.where(from_first, row_ids[j], row_ids[i]))
+    if not first:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def sorted_neighborhood(table1, table2, output, key=None, window=WINDOW, chunk_size=entity_blocking.CHUNK_SIZE, run_rows=RUN_ROWS, suffixes=("used_cars", "vehicles")):
+    key = key or parse_key(DEFAULT_KEY)
+    columns = list(dict.fromkeys(column for column, _ in key)) + ["row_id"]
+    rows = [0, 0]
+    candidates = 0
+    with ExternalSorter("key", run_rows) as sorter:
+        for source, path in enumerate((table1, table2)):
+            for chunk in entity_blocking.read_entities(path, columns, chunk_size):
+                keys, has_key = composite_key(chunk, key)
+                sorter.add(pd.DataFrame({"key": keys[has_key], "source": np.int8(source), "row_id": chunk["row_id"][has_key].astype(np.int64)}))
+                rows[source] += len(chunk)
+
+        # the last window - 1 rows of a batch are carried over, to be paired with the first rows of the next one
+        carry = pd.DataFrame({"source": np.array([], dtype=np.int8), "row_id": np.array([], dtype=np.int64)})
+        header = True
+        for batch in sorter.merged():
+            batch = pd.concat([carry, batch[["source", "row_id"]]], ignore_index=True)
+            row_ids1, row_ids2 = window_pairs(batch["source"].to_numpy(), batch["row_id"].to_numpy(), len(carry), window)
+            pd.DataFrame({f"row_id_{suffixes[0]}": row_ids1, f"row_id_{suffixes[1]}": row_ids2}).to_csv(output, mode='w' if header else 'a', index=False, header=header)
+            header = False
+            candidates += len(row_ids1)
+            carry = batch.iloc[len(batch) - (window - 1):] if window > 1 else batch.iloc[:0]
+    if header:
+        pd.DataFrame(columns=[f"row_id_{suffixes[0]}", f"row_id_{suffixes[1]}"]).to_csv(output, index=False)
+    return candidates, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate candidate pairs with sorted neighborhood blocking over the two aligned tables.")
+    parser.add_argument("table1", help="Path to the first aligned dataset, CSV or Parquet (e.g., a_used_cars_data.csv)")
+    parser.add_argument("table2", help="Path to the second aligned dataset, CSV or Parquet (e.g., a_vehicles.csv)")
+    parser.add_argument("-o", "--output", help="Path to the output candidate pairs CSV file", default="sn_candidate_pairs.csv")
+    parser.add_argument("-k", "--key", nargs="+", default=DEFAULT_KEY, help="Fields of the sorting key, column or column:prefix_length (default: manufacturer model year)")
+    parser.add_argument("-w", "--window", type=int, default=WINDOW, help="Size of the sliding window")
+    parser.add_argument("--run_rows", type=int, default=RUN_ROWS, help="Rows sorted in memory at a time by the external sort")
+    parser.add_argument("--chunk_size", type=int, default=entity_blocking.CHUNK_SIZE, help="Rows read at a time")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    candidates, rows = sorted_neighborhood(args.table1, args.table2, args.output, parse_key(args.key), args.window, args.chunk_size, args.run_rows)
+    cross_product = rows[0] * rows[1]
+    print(f"{candidates} candidate pairs from {rows[0]} + {rows[1]} rows, "
+          f"reduction ratio {1 - candidates / cross_product if cross_product else 0:.6f}, written to {args.output} in {time.time() - start_time:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
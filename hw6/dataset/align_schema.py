@@ -1,44 +1,135 @@
-import pandas as pd
+import argparse
+import csv
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from tqdm import tqdm
 
-# Estimate total lines for progress bar (optional, improves tqdm)
-def get_num_lines(filename):
-    with open(filename) as f:
-        lines_amount = 0
-        while f.readline() != "":
-            lines_amount +=1
-        return lines_amount
+# Columns stored as numbers in the Parquet output (the CSV output keeps the source text)
+NUMERIC_COLUMNS = ["year", "price", "mileage", "lat", "long"]
+
+
+def adaptive_block_size(path: str, workers: int) -> int:
+    # Big blocks for big files, but enough of them to keep every worker busy: between 16MB and 256MB
+    return int(min(256 << 20, max(16 << 20, os.path.getsize(path) // (workers * 4))))
+
+
+def source_columns(path: str, schema: dict) -> list:
+    # Schema columns in the order of the source file
+    with open(path, newline="") as f:
+        header = next(csv.reader(f))
+    return [c for c in header if c in schema]
+
+
+def normalize(batch: pa.RecordBatch, schema: dict, min_non_na: int) -> pa.Table:
+    # Runs in the worker threads (pyarrow compute releases the GIL): rename, blank -> null, drop sparse rows
+    columns = []
+    valid_counts = np.zeros(batch.num_rows, dtype=np.int64)
+    for name in batch.schema.names:
+        column = batch.column(name)
+        # Replace empty strings and whitespace with null
+        column = pc.if_else(pc.equal(pc.utf8_trim_whitespace(column), ""), pa.scalar(None, pa.string()), column)
+        valid_counts += pc.is_valid(column).to_numpy(zero_copy_only=False)
+        columns.append(column)
+    table = pa.table(columns, names=[schema[name] for name in batch.schema.names])
+    return table.filter(pa.array(valid_counts >= min_non_na))
 
-def process(schema_file: str, source_dataset: str, target_dataset:str, chunk_size: int = 1000, threshold: float = 0.5, row_id_start: int = 0):
-    first_chunk = True
 
+class VinDeduplicator:
+    # Keeps the first occurrence of every VIN over the whole file, in file order (rows without VIN are kept).
+    # The seen VINs are stored as a sorted array of 64-bit hashes instead of a Python set of strings.
+    def __init__(self):
+        self.seen = np.array([], dtype=np.uint64)
+
+    def keep_mask(self, vins: pa.ChunkedArray) -> np.ndarray:
+        values = pd.Series(vins.to_pandas(), dtype="object")
+        has_vin = values.notna().to_numpy()
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        first_in_chunk = ~pd.Series(np.where(has_vin, hashes, 0)).duplicated().to_numpy()
+        new = ~np.isin(hashes, self.seen, assume_unique=False)
+        keep = ~has_vin | (first_in_chunk & new)
+        self.seen = np.union1d(self.seen, hashes[has_vin])
+        return keep
+
+
+def to_parquet_schema(table: pa.Table) -> pa.Table:
+    for name in NUMERIC_COLUMNS:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            numbers = pd.to_numeric(table.column(name).to_pandas(), errors="coerce").astype("float64")
+            table = table.set_column(index, name, pa.array(numbers, type=pa.float64()))
+    return table
+
+
+def process(schema_file: str, source_dataset: str, target_dataset: str, chunk_bytes: int = None, threshold: float = 0.5, row_id_start: int = 0, workers: int = None, output_format: str = "csv"):
     # Load schema mapping once
     with open(schema_file, "r") as f:
         schema = json.load(f)
 
-    lines_amount = get_num_lines(source_dataset)
-    seen_vins = set()  # To track seen VINs for deduplication
-    for chunk in tqdm(pd.read_csv(source_dataset, chunksize=chunk_size), total=lines_amount // chunk_size + 1, desc=f"Processing {source_dataset}"):
-        chunk = chunk[[c for c in chunk.columns if c in schema.keys()]]
-        chunk = chunk.rename(columns=schema)
-        # Replace empty strings and whitespace with NaN
-        chunk = chunk.replace(r'^\s*$', pd.NA, regex=True)
-        min_non_na = int(len(chunk.columns) * threshold)
-        chunk = chunk.dropna(thresh=min_non_na)
-        chunk = chunk.reset_index(drop=True)
-        chunk["row_id"] = chunk.index + row_id_start
-        row_id_start += len(chunk)
-        # Deduplicate based on VIN
-        if "vin" in chunk.columns:
-            chunk = chunk[~chunk["vin"].isin(seen_vins)]
-            seen_vins.update(chunk["vin"].dropna().unique())
-        chunk.to_csv(target_dataset, mode="a", index=False, header=first_chunk)
-        first_chunk = False
+    workers = workers or os.cpu_count() or 1
+    columns = source_columns(source_dataset, schema)
+    min_non_na = int(len(columns) * threshold)
+    block_size = chunk_bytes or adaptive_block_size(source_dataset, workers)
+    reader = pacsv.open_csv(
+        source_dataset,
+        read_options=pacsv.ReadOptions(block_size=block_size, use_threads=True),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),  # descriptions span several lines
+        convert_options=pacsv.ConvertOptions(include_columns=columns, column_types={c: pa.string() for c in columns}, strings_can_be_null=True),
+    )
+    deduplicator = VinDeduplicator()
+    writer = None
+
+    # Normalization runs in parallel on several batches, row ids and dedup are assigned in file order
+    with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(desc=f"Processing {source_dataset}", unit=" rows") as progress:
+        pending = []
+        batches = iter(reader)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 2:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                else:
+                    pending.append((batch.num_rows, executor.submit(normalize, batch, schema, min_non_na)))
+            if not pending:
+                break
+            read_rows, future = pending.pop(0)
+            table = future.result()
+            table = table.append_column("row_id", pa.array(np.arange(row_id_start, row_id_start + table.num_rows, dtype=np.int64)))
+            row_id_start += table.num_rows
+            # Deduplicate based on VIN
+            if "vin" in table.column_names:
+                table = table.filter(pa.array(deduplicator.keep_mask(table.column("vin"))))
+            if output_format == "parquet":
+                table = to_parquet_schema(table)
+                if writer is None:
+                    writer = pq.ParquetWriter(target_dataset, table.schema, compression="zstd")
+            elif writer is None:
+                writer = pacsv.CSVWriter(target_dataset, table.schema, write_options=pacsv.WriteOptions(quoting_style="needed"))
+            writer.write_table(table)
+            progress.update(read_rows)
+    if writer is not None:
+        writer.close()
     return row_id_start
 
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Align used_cars_data.csv and vehicles.csv to the common schema, with globally unique row ids and deduplicated VINs.")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output format (default: csv, a_*.csv; parquet writes a_*.parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="Threads normalizing the chunks (default: number of CPUs)")
+    parser.add_argument("--chunk_bytes", type=int, default=None, help="Bytes read per chunk (default: adaptive to the file size)")
+    parser.add_argument("--threshold", type=float, default=0.7, help="Minimum fraction of non empty columns of a row")
+    args = parser.parse_args()
+
+    extension = "parquet" if args.format == "parquet" else "csv"
     row_id_start = 0
-    row_id_start = process("used_cars_to_schema.json", "used_cars_data.csv", "a_used_cars_data.csv",1000, 0.7, row_id_start)
-    
-    process("vehicles_to_schema.json", "vehicles.csv", "a_vehicles.csv", 1000, 0.7, row_id_start)
\ No newline at end of file
+    row_id_start = process("used_cars_to_schema.json", "used_cars_data.csv", f"a_used_cars_data.{extension}", args.chunk_bytes, args.threshold, row_id_start, args.workers, args.format)
+
+    process("vehicles_to_schema.json", "vehicles.csv", f"a_vehicles.{extension}", args.chunk_bytes, args.threshold, row_id_start, args.workers, args.format)
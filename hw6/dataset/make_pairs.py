@@ -1,55 +1,137 @@
 import argparse
+import io
+import numpy as np
 import pandas as pd
-import random
 import os
 
 # We will create the pairs to be saved in a CSV with a new column for their match label
 # It will be balanced, using all the positives matches in the match_table and getting the same amount of random negative matches by randomly picking and checking that it's not present in the match_table
 
-def match_chunk(chunk_a, chunk_b):
-    # Ensure indices are reset to avoid merge issues if chunks came from specific weird indexing
-    chunk_a = chunk_a.reset_index(drop=True)
-    chunk_b = chunk_b.reset_index(drop=True)
+CHUNK_SIZE = 200000
 
-    # Merge on VIN to find positive matches (assuming VIN is the join key)
-    merged = pd.merge(chunk_a, chunk_b, on="vin", how="inner", suffixes=('_used_cars', '_vehicles'))
+def load_rows_by_row_id(path, row_ids, chunk_size=CHUNK_SIZE):
+    # One sequential read of the aligned table, keeping only the requested rows, indexed by row_id
+    wanted = np.unique(row_ids)
+    parts = [chunk[np.isin(chunk["row_id"].to_numpy(), wanted)] for chunk in pd.read_csv(path, chunksize=chunk_size)]
+    rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["row_id"])
+    return rows.set_index("row_id", drop=False)
 
-    if not merged.empty:
-        merged["match_label"] = 1
-        # Create explicit columns for both VINs to match negative pair schema later
-        merged["vin_used_cars"] = merged["vin"]
-        merged["vin_vehicles"] = merged["vin"]
 
-        # Drop the common key because we now have specific suffixed keys
-        merged = merged.drop(columns=["vin"])
-    return merged
+def create_positive_pairs(match_table_df, dataset1_path, dataset2_path, output_path, chunk_size=CHUNK_SIZE):
+    # Joins the row_ids of the match table with the two tables: each file is read once
+    ids1, ids2 = match_table_df["row_id_used_cars"].to_numpy(), match_table_df["row_id_vehicles"].to_numpy()
+    print("Loading matched rows from dataset 1...")
+    rows1 = load_rows_by_row_id(dataset1_path, ids1, chunk_size)
+    print("Loading matched rows from dataset 2...")
+    rows2 = load_rows_by_row_id(dataset2_path, ids2, chunk_size)
+    found = np.isin(ids1, rows1.index.to_numpy()) & np.isin(ids2, rows2.index.to_numpy())
+    if not found.all():
+        print(f"Skipping {(~found).sum()} matches whose rows are missing from the datasets")
+    ids1, ids2 = ids1[found], ids2[found]
 
+    pos_count = 0
+    for start in range(0, len(ids1), chunk_size):
+        left = rows1.loc[ids1[start:start + chunk_size]].reset_index(drop=True)
+        right = rows2.loc[ids2[start:start + chunk_size]].reset_index(drop=True)
+        # Same columns as the former pd.merge on "vin" with suffixes ('_used_cars', '_vehicles')
+        positive_pairs = pd.concat([
+            left.drop(columns=["vin"]).add_suffix("_used_cars"),
+            right.drop(columns=["vin"]).add_suffix("_vehicles"),
+        ], axis=1)
+        positive_pairs["match_label"] = 1
+        positive_pairs["vin_used_cars"] = left["vin"]
+        positive_pairs["vin_vehicles"] = right["vin"]
+        positive_pairs.to_csv(output_path, mode='a', index=False, header=not os.path.exists(output_path))
+        pos_count += len(positive_pairs)
+    return pos_count
+
+
+def build_row_offsets(path, block_size=8 * 1024 * 1024):
+    # Byte offset of the start of every data row (plus the end of the file), cached next to the CSV as <path>.offsets.npy.
+    # Newlines inside quoted fields (e.g. descriptions) are not row boundaries: a newline ends a row only
+    # when an even number of quotes precedes it.
+    cache_path = f"{path}.offsets.npy"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        return np.load(cache_path, mmap_mode="r")
+    boundaries = []
+    in_quotes = 0
+    position = 0
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            data = np.frombuffer(block, dtype=np.uint8)
+            # uint8 cumsum wraps at 256, the parity is still right
+            parity = (np.cumsum(data == ord('"'), dtype=np.uint8) + in_quotes) & 1
+            boundaries.append(np.flatnonzero((data == ord("\n")) & (parity == 0)) + position + 1)
+            in_quotes = int(parity[-1])
+            position += len(data)
+    offsets = np.concatenate(boundaries) if boundaries else np.array([], dtype=np.int64)
+    if len(offsets) == 0 or offsets[-1] != position:
+        offsets = np.append(offsets, position)  # last row without trailing newline
+    offsets = offsets.astype(np.int64)
+    np.save(cache_path, offsets)
+    return np.load(cache_path, mmap_mode="r")
+
+
+def read_rows(path, offsets, indices):
+    # Reads the rows at the given positions with direct seeks, in the requested order (duplicates allowed)
+    unique = np.unique(indices)
+    parts = []
+    with open(path, "rb") as f:
+        parts.append(f.read(int(offsets[0])))  # header
+        for i in unique:
+            f.seek(int(offsets[i]))
+            row = f.read(int(offsets[i + 1] - offsets[i]))
+            parts.append(row if row.endswith(b"\n") else row + b"\n")
+    rows = pd.read_csv(io.BytesIO(b"".join(parts)))
+    rows.index = unique
+    return rows.loc[indices].reset_index(drop=True)
+
+
+def pick_same_group(groups2, groups1, rng):
+    # For every entry of groups1, a random position of groups2 with the same value (-1 if there is none)
+    codes2, uniques = pd.factorize(groups2)
+    order = np.argsort(codes2, kind="stable")
+    sorted_codes = codes2[order]
+    starts = np.searchsorted(sorted_codes, np.arange(len(uniques)), side="left")
+    counts = np.searchsorted(sorted_codes, np.arange(len(uniques)), side="right") - starts
+    codes1 = pd.Index(uniques).get_indexer(groups1)
+    picks = np.full(len(groups1), -1, dtype=np.int64)
+    found = codes1 >= 0
+    picks[found] = order[starts[codes1[found]] + (rng.random(found.sum()) * counts[codes1[found]]).astype(np.int64)]
+    return picks
+
+
+def normalize_manufacturer(values):
+    return pd.Series(values, dtype="object").str.lower().str.strip().to_numpy()
+
+
+def create_negative_pairs(dataset1_path, dataset2_path, num_pairs, hard_fraction=0.0, seed=None):
+    # Row offsets instead of line counting: random rows are read with seeks, not by parsing the whole file
+    rng = np.random.default_rng(seed)
+    offsets1 = build_row_offsets(dataset1_path)
+    offsets2 = build_row_offsets(dataset2_path)
+    n_rows1, n_rows2 = len(offsets1) - 1, len(offsets2) - 1
 
-def create_negative_pairs(dataset1_path, dataset2_path, num_pairs):
-    # Get total lines to know range for random sampling (subtract 1 for header)
-    n_rows1 = sum(1 for _ in open(dataset1_path)) - 1
-    n_rows2 = sum(1 for _ in open(dataset2_path)) - 1
-
-    # Generate random indices
     if num_pairs > n_rows1: num_pairs = n_rows1
     if num_pairs > n_rows2: num_pairs = n_rows2
 
-    indices1 = sorted(random.sample(range(n_rows1), num_pairs))
-    indices2 = sorted(random.sample(range(n_rows2), num_pairs))
-
-    def load_rows_by_indices(path, indices):
-        target_indices = set(indices)
-        return pd.read_csv(path, skiprows=lambda x: x > 0 and (x - 1) not in target_indices)
+    # Random pairing of distinct rows of both datasets
+    indices1 = rng.choice(n_rows1, num_pairs, replace=False)
+    indices2 = rng.choice(n_rows2, num_pairs, replace=False)
 
     print("Loading random rows from dataset 1...")
-    df1 = load_rows_by_indices(dataset1_path, indices1)
+    df1 = read_rows(dataset1_path, offsets1, indices1)
 
-    print("Loading random rows from dataset 2...")
-    df2 = load_rows_by_indices(dataset2_path, indices2)
+    # Hard negatives: the right row has the same manufacturer as the left one (and a different VIN, see below)
+    n_hard = int(num_pairs * hard_fraction)
+    if n_hard > 0:
+        print(f"Picking {n_hard} hard negatives with the same manufacturer...")
+        manufacturers2 = normalize_manufacturer(pd.read_csv(dataset2_path, usecols=["manufacturer"])["manufacturer"])
+        picks = pick_same_group(manufacturers2, normalize_manufacturer(df1["manufacturer"][:n_hard]), rng)
+        indices2[:n_hard] = np.where(picks >= 0, picks, indices2[:n_hard])
 
-    # Shuffle to decouple the sorted loading order so we get random pairings
-    df1 = df1.sample(frac=1).reset_index(drop=True)
-    df2 = df2.sample(frac=1).reset_index(drop=True)
+    print("Loading random rows from dataset 2...")
+    df2 = read_rows(dataset2_path, offsets2, indices2)
 
     # Rename ALL columns including VIN
     df1_renamed = df1.rename(columns={c: f"{c}_used_cars" for c in df1.columns})
@@ -73,31 +155,23 @@ if __name__ == "__main__":
     parser.add_argument("match_table", type=str, help="CSV file containing the match table")
     parser.add_argument("dataset1", type=str, help="First dataset CSV file")
     parser.add_argument("dataset2", type=str, help="Second dataset CSV file")
+    parser.add_argument("--hard_negatives", type=float, default=0.0, help="Fraction of negative pairs with the same manufacturer and a different VIN (default: 0)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed of the negative sampling")
     args = parser.parse_args()
 
     if os.path.exists(args.output):
         os.remove(args.output)
 
-    pos_count = 0
-    header_written = False
-
     match_table_df = pd.read_csv(args.match_table)
     target_negative_count = len(match_table_df)
 
     # Run the positive pair extraction
-    for chunk_used_cars in pd.read_csv(args.dataset1, chunksize=50000):
-        for chunk_vehicles in pd.read_csv(args.dataset2, chunksize=50000):
-            positive_pairs = match_chunk(chunk_used_cars, chunk_vehicles)
-
-            if not positive_pairs.empty:
-                pos_count += len(positive_pairs)
-                # Write to CSV
-                positive_pairs.to_csv(args.output, mode='a', index=False, header=not os.path.exists(args.output))
+    pos_count = create_positive_pairs(match_table_df, args.dataset1, args.dataset2, args.output)
 
-    print(f"Written positive pairs. Proceeding to create {target_negative_count} negative pairs...")
+    print(f"Written {pos_count} positive pairs. Proceeding to create {target_negative_count} negative pairs...")
 
     # 2. Process Negative Pairs
-    negative_pairs_df = create_negative_pairs(args.dataset1, args.dataset2, target_negative_count)
+    negative_pairs_df = create_negative_pairs(args.dataset1, args.dataset2, target_negative_count, args.hard_negatives, args.seed)
 
     if os.path.exists(args.output):
         # FIX: Align columns with existing file!
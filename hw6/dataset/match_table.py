@@ -1,38 +1,104 @@
 import pandas as pd
+import numpy as np
 import argparse
 import os
 import concurrent.futures
 import time
 
-def worker(chunk_used_cars, chunk_vehicles, output_file, process_id):
+# Hash join on VIN: the VIN -> row_id index of table2 is built once (sorted NumPy arrays, binary search),
+# then table1 is streamed through it. Only the vin and row_id columns are read, each file is scanned once.
+# With more workers, VINs are partitioned by hash: each process joins only the VINs of its partition.
+
+CHUNK_SIZE = 500000
+
+def read_keys(path, chunk_size=CHUNK_SIZE, partition=0, partitions=1):
+    for chunk in pd.read_csv(path, usecols=["vin", "row_id"], dtype={"vin": str}, chunksize=chunk_size):
+        # rows without VIN never match (pd.merge would pair all of them with each other)
+        chunk = chunk.dropna(subset=["vin"])
+        if partitions > 1:
+            chunk = chunk[pd.util.hash_pandas_object(chunk["vin"], index=False).to_numpy() % partitions == partition]
+        yield chunk["vin"].to_numpy(dtype=str), chunk["row_id"].to_numpy(dtype=np.int64)
+
+class VinIndex:
+    def __init__(self, path, chunk_size=CHUNK_SIZE, partition=0, partitions=1):
+        vins, row_ids = [], []
+        for chunk_vins, chunk_row_ids in read_keys(path, chunk_size, partition, partitions):
+            vins.append(chunk_vins)
+            row_ids.append(chunk_row_ids)
+        vins = np.concatenate(vins) if vins else np.array([], dtype=str)
+        row_ids = np.concatenate(row_ids) if row_ids else np.array([], dtype=np.int64)
+        # stable sort: rows with the same VIN keep the file order, like pd.merge
+        order = np.argsort(vins, kind="stable")
+        self.vins = vins[order]
+        self.row_ids = row_ids[order]
+
+    def __len__(self):
+        return len(self.vins)
+
+    def probe(self, vins, row_ids):
+        # all the (row_id of the probe side, row_id of the index) pairs with the same VIN
+        left = np.searchsorted(self.vins, vins, side="left")
+        right = np.searchsorted(self.vins, vins, side="right")
+        counts = right - left
+        probe_row_ids = np.repeat(row_ids, counts)
+        # positions inside the index: left[i], left[i] + 1, ..., right[i] - 1 for every probe row
+        starts = np.repeat(left - np.cumsum(counts) + counts, counts)
+        positions = starts + np.arange(counts.sum())
+        return probe_row_ids, self.row_ids[positions]
+
+def build_match_table(table1, table2, output_file, chunk_size=CHUNK_SIZE, partition=0, partitions=1, suffixes=("used_cars", "vehicles")):
     start_time = time.time()
-    print(f"Process {process_id} started...")
-    match_chunk(chunk_used_cars, chunk_vehicles, output_file)
-    end_time = time.time()
-    print(f"Process {process_id} completed in {end_time - start_time:.2f} seconds.")
+    index = VinIndex(table2, chunk_size, partition, partitions)
+    print(f"Partition {partition}: indexed {len(index)} VINs of {table2} in {time.time() - start_time:.2f} seconds.")
+    matches = 0
+    header = True
+    for vins, row_ids in read_keys(table1, chunk_size, partition, partitions):
+        row_ids1, row_ids2 = index.probe(vins, row_ids)
+        if len(row_ids1):
+            pd.DataFrame({f"row_id_{suffixes[0]}": row_ids1, f"row_id_{suffixes[1]}": row_ids2}).to_csv(output_file, mode='a', index=False, header=header)
+            header = False
+            matches += len(row_ids1)
+    print(f"Partition {partition}: {matches} matches in {time.time() - start_time:.2f} seconds.")
+    return matches
 
-def match_chunk(chunk_used_cars, chunk_vehicles, output_file):
-    merged = pd.merge(chunk_used_cars, chunk_vehicles, on="vin", how="inner", suffixes=('_used_cars', '_vehicles'))
-    if not merged.empty:
-        merged[["row_id_used_cars", "row_id_vehicles"]].to_csv(output_file, mode='a', index=False, header=not os.path.exists(output_file))
+def build_match_table_parallel(table1, table2, output_file, workers, chunk_size=CHUNK_SIZE):
+    part_files = [f"{output_file}.part{p}" for p in range(workers)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(build_match_table, table1, table2, part_files[p], chunk_size, p, workers) for p in range(workers)]
+        matches = sum(f.result() for f in futures)
+    # concatenate the partitions, keeping only the first header
+    header_written = False
+    with open(output_file, "w") as out:
+        for part_file in part_files:
+            if not os.path.exists(part_file):
+                continue
+            with open(part_file) as f:
+                header = f.readline()
+                if not header_written:
+                    out.write(header)
+                    header_written = True
+                for line in f:
+                    out.write(line)
+            os.remove(part_file)
+    return matches
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Create a match table based on VIN from two aligned datasets.")
     parser.add_argument("table1", help="Path to the first aligned CSV file (e.g., aligned_used_cars_data.csv)")
-    parser.add_argument("table2", help="Path to the second aligned CSV file (e.g., aligned_vehicles.csv)")
+    parser.add_argument("table2", help="Path to the second aligned CSV file (e.g., aligned_vehicles.csv), indexed in memory")
     parser.add_argument("-o", "--output", help="Path to the output match table CSV file (default: match_table.csv)", default="match_table.csv")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of processes, each one joins a hash partition of the VINs (default: 1)")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE, help="Rows read at a time")
     args = parser.parse_args()
 
     # Remove output file if it exists to avoid header issues
     if os.path.exists(args.output):
         os.remove(args.output)
 
-    max_workers = os.cpu_count() or 1
-    #print(f"Using {max_workers} parallel workers for matching.")
-
-    process_id = 0
-    for chunk_used_cars in pd.read_csv(args.table1, chunksize=100000):
-        for chunk_vehicles in pd.read_csv(args.table2, chunksize=100000):
-            worker(chunk_used_cars, chunk_vehicles, args.output, process_id)
-            process_id += 1
\ No newline at end of file
+    start_time = time.time()
+    if args.workers > 1:
+        matches = build_match_table_parallel(args.table1, args.table2, args.output, args.workers, args.chunk_size)
+    else:
+        matches = build_match_table(args.table1, args.table2, args.output, args.chunk_size)
+    print(f"Match table with {matches} matches written to {args.output} in {time.time() - start_time:.2f} seconds.")
@@ -1,113 +1,318 @@
 import recordlinkage
 import pandas as pd
 import numpy as np
+import joblib
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
 
-parser = argparse.ArgumentParser()
-parser.add_argument("-i", "--input", required=True, help="input file")
-args = parser.parse_args()
-
-# 1. Load the blocked pairs
-input_file = args.input  # Ensure this path matches your file location
-print(f"Loading {input_file}...")
-df_pairs = pd.read_csv(input_file)
-
-# --- SAVE GROUND TRUTH ---
-# We preserve the match_label to evaluate later.
-# The index of actual_matches corresponds to the row index of df_pairs.
-actual_labels = df_pairs["match_label"].values
-
-# 2. Separate the pairs back into two DataFrames
 suffix_a = "_used_cars"
 suffix_b = "_vehicles"
 
-# Columns explicitly excluded from feature comparison (cheating or metadata)
-columns_to_drop_a = [f"vin{suffix_a}", "match_label", f"row_id{suffix_a}"]
-columns_to_drop_b = [f"vin{suffix_b}", "match_label", f"row_id{suffix_b}"]
-
-# Filter columns present in the file
-cols_a = [c for c in df_pairs.columns if c.endswith(suffix_a)]
-cols_b = [c for c in df_pairs.columns if c.endswith(suffix_b)]
-
-dfA = df_pairs[cols_a].copy()
-dfB = df_pairs[cols_b].copy()
-
-# 3. Clean up DataFrames
-# Drop specific columns if they exist in the split frames
-for col in columns_to_drop_a:
-    if col in dfA.columns: dfA.drop(columns=[col], inplace=True)
-for col in columns_to_drop_b:
-    if col in dfB.columns: dfB.drop(columns=[col], inplace=True)
-
-# Normalize column names
-dfA.columns = [c.replace(suffix_a, "") for c in dfA.columns]
-dfB.columns = [c.replace(suffix_b, "") for c in dfB.columns]
-
-# Ensure unique numeric indices for alignment
-dfA.index.name = "id_a"
-dfB.index.name = "id_b"
-
-# 4. Construct the Candidate Links
-# Since row i in input is a pair, we link row i of dfA to row i of dfB
-candidate_links = pd.MultiIndex.from_arrays(
-    [dfA.index, dfB.index],
-    names=["id_a", "id_b"]
-)
-
-# 5. Define Comparison Logic
-compare_cl = recordlinkage.Compare()
-
-compare_cl.exact("year", "year", label="year")
-compare_cl.string("body_type", "body_type", method="jarowinkler", threshold=0.6, label="body_type")
-compare_cl.string("fuel_type", "fuel_type", method="jarowinkler", threshold=0.6, label="fuel_type")
-compare_cl.string("manufacturer", "manufacturer", method="jarowinkler", threshold=0.6, label="manufacturer")
-compare_cl.string("model", "model", method="jarowinkler", threshold=0.6, label="model")
-compare_cl.string("color", "color", method="jarowinkler", threshold=0.6, label="color")
-compare_cl.string("description", "description", method="jarowinkler", threshold=0.60, label="description")
-compare_cl.numeric("price", "price", method="gauss", offset=100.0, scale=1000.0, label="price")
-compare_cl.numeric("mileage", "mileage", method="gauss", offset=500.0, scale=5000.0, label="mileage")
-
-# 6. Compute Features
-print("Computing similarity features...")
-features = compare_cl.compute(candidate_links, dfA, dfB)
-
-# 7. Classification
-# Simple weighted sum or threshold.
-# 'features.sum(axis=1)' gives a score between 0 and N_features
-score = features.sum(axis=1)
-
-# Threshold for being considered a "Match"
+# Comparison logic: one comparator per feature, labeled with the compared column
+COMPARATORS = [
+    {"type": "exact", "column": "year"},
+    {"type": "string", "column": "body_type", "method": "jarowinkler", "threshold": 0.6},
+    {"type": "string", "column": "fuel_type", "method": "jarowinkler", "threshold": 0.6},
+    {"type": "string", "column": "manufacturer", "method": "jarowinkler", "threshold": 0.6},
+    {"type": "string", "column": "model", "method": "jarowinkler", "threshold": 0.6},
+    {"type": "string", "column": "color", "method": "jarowinkler", "threshold": 0.6},
+    {"type": "string", "column": "description", "method": "jarowinkler", "threshold": 0.60},
+    {"type": "numeric", "column": "price", "method": "gauss", "offset": 100.0, "scale": 1000.0},
+    {"type": "numeric", "column": "mileage", "method": "gauss", "offset": 500.0, "scale": 5000.0},
+]
+
+# Features are cached per comparator in a Parquet dataset keyed by pair id (the row ids of the two entities),
+# in a directory named after a hash of the comparator config: a new threshold or classifier reuses them,
+# a changed comparator recomputes only its own feature. Remove the cache when the aligned datasets are rebuilt.
+CACHE_DIR = "feature_cache"
+SHARD_SIZE = 50000  # pairs compared by a worker process at a time
+
+# Threshold for being considered a "Match": on the sum of the features, or on the match probability of a learned model
 THRESHOLD = 5.0
-predicted_labels = (score >= THRESHOLD).astype(int)
-
-# 8. Evaluation
-print(f"\n--- Evaluation (Threshold: {THRESHOLD}) ---")
-
-# We align predictions with actuals.
-# Since we used diagonal indexing (0-0, 1-1), the array order matches.
-# predicted_labels is a Series indexed by MultiIndex. We extract values.
-pred_array = predicted_labels.values
-
-# Confusion Matrix Elements
-# TP: Pred=1, Actual=1
-# FP: Pred=1, Actual=0
-# TN: Pred=0, Actual=0
-# FN: Pred=0, Actual=1
-
-tp = np.sum((pred_array == 1) & (actual_labels == 1))
-fp = np.sum((pred_array == 1) & (actual_labels == 0))
-tn = np.sum((pred_array == 0) & (actual_labels == 0))
-fn = np.sum((pred_array == 0) & (actual_labels == 1))
-
-print(f"TP: {tp}")
-print(f"FP: {fp}")
-print(f"FN: {fn}")
-print(f"TN: {tn}")
-
-precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-
-print(f"Precision: {precision:.4f}")
-print(f"Recall:    {recall:.4f}")
-print(f"F1 Score:  {f1:.4f}")
+PROBABILITY_THRESHOLD = 0.5
+MODELS = ["sum", "logistic", "gbm"]
+
+
+def load_pairs(input_file):
+    print(f"Loading {input_file}...")
+    return pd.read_csv(input_file)
+
+
+def split_entities(df_pairs):
+    # Separate the pairs back into two DataFrames, row i of dfA is paired with row i of dfB
+    # Columns explicitly excluded from feature comparison (cheating or metadata)
+    columns_to_drop_a = [f"vin{suffix_a}", "match_label", f"row_id{suffix_a}"]
+    columns_to_drop_b = [f"vin{suffix_b}", "match_label", f"row_id{suffix_b}"]
+
+    # Filter columns present in the file
+    cols_a = [c for c in df_pairs.columns if c.endswith(suffix_a) and c not in columns_to_drop_a]
+    cols_b = [c for c in df_pairs.columns if c.endswith(suffix_b) and c not in columns_to_drop_b]
+
+    dfA = df_pairs[cols_a].copy()
+    dfB = df_pairs[cols_b].copy()
+
+    # Normalize column names
+    dfA.columns = [c.replace(suffix_a, "") for c in dfA.columns]
+    dfB.columns = [c.replace(suffix_b, "") for c in dfB.columns]
+    return dfA, dfB
+
+
+def pair_ids(df_pairs):
+    return (df_pairs[f"row_id{suffix_a}"].to_numpy().astype(np.uint64) << np.uint64(32)) | df_pairs[f"row_id{suffix_b}"].to_numpy().astype(np.uint64)
+
+
+def build_compare(comparators):
+    compare_cl = recordlinkage.Compare()
+    for c in comparators:
+        if c["type"] == "exact":
+            compare_cl.exact(c["column"], c["column"], label=c["column"])
+        elif c["type"] == "string":
+            compare_cl.string(c["column"], c["column"], method=c["method"], threshold=c["threshold"], label=c["column"])
+        elif c["type"] == "numeric":
+            compare_cl.numeric(c["column"], c["column"], method=c["method"], offset=c["offset"], scale=c["scale"], label=c["column"])
+        else:
+            raise ValueError(f"Unknown comparator type {c['type']}")
+    return compare_cl
+
+
+def compare_shard(comparators, dfA, dfB):
+    # Runs in the worker processes: the candidate links are the diagonal (0-0, 1-1, ...)
+    dfA = dfA.reset_index(drop=True)
+    dfB = dfB.reset_index(drop=True)
+    dfA.index.name = "id_a"
+    dfB.index.name = "id_b"
+    candidate_links = pd.MultiIndex.from_arrays([dfA.index, dfB.index], names=["id_a", "id_b"])
+    return build_compare(comparators).compute(candidate_links, dfA, dfB).reset_index(drop=True)
+
+
+def compute_features(dfA, dfB, comparators, workers=1, shard_size=SHARD_SIZE):
+    # Only the compared columns are sent to the workers
+    columns = list(dict.fromkeys(c["column"] for c in comparators))
+    dfA, dfB = dfA[columns], dfB[columns]
+    starts = range(0, len(dfA), shard_size)
+    if workers > 1 and len(starts) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = list(executor.map(compare_shard, [comparators] * len(starts), [dfA.iloc[s:s + shard_size] for s in starts], [dfB.iloc[s:s + shard_size] for s in starts]))
+    else:
+        shards = [compare_shard(comparators, dfA.iloc[s:s + shard_size], dfB.iloc[s:s + shard_size]) for s in starts]
+    if not shards:
+        return pd.DataFrame(columns=[c["column"] for c in comparators], dtype=np.float64)
+    return pd.concat(shards, ignore_index=True)
+
+
+def comparator_key(comparator):
+    config = json.dumps(comparator, sort_keys=True)
+    return f"{comparator['column']}-{hashlib.sha1(config.encode()).hexdigest()[:12]}"
+
+
+def load_cached(cache_dir, comparator, ids):
+    # pair id -> feature value, for the cached pairs among ids
+    path = os.path.join(cache_dir, comparator_key(comparator))
+    if not os.path.exists(path):
+        return pd.Series(dtype=np.float64)
+    table = ds.dataset(path, format="parquet").to_table(filter=ds.field("pair_id").isin(pa.array(np.unique(ids), pa.uint64())))
+    cached = table.to_pandas().drop_duplicates("pair_id")
+    return pd.Series(cached["value"].to_numpy(), index=cached["pair_id"].to_numpy())
+
+
+def store_cached(cache_dir, comparator, ids, values):
+    path = os.path.join(cache_dir, comparator_key(comparator))
+    os.makedirs(path, exist_ok=True)
+    table = pa.table({"pair_id": pa.array(ids, pa.uint64()), "value": pa.array(values, pa.float64())})
+    pq.write_table(table, os.path.join(path, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet"))
+
+
+def cached_features(df_pairs, dfA, dfB, comparators, cache_dir=CACHE_DIR, workers=1, shard_size=SHARD_SIZE):
+    # Features from the cache, only the missing (pair, comparator) are computed and added to the cache
+    ids = pair_ids(df_pairs)
+    features = pd.DataFrame(index=df_pairs.index)
+    for c in comparators:
+        cached = load_cached(cache_dir, c, ids)
+        positions = cached.index.get_indexer(ids)
+        features[c["column"]] = np.where(positions >= 0, cached.to_numpy()[positions] if len(cached) else np.nan, np.nan)
+
+    missing = features.isna()
+    to_compute = [c for c in comparators if missing[c["column"]].any()]
+    rows = np.flatnonzero(missing.any(axis=1).to_numpy())
+    print(f"{int((~missing).to_numpy().sum())} of {missing.size} features from the cache, computing {len(to_compute)} features for {len(rows)} pairs...")
+    if to_compute:
+        computed = compute_features(dfA.iloc[rows], dfB.iloc[rows], to_compute, workers, shard_size)
+        for c in to_compute:
+            label = c["column"]
+            missing_rows = missing[label].to_numpy()[rows]
+            values = computed[label].to_numpy(dtype=np.float64)[missing_rows]
+            features.iloc[rows[missing_rows], features.columns.get_loc(label)] = values
+            new_ids, first = np.unique(ids[rows[missing_rows]], return_index=True)
+            store_cached(cache_dir, c, new_ids, values[first])
+    return features
+
+
+def train_model(kind, features, labels, seed=None):
+    # Learned classifier on the comparison vectors of the train split
+    if kind == "logistic":
+        model = LogisticRegression(max_iter=1000)
+    elif kind == "gbm":
+        model = HistGradientBoostingClassifier(random_state=seed)
+    else:
+        raise ValueError(f"Unknown model {kind}, expected one of {MODELS[1:]}")
+    model.fit(features.to_numpy(), labels)
+    return model
+
+
+def save_model(path, model, threshold):
+    # the comparators are saved with the model: the feature columns must be the same when scoring
+    joblib.dump({"model": model, "comparators": COMPARATORS, "threshold": threshold}, path)
+
+
+def load_model(path):
+    bundle = joblib.load(path)
+    if bundle["comparators"] != COMPARATORS:
+        raise ValueError(f"{path} was trained with different comparators, train it again")
+    return bundle["model"], bundle["threshold"]
+
+
+def score_pairs(model, features):
+    # one batched call over all the pairs; without a model the score is the sum of the features
+    if model is None:
+        return features.sum(axis=1)
+    return pd.Series(model.predict_proba(features.to_numpy())[:, 1], index=features.index)
+
+
+def precision_recall_curve(actual_labels, score):
+    # Precision and recall at every distinct threshold in one pass: with the pairs sorted by decreasing score,
+    # the pairs with score >= a threshold are a prefix and the true/false positives are cumulative sums
+    order = np.argsort(-score, kind="stable")
+    sorted_score = score[order]
+    sorted_labels = actual_labels[order] == 1
+    tp = np.cumsum(sorted_labels)
+    fp = np.cumsum(~sorted_labels)
+    # last pair of every distinct score
+    last = np.append(sorted_score[1:] != sorted_score[:-1], True)
+    tp, fp = tp[last], fp[last]
+    positives = sorted_labels.sum()
+    precision = tp / (tp + fp)
+    recall = tp / positives if positives > 0 else np.zeros(len(tp))
+    with np.errstate(invalid="ignore"):
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    return pd.DataFrame({"threshold": sorted_score[last], "precision": precision, "recall": recall, "f1": f1, "tp": tp, "fp": fp})
+
+
+def evaluate(actual_labels, score, threshold=THRESHOLD):
+    predicted_labels = (score >= threshold).astype(int)
+
+    print(f"\n--- Evaluation (Threshold: {threshold}) ---")
+
+    # We align predictions with actuals.
+    # Since we used diagonal indexing (0-0, 1-1), the array order matches.
+    # predicted_labels is a Series indexed like the pairs. We extract values.
+    pred_array = predicted_labels.values
+
+    # Confusion Matrix Elements
+    # TP: Pred=1, Actual=1
+    # FP: Pred=1, Actual=0
+    # TN: Pred=0, Actual=0
+    # FN: Pred=0, Actual=1
+
+    tp = np.sum((pred_array == 1) & (actual_labels == 1))
+    fp = np.sum((pred_array == 1) & (actual_labels == 0))
+    tn = np.sum((pred_array == 0) & (actual_labels == 0))
+    fn = np.sum((pred_array == 0) & (actual_labels == 1))
+
+    print(f"TP: {tp}")
+    print(f"FP: {fp}")
+    print(f"FN: {fn}")
+    print(f"TN: {tn}")
+
+    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+
+    print(f"Precision: {precision:.4f}")
+    print(f"Recall:    {recall:.4f}")
+    print(f"F1 Score:  {f1:.4f}")
+
+
+def pair_features(df_pairs, args):
+    dfA, dfB = split_entities(df_pairs)
+    print("Computing similarity features...")
+    start_time = time.time()
+    if args.no_cache:
+        features = compute_features(dfA, dfB, COMPARATORS, args.workers, args.shard_size)
+    else:
+        features = cached_features(df_pairs, dfA, dfB, COMPARATORS, args.cache, args.workers, args.shard_size)
+    print(f"Features ready in {time.time() - start_time:.2f} seconds.")
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", required=True, help="input file")
+    parser.add_argument("-t", "--threshold", type=float, default=None, help=f"Minimum score of a match (default: {THRESHOLD} for sum, the saved threshold or {PROBABILITY_THRESHOLD} for a learned model)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Processes computing the comparisons (default: number of CPUs)")
+    parser.add_argument("--shard_size", type=int, default=SHARD_SIZE, help="Pairs compared by a process at a time")
+    parser.add_argument("--cache", default=CACHE_DIR, help="Directory of the feature cache")
+    parser.add_argument("--no_cache", action="store_true", help="Compute all the features, without reading or writing the cache")
+    parser.add_argument("--model", choices=MODELS, default="sum", help="sum of the features, or a classifier trained on --train")
+    parser.add_argument("--train", default=None, help="Pairs with match_label to train the classifier on (e.g. train_valid_test/train.csv)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the gradient boosting")
+    parser.add_argument("--save_model", default=None, help="Save the trained classifier to this file")
+    parser.add_argument("--load_model", default=None, help="Score the pairs with a saved classifier")
+    parser.add_argument("--curve", default=None, help="Write the precision-recall curve (every threshold) to this CSV file")
+    parser.add_argument("--predictions", default=None, help="Write score and predicted label of every pair to this CSV file")
+    args = parser.parse_args()
+
+    # 1. Classifier: loaded, trained on the train split, or the plain sum of the features
+    model, threshold = None, THRESHOLD
+    if args.load_model:
+        model, threshold = load_model(args.load_model)
+    elif args.model != "sum":
+        if not args.train:
+            parser.error(f"--model {args.model} needs --train")
+        df_train = load_pairs(args.train)
+        train_features = pair_features(df_train, args)
+        start_time = time.time()
+        model = train_model(args.model, train_features, df_train["match_label"].to_numpy(), args.seed)
+        threshold = PROBABILITY_THRESHOLD
+        print(f"Trained {args.model} on {len(df_train)} pairs in {time.time() - start_time:.2f} seconds.")
+        if args.save_model:
+            save_model(args.save_model, model, args.threshold if args.threshold is not None else threshold)
+    if args.threshold is not None:
+        threshold = args.threshold
+
+    # 2. Load the pairs to classify and compute their features
+    df_pairs = load_pairs(args.input)
+    features = pair_features(df_pairs, args)
+
+    # 3. Classification, one batched call
+    # Without a model, 'features.sum(axis=1)' gives a score between 0 and N_features
+    score = score_pairs(model, features)
+    if args.predictions:
+        pd.DataFrame({f"row_id{suffix_a}": df_pairs[f"row_id{suffix_a}"], f"row_id{suffix_b}": df_pairs[f"row_id{suffix_b}"],
+                      "score": score.to_numpy(), "predicted_label": (score >= threshold).astype(int).to_numpy()}).to_csv(args.predictions, index=False)
+        print(f"Predictions written to {args.predictions}")
+
+    # 4. Evaluation against the ground truth, when the pairs have it
+    if "match_label" not in df_pairs.columns:
+        return
+    actual_labels = df_pairs["match_label"].values
+    if args.curve:
+        curve = precision_recall_curve(actual_labels, score.to_numpy())
+        curve.to_csv(args.curve, index=False)
+        if len(curve):
+            best = curve.iloc[curve["f1"].to_numpy().argmax()]
+            print(f"Precision-recall curve ({len(curve)} thresholds) written to {args.curve}, best F1 {best['f1']:.4f} at threshold {best['threshold']}")
+    evaluate(actual_labels, score, threshold)
+
+
+if __name__ == "__main__":
+    main()